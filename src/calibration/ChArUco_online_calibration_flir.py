@@ -44,6 +44,9 @@ import os
 import sys
 import time
 
+# threading
+import threading
+
 # dates
 import datetime
 
@@ -53,8 +56,17 @@ import argparse
 
 import cv2
 
+import numpy as np
+
 import pickle
 
+from view_selection import select_views
+
+# shared post-processing modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from camera_calibration import CameraCalibration  # noqa
+
 # PySpin
 import PySpin
 
@@ -110,6 +122,225 @@ class NumpyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def detect_board(rgb, board, dictionary, scale=1.0):
+    """
+    Detect the ChArUco board in a frame.
+
+    The markers can be searched for in a downscaled copy of the frame,
+    which is much faster for large frames. Their corners are then refined
+    in the full resolution frame, and so are the ChArUco corners, so the
+    detections keep their full resolution accuracy.
+
+    :param rgb: Frame (RGB).
+    :param board: ChArUco board.
+    :param dictionary: ArUco dictionary.
+    :param scale: Scale of the copy used to find the markers.
+    :type rgb: numpy.ndarray
+    :type board: cv2.aruco.CharucoBoard
+    :type dictionary: cv2.aruco.Dictionary
+    :type scale: float Default = 1.0.
+    :return: Marker corners and ids, and ChArUco corners and ids (None if
+             not enough were found).
+    :rtype: dict
+    """
+    # covert to grey scale
+    grey = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    small = grey
+    if scale != 1:
+        small = cv2.resize(grey, None, fx=scale, fy=scale,
+                           interpolation=cv2.INTER_AREA)
+
+    # detect
+    corners, ids, rejectedImgPoints = cv2.aruco.detectMarkers(
+        small, dictionary)
+    cv2.aruco.refineDetectedMarkers(
+        small, board, corners, ids, rejectedImgPoints)
+
+    detection = {"corners": corners, "ids": ids,
+                 "charuco_corners": None, "charuco_ids": None}
+
+    if len(corners) > 0:  # if there is at least one marker detected
+
+        # back to full resolution
+        if scale != 1:
+            points = np.concatenate(corners).reshape(-1, 1, 2) / scale
+            points = cv2.cornerSubPix(
+                grey, points.astype(np.float32), (5, 5), (-1, -1),
+                (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30,
+                 0.01))
+            corners = tuple(points.reshape(-1, 1, 4, 2))
+            detection["corners"] = corners
+
+        # refine
+        retval, ref_corners, ref_ids = cv2.aruco.interpolateCornersCharuco(
+            corners, ids, grey, board)
+
+        if retval > 5:  # calibrateCameraCharuco needs at least 4 corners
+            detection["charuco_corners"] = ref_corners
+            detection["charuco_ids"] = ref_ids
+
+    return detection
+
+
+class BoardDetector:
+    """
+    Detect the ChArUco board on a background thread, newest frame first.
+
+    The acquisition loop hands every frame to the detector and returns to
+    the camera straight away. The detector only keeps the newest frame: a
+    frame that is still waiting when the next one arrives is skipped, so
+    the detections never fall behind the camera and the stream is not
+    slowed down by them. OpenCV releases the GIL while detecting, so the
+    stream keeps running at the camera frame rate.
+
+    :param board: ChArUco board.
+    :param dictionary: ArUco dictionary.
+    :param scale: Scale of the copy used to find the markers, see
+                  detect_board().
+    :type board: cv2.aruco.CharucoBoard
+    :type dictionary: cv2.aruco.Dictionary
+    :type scale: float Default = 1.0.
+    """
+
+    def __init__(self, board, dictionary, scale=1.0):
+
+        self.board = board
+        self.dictionary = dictionary
+        self.scale = float(scale)
+
+        self.condition = threading.Condition()
+        self.frame = None  # newest frame waiting, as (frame, submitted)
+        self.results = []  # detections not collected yet
+        self.running = True
+
+        # counters
+        self.submitted = 0
+        self.skipped = 0
+        self.latencies = []  # seconds from submit to detected
+
+        self.thread = threading.Thread(target=self._detect, daemon=True)
+        self.thread.start()
+
+    def submit(self, rgb):
+        """
+        Hand a frame to the detector, replacing the one waiting, if any.
+
+        :param rgb: Frame (RGB). It is copied, so it can be released after.
+        :type rgb: numpy.ndarray
+        """
+        frame = (rgb.copy(), time.monotonic())
+        with self.condition:
+            if self.frame is not None:
+                self.skipped += 1
+            self.frame = frame
+            self.submitted += 1
+            self.condition.notify()
+
+    def collect(self):
+        """
+        Return the detections finished since the last call.
+
+        :return: Detections, see detect_board(), with their latency in
+                 seconds.
+        :rtype: list
+        """
+        with self.condition:
+            results, self.results = self.results, []
+        return results
+
+    def _detect(self):
+        """Detection thread loop."""
+        while True:
+            with self.condition:
+                while self.frame is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                rgb, submitted = self.frame
+                self.frame = None
+            try:
+                detection = detect_board(rgb, self.board, self.dictionary,
+                                         self.scale)
+            except cv2.error as ex:
+                print("Error: %s" % ex)
+                continue
+            detection["latency"] = time.monotonic() - submitted
+            with self.condition:
+                self.latencies.append(detection["latency"])
+                self.results.append(detection)
+
+    def close(self):
+        """Stop the detection thread once the current frame is done."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+
+def draw_detection(image, detection, size):
+    """
+    Draw a detection on a resized frame.
+
+    :param image: Resized frame.
+    :param detection: Detection, see detect_board().
+    :param size: Size of the full resolution frame as (width, height).
+    :type image: numpy.ndarray
+    :type detection: dict
+    :type size: tuple
+    :return: Frame with the detected board.
+    :rtype: numpy.ndarray
+    """
+    factor = np.array([image.shape[1] / size[0], image.shape[0] / size[1]],
+                      dtype=np.float32)
+    image = cv2.aruco.drawDetectedMarkers(
+        image, [c * factor for c in detection["corners"]], detection["ids"])
+    if detection["charuco_corners"] is not None:
+        image = cv2.aruco.drawDetectedCornersCharuco(
+            image, detection["charuco_corners"] * factor,
+            detection["charuco_ids"], (0, 0, 0))
+    return image
+
+
+def print_detection_status(detector, detection, views, displayed, elapsed):
+    """
+    Print the latency of a detection and the stream counters.
+
+    :param detector: Board detector.
+    :param detection: Newest detection.
+    :param views: Number of views with the board so far.
+    :param displayed: Number of frames displayed.
+    :param elapsed: Seconds since the start of the stream.
+    :type detector: BoardDetector
+    :type detection: dict
+    :type views: int
+    :type displayed: int
+    :type elapsed: float
+    """
+    print("  - Detection latency %4.0f ms (median %4.0f ms), %d views, "
+          "%d of %d frames skipped by the detector, stream at %.1f fps" % (
+              detection["latency"] * 1000,
+              np.median(detector.latencies) * 1000, views, detector.skipped,
+              detector.submitted, displayed / max(elapsed, 1e-9)),
+          end="\r")
+
+
+def print_detection_summary(detector):
+    """
+    Print the detection latency percentiles.
+
+    :param detector: Board detector.
+    :type detector: BoardDetector
+    """
+    if not detector.latencies:
+        return
+    latencies = np.array(detector.latencies) * 1000
+    print("\n  -- Detected %d of %d frames, latency p50 %.0f ms, "
+          "p95 %.0f ms, max %.0f ms" % (
+              len(latencies), detector.submitted,
+              np.percentile(latencies, 50), np.percentile(latencies, 95),
+              latencies.max()))
+
+
 def set_camera_parameters(cam, nodemap, nodemap_tldevice, fps=5, height=1080,
                           width=1920, offsetx=80, offsety=236):
     """
@@ -324,6 +555,12 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
         all_ids = []
         total_images = 0
 
+        # detect on a background thread, the stream does not wait for it
+        detector = BoardDetector(board, dictionary, scale=detection_scale)
+        overlay = None  # newest detection, drawn on the stream
+        displayed = 0
+        start = time.monotonic()
+
         while (True):
             try:
 
@@ -350,6 +587,7 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
                 if image_result.IsIncomplete():
                     print("Image incomplete with image status %d ..." %
                           image_result.GetImageStatus())
+                    image_result.Release()
 
                 else:
 
@@ -380,69 +618,56 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
                     image_data = image_converted.GetNDArray()
                     image_data = image_data.reshape(height, width, 3)
 
-                    # search for the ChArUco board
-
-                    # covert to grey scale
-                    grey = cv2.cvtColor(image_data, cv2.COLOR_RGB2GRAY)
-
-                    # detect
-                    corners, ids, rejectedImgPoints = cv2.aruco.detectMarkers(
-                        grey, dictionary)
-                    cv2.aruco.refineDetectedMarkers(
-                        grey, board, corners, ids, rejectedImgPoints)
-
-                    if len(corners) > 0:  # if there is at least one marker detected
+                    #  Release image
+                    #
+                    #  *** NOTES ***
+                    # Images retrieved directly from the camera  (i.e.
+                    # non-converted images) need to be released in order
+                    # to keep from filling the buffer. The converted image
+                    # is all that is needed from here on.
+                    image_result.Release()
 
-                        # refine
-                        retval, ref_corners, ref_ids = cv2.aruco.interpolateCornersCharuco(
-                            corners, ids, grey, board)
+                    # search for the ChArUco board, newest frame first
+                    detector.submit(image_data)
 
-                        if retval > 5:  # calibrateCameraCharuco needs at least 4 corners
+                    # collect the detections finished in the meantime
+                    done = False
+                    for detection in detector.collect():
+                        overlay = detection
 
-                            # draw board on image
-                            im_with_board = cv2.aruco.drawDetectedCornersCharuco(
-                                frame, ref_corners, ref_ids, (0, 0, 0))
-                            im_with_board = cv2.aruco.drawDetectedMarkers(
-                                im_with_board, corners, ids)
+                        if detection["charuco_corners"] is not None:
 
                             # append
-                            all_corners.append(ref_corners)
-                            all_ids.append(ref_ids)
+                            all_corners.append(detection["charuco_corners"])
+                            all_ids.append(detection["charuco_ids"])
 
                             if total_images > max_images:
                                 print("\n  --> Found all images I needed. "
                                       "Breaking the loop after {} images.".format(
                                           max_images))
+                                done = True
                                 break
 
                             total_images += 1
 
-                    else:
-                        pass
-
-                    # image to be displayed
-                    try:
-                        stream_img = im_with_board
-                    except Exception:
-                        stream_img = image_data  # image without the board.
+                        print_detection_status(detector, detection,
+                                               len(all_corners), displayed,
+                                               time.monotonic() - start)
+                    if done:
+                        break
 
-                    # Display the resulting frame
-                    resized = cv2.resize(stream_img, (stream_width,
-                                                      stream_height))
+                    # Display the resulting frame with the newest detection
+                    stream_img = cv2.resize(image_data, (stream_width,
+                                                         stream_height))
+                    if overlay is not None and len(overlay["corners"]) > 0:
+                        stream_img = draw_detection(stream_img, overlay,
+                                                    (width, height))
                     cv2.imshow("Camera stream - press 'q' to quit.",
-                               cv2.cvtColor(resized, cv2.COLOR_BGR2RGB))
+                               cv2.cvtColor(stream_img, cv2.COLOR_BGR2RGB))
+                    displayed += 1
                     if cv2.waitKey(1) & 0xFF == ord("q"):
                         break
 
-                    #  Release image
-                    #
-                    #  *** NOTES ***
-                    # Images retrieved directly from the camera  (i.e.
-                    # non-converted images) need to be released in order
-                    # to keep from filling the buffer.
-                    image_result.Release()
-                    # print("")
-
             except PySpin.SpinnakerException as ex:
                 print("Error: %s" % ex)
                 return False
@@ -455,12 +680,27 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
         cam.EndAcquisition()
         cv2.destroyAllWindows()
 
+        # stop the detections
+        detector.close()
+        print_detection_summary(detector)
+
+        grey = cv2.cvtColor(image_data, cv2.COLOR_RGB2GRAY)
+
         # calibrate
         if calibrate_on_device:
 
             print(
                 "\n - Starting calibrateCameraCharuco(), this will take a while.")
 
+            # keep the most informative views only
+            if views > 0 and len(all_corners) > views:
+                keep = select_views(all_corners, all_ids, board,
+                                    (grey.shape[1], grey.shape[0]), views)
+                print("\n  -- Selected {} of {} views.".format(
+                    len(keep), len(all_corners)))
+                all_corners = [all_corners[k] for k in keep]
+                all_ids = [all_ids[k] for k in keep]
+
             # calibrate the camera
             imsize = grey.shape
             retval, mtx, dist, rvecs, tvecs = cv2.aruco.calibrateCameraCharuco(
@@ -493,15 +733,7 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
             # display the results
 
             # undistort
-            h,  w = stream_img.shape[:2]
-            newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-                mtx, dist, (w, h), 1, (w, h))
-
-            # print("\n")
-            # print(mtx)
-            # print("\n")
-
-            dst = cv2.undistort(stream_img, mtx, dist, None, newcameramtx)
+            dst = CameraCalibration(mtx, dist).undistort(image_data)
             rsize = (stream_width, stream_height)
             resized = cv2.resize(dst, rsize,
                                  interpolation=cv2.INTER_LINEAR)
@@ -700,6 +932,25 @@ def main():
                         default=25,
                         help="Maximum number of images to use.",)
 
+    parser.add_argument("--detection_scale",
+                        action="store",
+                        dest="detection_scale",
+                        required=False,
+                        default=1.0,
+                        help="Search for the markers in a copy of the "
+                             "frames downscaled by this factor (e.g. 0.5). "
+                             "The corners are refined at full resolution. "
+                             "Default is 1, no downscaling.",)
+
+    parser.add_argument("--views",
+                        action="store",
+                        dest="views",
+                        required=False,
+                        default=0,
+                        help="Calibrate with only this many views, chosen "
+                             "for their image coverage and board pose. "
+                             "Default is to use all views.",)
+
     parser.add_argument("--output", "-o",
                         action="store",
                         dest="output",
@@ -718,6 +969,12 @@ def main():
     global max_images
     max_images = int(args.max_images)
 
+    global views
+    views = int(args.views)
+
+    global detection_scale
+    detection_scale = float(args.detection_scale)
+
     # parse parameters
     squares_x = int(args.squares_x)  # number of squares in X direction
     squares_y = int(args.squares_y)  # number of squares in Y direction
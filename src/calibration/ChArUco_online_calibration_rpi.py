@@ -17,6 +17,13 @@ import numpy as np
 from time import sleep
 
 import pickle
+
+from view_selection import select_views
+
+# shared post-processing modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from camera_calibration import CameraCalibration  # noqa
 import json
 
 # PiCamera
@@ -172,6 +179,15 @@ def main():
                         default=25,
                         help="Maximum number of images to use.",)
 
+    parser.add_argument("--views",
+                        action="store",
+                        dest="views",
+                        required=False,
+                        default=0,
+                        help="Calibrate with only this many views, chosen "
+                             "for their image coverage and board pose. "
+                             "Default is to use all views.",)
+
     parser.add_argument("--output", "-o",
                         action="store",
                         dest="output",
@@ -186,6 +202,7 @@ def main():
     args = parser.parse_args()
 
     max_images = int(args.max_images)
+    views = int(args.views)
 
     # parse parameters
     squares_x = int(args.squares_x)  # number of squares in X direction
@@ -299,6 +316,15 @@ def main():
         print(
             "\n - Starting calibrateCameraCharuco(), this will take a while.")
 
+        # keep the most informative views only
+        if views > 0 and len(all_corners) > views:
+            keep = select_views(all_corners, all_ids, board,
+                                (grey.shape[1], grey.shape[0]), views)
+            print("\n  -- Selected {} of {} views.".format(
+                len(keep), len(all_corners)))
+            all_corners = [all_corners[k] for k in keep]
+            all_ids = [all_ids[k] for k in keep]
+
         # calibrate the camera
         imsize = grey.shape
         retval, mtx, dist, rvecs, tvecs = cv2.aruco.calibrateCameraCharuco(
@@ -332,11 +358,7 @@ def main():
         # display the results
 
         # undistort
-        h,  w = stream_img.shape[:2]
-        newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-            mtx, dist, (w, h), 1, (w, h))
-
-        dst = cv2.undistort(stream_img, mtx, dist, None, newcameramtx)
+        dst = CameraCalibration(mtx, dist).undistort(stream_img)
         resized = cv2.resize(dst, rsize,
                              interpolation=cv2.INTER_LINEAR)
         cv2.imshow("Undistorted image. Displaying for 20 seconds.", resized)
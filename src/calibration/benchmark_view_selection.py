@@ -0,0 +1,389 @@
+"""
+Benchmark the view selection of the ChArUco calibration.
+
+# SCRIPT   : benchmark_view_selection.py
+# POURPOSE : Calibrate with all the views of a ChArUco calibration and with
+#            subsets of them (the first N, N at random, every k-th and the N
+#            chosen by view_selection.py), and report the time each
+#            calibration takes against the reprojection error over all the
+#            views. The views are either synthetic (a known camera looking
+#            at the board in bursts of near-duplicate frames, as when
+#            recording a video) or read from the output of
+#            calib_ChArUco_offline.py.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import csv
+import pickle
+import argparse
+
+from time import perf_counter
+
+import numpy as np
+
+import cv2
+
+from view_selection import select_views, board_corners
+from calib_ChArUco_offline import create_board
+
+
+COLUMNS = ["strategy", "views", "time", "rms", "reprojection", "focal_error",
+           "undistortion_error"]
+
+
+def synthetic_views(board, image_size: tuple, mtx: np.ndarray,
+                    dist: np.ndarray, bursts: int = 30, burst_size: int = 8,
+                    noise: float = 0.3, seed: int = 42):
+    """
+    Generate ChArUco detections of a known camera.
+
+    The board is shown in bursts of near-duplicate poses, and most of the
+    bursts keep it near the centre of the image for longer than the others,
+    which is what a video of someone waving a board at the camera looks
+    like.
+
+    Parameters
+    ----------
+    board : cv2.aruco.CharucoBoard
+        The board.
+    image_size : tuple
+        Image size as (width, height).
+    mtx, dist : np.ndarray
+        Camera matrix and distortion coefficients.
+    bursts : int
+        Number of distinct poses.
+    burst_size : int
+        Number of near-duplicate views of each pose. The poses near the
+        centre get one to three times as many.
+    noise : float
+        Standard deviation of the corner noise in pixels.
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    corners, ids : list
+        ChArUco corners (Nx1x2) and ids (Nx1) of each view.
+    """
+    rng = np.random.default_rng(seed)
+    w, h = image_size
+    objp = board_corners(board)
+    centre = objp.mean(axis=0)
+    size = np.ptp(objp[:, :2], axis=0).max()
+
+    corners = []
+    ids = []
+    for burst in range(bursts):
+        # two thirds of the poses are near the centre of the image
+        spread = 0.15 if burst % 3 else 0.4
+        u0 = w / 2 + rng.uniform(-spread, spread) * w
+        v0 = h / 2 + rng.uniform(-spread, spread) * h
+        tilt0 = rng.uniform([-45, -45, -20], [45, 45, 20])
+        # the board takes 30 to 80% of the image height
+        z0 = mtx[0, 0] * size / (rng.uniform(0.3, 0.8) * h)
+
+        # and the board is held there for longer
+        length = burst_size if spread > 0.15 else \
+            int(rng.integers(burst_size, 3 * burst_size + 1))
+        for _ in range(length):
+            tilt = np.radians(tilt0 + rng.normal(0, 1, 3))
+            z = z0 * (1 + rng.normal(0, 0.01))
+            u = u0 + rng.normal(0, 5)
+            v = v0 + rng.normal(0, 5)
+
+            rmat = cv2.Rodrigues(tilt)[0]
+            xyz = np.linalg.inv(mtx) @ np.array([u, v, 1]) * z
+            tvec = xyz - rmat @ centre
+            rvec = cv2.Rodrigues(rmat)[0]
+
+            uv = cv2.projectPoints(objp, rvec, tvec, mtx, dist)[0]
+            uv = uv.reshape(-1, 2) + rng.normal(0, noise, (len(objp), 2))
+            inside = ((uv[:, 0] >= 0) & (uv[:, 0] < w) &
+                      (uv[:, 1] >= 0) & (uv[:, 1] < h))
+            # the same threshold as the detection
+            if inside.sum() > 5:
+                corners.append(uv[inside].reshape(-1, 1, 2).astype(
+                    np.float32))
+                ids.append(np.where(inside)[0].reshape(-1, 1).astype(
+                    np.int32))
+
+    return corners, ids
+
+
+def reprojection_error(corners: list, ids: list, board, mtx: np.ndarray,
+                       dist: np.ndarray):
+    """
+    Compute the reprojection error of a calibration over a set of views.
+
+    The pose of each view is found again with the calibrated camera, so
+    that views that were not used in the calibration can be scored.
+
+    Parameters
+    ----------
+    corners, ids : list
+        ChArUco corners and ids of each view.
+    board : cv2.aruco.CharucoBoard
+        The board.
+    mtx, dist : np.ndarray
+        Camera matrix and distortion coefficients.
+
+    Returns
+    -------
+    rms : float
+        Root mean square reprojection error in pixels.
+    """
+    objp = board_corners(board)
+    squared = []
+    for uv, idx in zip(corners, ids):
+        uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+        xyz = objp[np.asarray(idx).ravel()]
+        ok, rvec, tvec = cv2.solvePnP(xyz, uv, mtx, dist)
+        if not ok:
+            continue
+        proj = cv2.projectPoints(xyz, rvec, tvec, mtx, dist)[0]
+        squared.append(((proj.reshape(-1, 2) - uv) ** 2).sum(axis=1))
+    return np.sqrt(np.concatenate(squared).mean())
+
+
+def undistortion_error(image_size: tuple, mtx: np.ndarray, dist: np.ndarray,
+                       true_mtx: np.ndarray, true_dist: np.ndarray):
+    """
+    Compare a calibration to the true camera.
+
+    Parameters
+    ----------
+    image_size : tuple
+        Image size as (width, height).
+    mtx, dist : np.ndarray
+        Calibrated camera matrix and distortion coefficients.
+    true_mtx, true_dist : np.ndarray
+        True camera matrix and distortion coefficients.
+
+    Returns
+    -------
+    error : float
+        Mean distance in pixels between the rays of a grid of pixels
+        according to each camera.
+    """
+    w, h = image_size
+    u, v = np.meshgrid(np.linspace(0, w - 1, 20), np.linspace(0, h - 1, 15))
+    uv = np.stack([u.ravel(), v.ravel()], axis=1).reshape(-1, 1, 2)
+    est = cv2.undistortPoints(uv, mtx, dist).reshape(-1, 2)
+    true = cv2.undistortPoints(uv, true_mtx, true_dist).reshape(-1, 2)
+    return np.linalg.norm(est - true, axis=1).mean() * true_mtx[0, 0]
+
+
+def subset(corners: list, ids: list, strategy: str, nviews: int, board,
+           image_size: tuple, seed: int = 42):
+    """
+    Choose the views to calibrate with.
+
+    Parameters
+    ----------
+    corners, ids : list
+        ChArUco corners and ids of each view.
+    strategy : str
+        One of all, first, random, stride or selected.
+    nviews : int
+        Number of views to keep.
+    board : cv2.aruco.CharucoBoard
+        The board.
+    image_size : tuple
+        Image size as (width, height).
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    keep : list
+        Indexes of the views.
+    """
+    n = len(corners)
+    if strategy == "all" or nviews >= n:
+        return list(range(n))
+    if strategy == "first":
+        return list(range(nviews))
+    if strategy == "random":
+        rng = np.random.default_rng(seed)
+        return sorted(rng.choice(n, nviews, replace=False).tolist())
+    if strategy == "stride":
+        return np.linspace(0, n - 1, nviews).round().astype(int).tolist()
+    if strategy == "selected":
+        return select_views(corners, ids, board, image_size, nviews)
+    raise ValueError("Unknown strategy \"{}\"".format(strategy))
+
+
+if __name__ == "__main__":
+
+    print("\nBenchmarking the calibration view selection, please wait...\n")
+
+    # Argument parser
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--input", "-i",
+                        action="store",
+                        dest="input",
+                        default="",
+                        required=False,
+                        help="Output of calib_ChArUco_offline.py (pickle) "
+                             "calibrated with all the views. Default is to "
+                             "generate synthetic views.",)
+
+    parser.add_argument("--views", "-N",
+                        action="store",
+                        dest="views",
+                        default="15,25,40",
+                        required=False,
+                        help="Comma separated numbers of views. "
+                             "Default is 15,25,40.",)
+
+    parser.add_argument("--strategies", "-s",
+                        action="store",
+                        dest="strategies",
+                        default="first,random,stride,selected",
+                        required=False,
+                        help="Comma separated ways of choosing the views, "
+                             "from first, random, stride and selected. "
+                             "Default is all of them.",)
+
+    parser.add_argument("--resolution", "-r",
+                        action="store",
+                        dest="resolution",
+                        default="2048,1536",
+                        required=False,
+                        help="Synthetic image size as width,height. "
+                             "Default is 2048,1536.",)
+
+    parser.add_argument("--bursts",
+                        action="store",
+                        dest="bursts",
+                        default=30,
+                        required=False,
+                        help="Number of distinct synthetic poses. "
+                             "Default is 30.",)
+
+    parser.add_argument("--burst_size",
+                        action="store",
+                        dest="burst_size",
+                        default=8,
+                        required=False,
+                        help="Number of near-duplicate views of each "
+                             "synthetic pose. Default is 8.",)
+
+    # board definition, as in calib_ChArUco_offline.py
+    parser.add_argument("--squares_x",
+                        action="store",
+                        dest="squares_x",
+                        default=5,
+                        required=False,
+                        help="Number of squares in the x direction.")
+
+    parser.add_argument("--squares_y",
+                        action="store",
+                        dest="squares_y",
+                        default=7,
+                        required=False,
+                        help="Number of squares in the y direction.")
+
+    parser.add_argument("--square_length",
+                        action="store",
+                        dest="square_length",
+                        required=False,
+                        default=413,
+                        help="Square side length (in pixels).")
+
+    parser.add_argument("--marker_length",
+                        action="store",
+                        dest="marker_length",
+                        required=False,
+                        default=247,
+                        help="Marker side length (in pixels).")
+
+    parser.add_argument("--dictionary_id",
+                        action="store",
+                        dest="dictionary_id",
+                        default="6X6_250",
+                        required=False,
+                        help="ArUco Dictionary id.")
+
+    parser.add_argument("--csv",
+                        action="store",
+                        dest="csv",
+                        default="",
+                        required=False,
+                        help="Save the results to this csv file.",)
+
+    args = parser.parse_args()
+
+    board, _ = create_board(int(args.squares_x), int(args.squares_y),
+                            int(args.square_length), int(args.marker_length),
+                            args.dictionary_id)
+
+    true_mtx = true_dist = None
+    if args.input:
+        with open(args.input, "rb") as f:
+            x = pickle.load(f)
+        corners = x["corners"]
+        ids = x["ids"]
+        height, width = x["last_frame"].shape[:2]
+        print("  -- {} views of {}x{} from {}".format(
+            len(corners), width, height, args.input))
+    else:
+        width, height = [int(v) for v in args.resolution.split(",")]
+        f = 0.9 * width
+        true_mtx = np.array([[f, 0, width / 2 + 12], [0, f, height / 2 - 8],
+                             [0, 0, 1]])
+        true_dist = np.array([-0.25, 0.08, 0.0005, -0.0003, 0.0])
+        corners, ids = synthetic_views(board, (width, height), true_mtx,
+                                       true_dist, bursts=int(args.bursts),
+                                       burst_size=int(args.burst_size))
+        print("  -- {} synthetic views of {}x{} ({} poses)".format(
+            len(corners), width, height, args.bursts))
+    image_size = (width, height)
+
+    runs = [("all", len(corners))]
+    for n in [int(v) for v in args.views.split(",")]:
+        for strategy in args.strategies.split(","):
+            runs.append((strategy, n))
+
+    rows = []
+    print("\n{:>9} {:>6} {:>9} {:>7} {:>8} {:>8} {:>8}".format(
+        "strategy", "views", "time s", "rms", "all px", "f err %",
+        "gt px"))
+    for strategy, n in runs:
+        # the selection counts towards the calibration time
+        start = perf_counter()
+        keep = subset(corners, ids, strategy, n, board, image_size)
+        retval, mtx, dist, _, _ = cv2.aruco.calibrateCameraCharuco(
+            [corners[k] for k in keep], [ids[k] for k in keep], board,
+            image_size, None, None)
+        elapsed = perf_counter() - start
+
+        row = {"strategy": strategy,
+               "views": len(keep),
+               "time": elapsed,
+               "rms": retval,
+               "reprojection": reprojection_error(corners, ids, board, mtx,
+                                                  dist),
+               "focal_error": np.nan,
+               "undistortion_error": np.nan}
+        if true_mtx is not None:
+            row["focal_error"] = 100 * np.abs(
+                np.diag(mtx)[:2] / true_mtx[0, 0] - 1).mean()
+            row["undistortion_error"] = undistortion_error(
+                image_size, mtx, dist, true_mtx, true_dist)
+        rows.append(row)
+        print("{strategy:>9} {views:>6} {time:>9.2f} {rms:>7.3f} "
+              "{reprojection:>8.3f} {focal_error:>8.2f} "
+              "{undistortion_error:>8.2f}".format(**row))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print("\n  -- Results saved to {}".format(args.csv))
+
+    print("\nMy work is done!\n")
@@ -10,6 +10,11 @@ import sys
 import json
 import argparse
 
+import queue
+import threading
+
+from multiprocessing import Pool
+
 import cv2
 
 from glob import glob
@@ -24,6 +29,13 @@ import pickle
 
 import matplotlib.pyplot as plt
 
+from view_selection import select_views
+
+# shared post-processing modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from camera_calibration import CameraCalibration  # noqa
+
 try:
     import gooey
     from gooey import GooeyParser
@@ -109,6 +121,235 @@ def drawDetectedCornersCharuco(img, corners, ids, rect_size=3,
     return img
 
 
+# board and dictionary of the detection workers, see init_detector()
+_BOARD = None
+_DICTIONARY = None
+
+
+def create_board(squares_x: int, squares_y: int, square_length: int,
+                 marker_length: int, dictionary_id: str):
+    """
+    Create the ChArUco board.
+
+    Parameters
+    ----------
+    squares_x, squares_y : int
+        Number of squares in the x and y directions.
+    square_length, marker_length : int
+        Square and marker side lengths (in pixels).
+    dictionary_id : str
+        ArUco dictionary id, e.g. 6X6_250.
+
+    Returns
+    -------
+    board : cv2.aruco.CharucoBoard
+        The board.
+    dictionary : cv2.aruco.Dictionary
+        The marker dictionary.
+    """
+    dict_id = getattr(cv2.aruco, "DICT_{}".format(dictionary_id))
+    dictionary = cv2.aruco.getPredefinedDictionary(dict_id)
+    board = cv2.aruco.CharucoBoard_create(
+        squares_x, squares_y, square_length, marker_length, dictionary)
+    return board, dictionary
+
+
+def init_detector(board_params: tuple):
+    """
+    Create the board in a detection process.
+
+    Boards cannot be pickled, so every worker creates its own.
+
+    Parameters
+    ----------
+    board_params : tuple
+        Arguments of create_board().
+    """
+    global _BOARD, _DICTIONARY
+    _BOARD, _DICTIONARY = create_board(*board_params)
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+
+
+def detect_charuco(task: tuple):
+    """
+    Detect the ChArUco corners in an image.
+
+    Parameters
+    ----------
+    task : tuple
+        Image file name and preview size as (width, height). Without a
+        preview size no preview is drawn.
+
+    Returns
+    -------
+    detection : dict
+        Marker corners and ids, ChArUco corners and ids (None if not
+        enough were found), image size as (height, width) and the
+        preview image (or None).
+    """
+    image, preview_size = task
+
+    # read
+    frame = cv2.imread(image)
+
+    # covert to grey scale
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    # detect
+    corners, ids, rejectedImgPoints = cv2.aruco.detectMarkers(
+        grey, _DICTIONARY)
+    cv2.aruco.refineDetectedMarkers(
+        grey, _BOARD, corners, ids, rejectedImgPoints)
+
+    detection = {"corners": corners, "ids": ids,
+                 "charuco_corners": None, "charuco_ids": None,
+                 "imsize": grey.shape, "preview": None}
+
+    if len(corners) > 0:  # if there is at least one marker detected
+
+        # refine
+        retval, ref_corners, ref_ids = cv2.aruco.interpolateCornersCharuco(
+            corners, ids, grey, _BOARD)
+
+        # calibrateCameraCharuco needs at least 4 corners
+        if retval > 5:
+            detection["charuco_corners"] = ref_corners
+            detection["charuco_ids"] = ref_ids
+
+    if preview_size:
+        if detection["charuco_corners"] is not None:
+            frame = draw_detection(frame, detection)
+        detection["preview"] = cv2.resize(frame, preview_size,
+                                          interpolation=cv2.INTER_LINEAR)
+
+    return detection
+
+
+def draw_detection(frame: np.ndarray, detection: dict):
+    """
+    Draw the board detected in an image.
+
+    Parameters
+    ----------
+    frame : np.ndarray
+        Image. It is drawn on.
+    detection : dict
+        Detection returned by detect_charuco().
+
+    Returns
+    -------
+    im_with_board : np.ndarray
+        Image with the ChArUco corners and markers.
+    """
+    im_with_board = cv2.aruco.drawDetectedCornersCharuco(
+        frame, detection["charuco_corners"], detection["charuco_ids"],
+        (0, 0, 255))
+    im_with_board = cv2.aruco.drawDetectedMarkers(
+        im_with_board, detection["corners"], detection["ids"])
+    return im_with_board
+
+
+def detect_images(images: list, board_params: tuple, workers: int = 1,
+                  preview_size: tuple = None):
+    """
+    Detect the ChArUco corners in a series of images.
+
+    Images are split into small shards that are processed by a pool of
+    worker processes, and the detections are returned in the order of
+    the images, so that the result does not depend on the number of
+    workers. Stopping the iteration stops the workers.
+
+    Parameters
+    ----------
+    images : list
+        Image file names.
+    board_params : tuple
+        Arguments of create_board().
+    workers : int
+        Number of worker processes. Default is 1 (no pool).
+    preview_size : tuple
+        Size of the preview images as (width, height). Optional.
+
+    Yields
+    ------
+    image : str
+        Image file name.
+    detection : dict
+        Detection, see detect_charuco().
+    """
+    tasks = [(image, preview_size) for image in images]
+    workers = max(1, min(int(workers), len(images)))
+
+    if workers == 1:
+        init_detector(board_params)
+        for image, detection in zip(images, map(detect_charuco, tasks)):
+            yield image, detection
+        return
+
+    # small shards keep the pool balanced and limit the work done past
+    # the last image needed
+    chunksize = max(1, min(4, len(images) // (workers * 8)))
+    pool = Pool(workers, initializer=init_detector,
+                initargs=(board_params,))
+    try:
+        for image, detection in zip(images, pool.imap(detect_charuco, tasks,
+                                                      chunksize)):
+            yield image, detection
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class AnnotationWriter:
+    """
+    Write images annotated with their detections on a background thread.
+
+    Parameters
+    ----------
+    path : str
+        Output folder. Created if needed.
+    """
+
+    def __init__(self, path: str):
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, image: str, detection: dict, name: str):
+        """
+        Queue an image.
+
+        Parameters
+        ----------
+        image : str
+            Image file name.
+        detection : dict
+            Detection, see detect_charuco().
+        name : str
+            Output name, without extension.
+        """
+        self.queue.put((image, detection, name))
+
+    def _run(self):
+        """Worker thread loop."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            image, detection, name = item
+            im_with_board = draw_detection(cv2.imread(image), detection)
+            cv2.imwrite(os.path.join(self.path, name + ".png"),
+                        im_with_board)
+
+    def close(self):
+        """Wait for the queued images to be written."""
+        self.queue.put(None)
+        self.thread.join()
+
+
 @gui_decorator
 def main():
     print("\nCamera calibration starting, please wait...\n")
@@ -199,6 +440,31 @@ def main():
                         default=25,
                         help="Maximum number of images to use.",)
 
+    parser.add_argument("--views",
+                        action="store",
+                        dest="views",
+                        required=False,
+                        default=0,
+                        help="Calibrate with only this many views, chosen "
+                             "for their image coverage and board pose. "
+                             "Default is to use all views.",)
+
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of detection processes. Default is the "
+                             "number of cores.",)
+
+    parser.add_argument("--annotated_path",
+                        action="store",
+                        dest="annotated_path",
+                        required=False,
+                        default="",
+                        help="Folder to save the images with the detected "
+                             "board to. Default is not to save them.",)
+
     parser.add_argument("--stream_height",
                         action="store",
                         dest="stream_height",
@@ -232,13 +498,10 @@ def main():
     marker_length = int(args.marker_length)  # marker side length (in pixels)
     dictionary_id = args.dictionary_id  # dictionary id
 
-    # create board
-    dict_id = getattr(cv2.aruco, "DICT_{}".format(dictionary_id))
-    dictionary = cv2.aruco.getPredefinedDictionary(dict_id)
-
     # create the board instance
-    board = cv2.aruco.CharucoBoard_create(
-        squares_x, squares_y, square_length, marker_length, dictionary)
+    board_params = (squares_x, squares_y, square_length, marker_length,
+                    dictionary_id)
+    board, dictionary = create_board(*board_params)
 
     # calibrate from detected corners
     if args.from_corners:
@@ -266,78 +529,75 @@ def main():
             sys.exit(
                 "   -- Not enough images or trying to calibrate from a file.")
 
+        # detect in parallel, the detections come back in order
+        preview_size = None
+        if args.show:
+            preview_size = (int(args.stream_width), int(args.stream_height))
+        detections = detect_images(images, board_params,
+                                   workers=int(args.workers),
+                                   preview_size=preview_size)
+        writer = None
+        if args.annotated_path:
+            writer = AnnotationWriter(args.annotated_path)
+
         # loop over all images
         all_corners = []
         all_ids = []
         total_images = 0
-        for i, image in enumerate(images):
+        last_image = images[-1]
+        for i, (image, detection) in enumerate(detections):
 
             print("  - processing image {} of {}".format(i + 1, len(images)),
                   end="\r")
 
-            # read
-            frame = cv2.imread(image)
-
-            # covert to grey scale
-            grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            imsize = grey.shape
-
-            # detect
-            corners, ids, rejectedImgPoints = cv2.aruco.detectMarkers(
-                grey, dictionary)
-            cv2.aruco.refineDetectedMarkers(
-                grey, board, corners, ids, rejectedImgPoints)
-
-            if len(corners) > 0:  # if there is at least one marker detected
+            if detection["charuco_corners"] is not None:
 
-                # refine
-                retval, ref_corners, ref_ids = cv2.aruco.interpolateCornersCharuco(
-                    corners, ids, grey, board)
+                # save
+                if writer is not None:
+                    writer.add(image, detection, str(total_images))
 
-                # calibrateCameraCharuco needs at least 4 corners
-                if retval > 5:
+                # append
+                all_corners.append(detection["charuco_corners"])
+                all_ids.append(detection["charuco_ids"])
 
-                    # draw board on image
-                    im_with_board = cv2.aruco.drawDetectedCornersCharuco(
-                        frame, ref_corners, ref_ids, (0, 0, 255))
-                    im_with_board = cv2.aruco.drawDetectedMarkers(
-                        im_with_board, corners, ids)
-
-                    # save 
-                    cv2.imwrite(args.output + "/" + str(total_images) + ".png",
-                              im_with_board)
-
-                    # append
-                    all_corners.append(ref_corners)
-                    all_ids.append(ref_ids)
-
-                    if total_images > max_images:
-                        print("\n  --> Found all images I needed. "
-                              "Breaking the loop after {} images.".format(
-                                  max_images))
-                        break
-
-                    total_images += 1
+                if total_images > max_images:
+                    print("\n  --> Found all images I needed. "
+                          "Breaking the loop after {} images.".format(
+                              max_images))
+                    last_image = image
+                    break
 
-            else:
-                pass
+                total_images += 1
 
             if args.show:
-                rsize = (int(args.stream_width), int(args.stream_height))
-                try:
-                    resized = cv2.resize(im_with_board, rsize,
-                                         interpolation=cv2.INTER_LINEAR)
-                except:
-                    resized = cv2.resize(frame, rsize,
-                                         interpolation=cv2.INTER_LINEAR)
-                    
-                cv2.imshow("Camera calibration, pres 'q' to quit.", resized)
+                cv2.imshow("Camera calibration, pres 'q' to quit.",
+                           detection["preview"])
                 if cv2.waitKey(200) & 0xFF == ord('q'):
+                    last_image = image
                     break
 
+        # stop the workers and finish writing
+        detections.close()
+        if writer is not None:
+            writer.close()
+
+        # the last image processed is kept with the calibration
+        frame = cv2.imread(last_image)
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        imsize = grey.shape
+
         # Destroy any open CV windows
         cv2.destroyAllWindows()
 
+    # keep the most informative views only
+    if int(args.views) > 0 and len(all_corners) > int(args.views):
+        keep = select_views(all_corners, all_ids, board,
+                            (grey.shape[1], grey.shape[0]), int(args.views))
+        print("\n  -- Selected {} of {} views.".format(len(keep),
+                                                       len(all_corners)))
+        all_corners = [all_corners[k] for k in keep]
+        all_ids = [all_ids[k] for k in keep]
+
     # sys.exit()
     print("\n - Starting calibrateCameraCharuco(), this will take a while.")
 
@@ -348,12 +608,7 @@ def main():
     print(f"\n    - Calibration error: {round(retval, 2)} units")
 
     # undistort
-    h,  w = grey.shape[:2]
-    newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-        mtx, dist, (w, h), 1, (w, h))
-
-    # undistort
-    dst = cv2.undistort(frame, mtx, dist, None, newcameramtx)
+    dst = CameraCalibration(mtx, dist).undistort(frame)
 
     # save the output
     out = {}
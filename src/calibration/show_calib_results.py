@@ -2,6 +2,7 @@
 # POURPOSE : Display the results of a calibration
 # AUTHOR   : Caio Eadi Stringari
 
+import os
 import argparse
 
 import cv2
@@ -12,6 +13,11 @@ import matplotlib.pyplot as plt
 
 import sys
 
+# shared post-processing modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from camera_calibration import CameraCalibration  # noqa
+
 
 if __name__ == '__main__':
 
@@ -53,13 +59,9 @@ if __name__ == '__main__':
     frame = x["last_frame"]
     size = x["chessboard_size"]
 
-    # undistort
-    h,  w = frame.shape[:2]
-    newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-        mtx, dist, (w, h), 1, (w, h))
-
-    # undistort
-    dst = cv2.undistort(frame, mtx, dist, None, newcameramtx)
+    # undistort, the maps are kept next to the calibration file
+    calibration = CameraCalibration(mtx, dist, fname=args.input)
+    dst = calibration.undistort(frame)
 
     #
     # try:
@@ -0,0 +1,196 @@
+"""
+Select the most informative views for a ChArUco calibration.
+
+# SCRIPT   : view_selection.py
+# POURPOSE : Score the ChArUco detections of a calibration by how much of
+#            the image they cover and how different the board pose is from
+#            the views already chosen, and greedily keep the most
+#            informative ones, so that near-duplicate frames do not slow
+#            down calibrateCameraCharuco().
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import numpy as np
+
+import cv2
+
+
+# image cells used to measure the coverage, as (columns, rows)
+COVERAGE_GRID = (8, 6)
+
+# parameters of calibrateCameraCharuco(): fx, fy, cx, cy, k1, k2, p1, p2, k3
+NINTRINSICS = 9
+
+
+def board_corners(board):
+    """
+    Return the 3D coordinates of the ChArUco corners of a board.
+
+    Parameters
+    ----------
+    board : cv2.aruco.CharucoBoard
+        The board.
+
+    Returns
+    -------
+    corners : np.ndarray
+        Nx3 array, indexed by corner id.
+    """
+    try:
+        corners = board.getChessboardCorners()
+    except AttributeError:  # OpenCV < 4.7
+        corners = board.chessboardCorners
+    return np.asarray(corners, dtype=np.float64).reshape(-1, 3)
+
+
+def view_features(corners: list, ids: list, board, image_size: tuple,
+                  grid: tuple = COVERAGE_GRID):
+    """
+    Describe each view by its image coverage and what it tells about the
+    camera intrinsics.
+
+    The board pose of each view is found with a planar PnP against a rough
+    camera (focal length equal to the image size, no distortion). The
+    information of the view is then J'J of its reprojection Jacobian with
+    respect to the intrinsics, once the pose is accounted for (the Schur
+    complement of the pose block): views of a tilted board tell about the
+    focal length, views near the edges tell about the distortion, and a
+    view that only repeats another tells nothing new.
+
+    Parameters
+    ----------
+    corners, ids : list
+        ChArUco corners and ids of each view, as returned by
+        cv2.aruco.interpolateCornersCharuco().
+    board : cv2.aruco.CharucoBoard
+        The board.
+    image_size : tuple
+        Image size as (width, height).
+    grid : tuple
+        Coverage cells as (columns, rows).
+
+    Returns
+    -------
+    cells : np.ndarray
+        Boolean array (views, cells), true for the cells with corners.
+    information : np.ndarray
+        Array (views, 9, 9) with the information of each view about the
+        intrinsics. Zero if the pose could not be found.
+    npoints : np.ndarray
+        Number of corners of each view.
+    """
+    w, h = image_size
+    objp = board_corners(board)
+    f = max(w, h)
+    mtx = np.array([[f, 0, w / 2], [0, f, h / 2], [0, 0, 1]],
+                   dtype=np.float64)
+    dist = np.zeros(5)
+
+    cells = np.zeros((len(corners), grid[0] * grid[1]), dtype=bool)
+    information = np.zeros((len(corners), NINTRINSICS, NINTRINSICS))
+    npoints = np.zeros(len(corners), dtype=int)
+    for k, (uv, idx) in enumerate(zip(corners, ids)):
+        uv = np.asarray(uv, dtype=np.float64).reshape(-1, 2)
+        idx = np.asarray(idx).ravel()
+        npoints[k] = len(idx)
+
+        # image cells with corners
+        col = np.clip((uv[:, 0] / w * grid[0]).astype(int), 0, grid[0] - 1)
+        row = np.clip((uv[:, 1] / h * grid[1]).astype(int), 0, grid[1] - 1)
+        cells[k, row * grid[0] + col] = True
+
+        # board pose
+        if len(idx) < 4:
+            continue
+        try:
+            ok, rvec, tvec = cv2.solvePnP(objp[idx], uv, mtx, None,
+                                          flags=cv2.SOLVEPNP_IPPE)
+        except cv2.error:
+            continue
+        if not ok:
+            continue
+
+        # Jacobian columns: rvec, tvec, f, c, distortion
+        jac = cv2.projectPoints(objp[idx], rvec, tvec, mtx, dist)[1]
+        pose, intrinsics = jac[:, :6], jac[:, 6:6 + NINTRINSICS]
+        cross = pose.T @ intrinsics
+        try:
+            information[k] = intrinsics.T @ intrinsics - \
+                cross.T @ np.linalg.solve(pose.T @ pose, cross)
+        except np.linalg.LinAlgError:
+            continue
+
+    return cells, information, npoints
+
+
+def select_views(corners: list, ids: list, board, image_size: tuple,
+                 nviews: int, grid: tuple = COVERAGE_GRID,
+                 coverage_weight: float = 1.0):
+    """
+    Greedily select the most informative views.
+
+    Each next view is the one that adds the most: the gain in the log
+    determinant of the information about the intrinsics (see
+    view_features()), plus (times coverage_weight) the fraction of the
+    image cells it covers that no chosen view covers yet. Near-duplicate
+    frames add almost nothing and are only taken when there is nothing
+    else left.
+
+    Parameters
+    ----------
+    corners, ids : list
+        ChArUco corners and ids of each view.
+    board : cv2.aruco.CharucoBoard
+        The board.
+    image_size : tuple
+        Image size as (width, height).
+    nviews : int
+        Number of views to keep. All are kept if zero or less.
+    grid : tuple
+        Coverage cells as (columns, rows).
+    coverage_weight : float
+        Weight of the coverage against the information.
+
+    Returns
+    -------
+    keep : list
+        Indexes of the selected views, in their original order.
+    """
+    nviews = int(nviews)
+    if nviews <= 0 or len(corners) <= nviews:
+        return list(range(len(corners)))
+
+    cells, information, npoints = view_features(corners, ids, board,
+                                                image_size, grid)
+
+    # make the parameters comparable, the focal length is in pixels and
+    # the distortion is not
+    scale = np.sqrt(np.diag(information.sum(axis=0))) + 1e-12
+    information = information / np.outer(scale, scale)
+
+    # a small prior keeps the determinant finite with few views
+    total = 1e-3 * np.eye(NINTRINSICS)
+    covered = np.zeros(cells.shape[1], dtype=bool)
+    available = np.ones(len(corners), dtype=bool)
+
+    # ties go to the views with more corners
+    tie_break = 1e-6 * npoints / npoints.max()
+
+    keep = []
+    for _ in range(nviews):
+        gain = np.linalg.slogdet(total + information)[1] - \
+            np.linalg.slogdet(total)[1]
+        gain += coverage_weight * cells[:, ~covered].sum(axis=1) / \
+            cells.shape[1]
+        gain += tie_break
+        gain[~available] = -np.inf
+
+        best = int(np.argmax(gain))
+        keep.append(best)
+        available[best] = False
+        total += information[best]
+        covered |= cells[best]
+
+    return sorted(keep)
@@ -0,0 +1,144 @@
+"""
+Write optical flow fields incrementally.
+
+# SCRIPT   : flow_io.py
+# POURPOSE : Stream optical flow fields to a chunked, compressed NetCDF4
+#            file as they are computed.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import numpy as np
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+
+VARIABLES = ["u", "v", "angle", "displacement"]
+
+# int16 packing as (scale_factor, add_offset). Displacements are in grid
+# cells per frame, angles in radians.
+INT16_PACKING = {"u": (0.001, 0.),
+                 "v": (0.001, 0.),
+                 "angle": (0.0001, np.pi),
+                 "displacement": (0.001, 0.)}
+
+PRECISIONS = ["float64", "float32", "int16"]
+
+
+class FlowWriter:
+    """
+    Append optical flow fields to a NetCDF4 file.
+
+    Each field is written to disk as soon as it is computed, one chunk per
+    time step, so memory use does not depend on the number of frames.
+
+    Parameters
+    ----------
+    fname : str
+        Output file name.
+    xlin, ylin : np.ndarray
+        Grid coordinates in x and y.
+    precision : str
+        Storage type. One of float64, float32 or int16 (scaled, see
+        INT16_PACKING; values outside the packable range are clipped).
+        Default is float32.
+    complevel : int or dict
+        Compression level (0-9), or a dict with the level of each variable.
+        Zero disables compression. Default is 4.
+    units : str
+        Time units. Default is 'days since 2000-01-01 00:00:00'.
+    calendar : str
+        Time calendar. Default is gregorian.
+    """
+
+    def __init__(self, fname: str, xlin: np.ndarray, ylin: np.ndarray,
+                 precision: str = "float32", complevel=4,
+                 units: str = "days since 2000-01-01 00:00:00",
+                 calendar: str = "gregorian"):
+
+        if netCDF4 is None:
+            raise ImportError("NetCDF output requires netCDF4, install it "
+                              "with pip install netcdf4.")
+        if precision not in PRECISIONS:
+            raise ValueError("Wrong precision. Use float64, float32 or "
+                             "int16.")
+        if not isinstance(complevel, dict):
+            complevel = {var: complevel for var in VARIABLES}
+
+        self.ntimes = 0
+        self.limits = {}
+
+        self.ds = netCDF4.Dataset(fname, "w", format="NETCDF4")
+        self.ds.createDimension("time", None)
+        self.ds.createDimension("y", len(ylin))
+        self.ds.createDimension("x", len(xlin))
+
+        self.time = self.ds.createVariable("time", "f8", ("time", ))
+        self.time.units = units
+        self.time.calendar = calendar
+
+        # time between the two frames of each flow field
+        self.dt = self.ds.createVariable("dt", "f8", ("time", ))
+        self.dt.units = "seconds"
+
+        x = self.ds.createVariable("x", "f8", ("x", ))
+        y = self.ds.createVariable("y", "f8", ("y", ))
+        x[:] = xlin
+        y[:] = ylin
+
+        dtype = {"float64": "f8", "float32": "f4", "int16": "i2"}[precision]
+        self.variables = {}
+        for var in VARIABLES:
+            level = int(complevel.get(var, 0))
+            nc = self.ds.createVariable(
+                var, dtype, ("time", "y", "x"), zlib=level > 0,
+                complevel=max(level, 1), chunksizes=(1, len(ylin), len(xlin)))
+            if precision == "int16":
+                scale, offset = INT16_PACKING[var]
+                nc.scale_factor, nc.add_offset = scale, offset
+                # values outside the packable range are clipped
+                self.limits[var] = (offset - 32767 * scale,
+                                    offset + 32767 * scale)
+            self.variables[var] = nc
+
+    def append(self, time, dt: float = np.nan, **fields):
+        """
+        Append the flow fields of one time step.
+
+        Parameters
+        ----------
+        time : datetime.datetime
+            Time of the flow field.
+        dt : float
+            Seconds between the two frames of the flow field.
+        fields : np.ndarray
+            One 2D array for each of u, v, angle and displacement.
+
+        Returns
+        -------
+        None
+        """
+        i = self.ntimes
+        self.time[i] = netCDF4.date2num(time, self.time.units,
+                                        self.time.calendar)
+        self.dt[i] = dt
+        for var in VARIABLES:
+            field = fields[var]
+            if var in self.limits:
+                field = np.clip(field, *self.limits[var])
+            self.variables[var][i, :, :] = field
+        self.ntimes += 1
+
+    def close(self):
+        """Close the file."""
+        self.ds.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
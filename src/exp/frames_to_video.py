@@ -1,9 +1,16 @@
+import os
+import sys
+
 import argparse
 
+import numpy as np
+
 import cv2
 
-from glob import glob
-from natsort import natsorted
+# frame sources
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from frame_source import open_frames  # noqa
 
 
 def main():
@@ -11,21 +18,23 @@ def main():
     inp = args.input[0]
     out = args.output[0]
     fps = int(args.fps[0])
-    files = natsorted(glob(inp + "/*"))
-    if not files:
+    frames = open_frames(inp, reduce=int(args.reduce[0]), prefetch=4)
+    if not len(frames):
         print("Verify input frames. Make sure they are png images.")
 
-    frame = cv2.imread(files[0])
-    height, width, layers = frame.shape
+    # mono bursts give grey frames
+    height, width = frames.shape[:2]
 
     video = cv2.VideoWriter(out,
                             cv2.VideoWriter_fourcc(*'mp4v'), fps,
-                            (width, height))
+                            (width, height), len(frames.shape) == 3)
 
     k = 0
-    for image in files:
-        print(" -- processing {} of {}".format(k+1, len(files)), end="\r")
-        video.write(cv2.imread(image))
+    for frame in frames:
+        print(" -- processing {} of {}".format(k+1, len(frames)), end="\r")
+        if frame.dtype == np.uint16:  # the video is 8-bit
+            frame = (frame >> 8).astype(np.uint8)
+        video.write(frame)
         k += 1
 
     cv2.destroyAllWindows()
@@ -55,6 +64,15 @@ if __name__ == '__main__':
                         required=False,
                         help="Frames per second of the output video.",)
 
+    parser.add_argument("--reduce", "-reduce",
+                        nargs=1,
+                        action="store",
+                        dest="reduce",
+                        default=[1],
+                        required=False,
+                        help="Decode the frames at 1/2, 1/4 or 1/8 of their "
+                             "resolution, for previews. Default is 1.",)
+
     parser.add_argument("--output", "-o",
                         nargs=1,
                         action="store",
@@ -11,6 +11,7 @@ Based on https://github.com/tensorflow/examples/tree/master/lite/examples/image_
 """
 
 import os
+import sys
 
 import argparse
 
@@ -22,13 +23,15 @@ import numpy as np
 
 import pandas as pd
 
-from glob import glob
-from natsort import natsorted
-
 from tflite_runtime.interpreter import Interpreter
 
 from tqdm import tqdm
 
+# frame sources
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from frame_source import open_frames  # noqa
+
 
 def load_labels(path):
     """Loads the labels file. Supports files with or without index numbers."""
@@ -179,7 +182,13 @@ def main():
     parser.add_argument("--save", "--save_frames",
                         action="store_true",
                         dest="save",
-                        help="Save frames with detections.",)
+                        help="Save frames with detections. Frames are "
+                        "saved at the resolution fed to the model.",)
+
+    parser.add_argument("--full_resolution",
+                        action="store_true",
+                        dest="full_resolution",
+                        help="Decode the frames at full resolution.",)
 
     parser.add_argument("--save_path",
                         action="store",
@@ -212,10 +221,11 @@ def main():
         0]['shape']
 
     # get images
-    images = natsorted(glob(data + f"/*.{image_format}"))
+    images = open_frames(data, f".{image_format}", prefetch=4)
 
-    camera_width, camera_height = (cv2.imread(images[0]).shape[1],
-                                   cv2.imread(images[0]).shape[0])
+    # probed from the file header, without decoding
+    full_height, full_width = images.shape[:2]
+    camera_height, camera_width = full_height, full_width
 
     # define region of interest. Format is top_left dx, dy.
     roi = args.roi
@@ -223,9 +233,17 @@ def main():
         roi = [0, 0, camera_height, camera_width]
     else:
         roi = np.array(roi).astype(int)
-        img = cv2.imread(images[0])
-        img = img[roi[0]:roi[0] + roi[2], roi[1]:roi[1] + roi[3], :]
-        camera_width, camera_height = (img.shape[1], img.shape[0])
+        camera_width = min(roi[1] + roi[3], camera_width) - roi[1]
+        camera_height = min(roi[0] + roi[2], camera_height) - roi[0]
+
+    # the model only needs its input size over the region of interest, so
+    # decode the frames at the largest reduction that still gives it
+    if not args.full_resolution:
+        images = images.at_resolution(
+            [-(-input_width * full_width // camera_width),
+             -(-input_height * full_height // camera_height)])
+    reduce = images.reduce
+    roi = [int(v) // reduce for v in roi]
 
     out_bboxes = []
     out_labels = []
@@ -236,9 +254,9 @@ def main():
     if not show:
         pbar = tqdm(total=len(images))
 
-    for i, image in enumerate(images):
+    for i, img in enumerate(images):
 
-        img = cv2.cvtColor(cv2.imread(image), cv2.COLOR_BGR2RGB)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
         # cut to ROI
         img = img[roi[0]:roi[0] + roi[2], roi[1]:roi[1] + roi[3], :]
@@ -254,14 +272,16 @@ def main():
                                                     camera_width,
                                                     camera_height)
 
-        # draw bounding boxes
+        # draw bounding boxes, on the decoded frame
         annotated = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
         if labels:
             for j in range(len(labels)):
                 if labels[j] == "person":
                     x, y, dx, dy = bboxes[j]
-                    annotated = cv2.rectangle(annotated, (x, y),
-                        (x + dx, y + dy), (0, 255, 0), 2)
+                    annotated = cv2.rectangle(annotated,
+                        (x // reduce, y // reduce),
+                        ((x + dx) // reduce, (y + dy) // reduce),
+                        (0, 255, 0), 2)
 
                     # append to output
                     out_bboxes.append([x, y, dx, dy])
@@ -13,17 +13,17 @@ v1.0      : 05/07/2021 [Caio Stringari]
 """
 
 import os
+import sys
 import argparse
 
 import math
 
 from copy import copy
 
-from glob import glob
-from natsort import natsorted
-
 import numpy as np
 
+import cv2
+
 from skimage.util import view_as_blocks
 
 import pandas as pd
@@ -42,6 +42,11 @@ import matplotlib.patches as patches
 mpl.rcParams["axes.linewidth"] = 2
 mpl.rcParams['patch.edgecolor'] = "k"
 
+# frame sources
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from frame_source import open_frames  # noqa
+
 # tf.get_logger().setLevel('INFO')
 
 
@@ -178,15 +183,23 @@ def main():
     # M = tf.keras.models.load_model(model)
 
     # --- parameters ---
-    roi = np.array(args.region_of_interest).astype(int)
+    reduce = int(args.reduce[0])
+    roi = np.array(args.region_of_interest).astype(int) // reduce
 
     # get the input image size
     size = (input_height, input_width)
 
+    # reduced frames may leave fewer model input tiles in the region of
+    # interest
+    if reduce > 1 and (roi[2] < size[1] or roi[3] < size[0]):
+        print("  -- warning: the region of interest is smaller than the "
+              "model input ({}x{}) at 1/{} resolution".format(
+                  size[1], size[0], reduce))
+
     # verify if the input path exists,
-    # if it does, then get the frame names
-    if os.path.isdir(frames):
-        frames = natsorted(glob(frames + "/*"))
+    # if it does, then open the frames
+    if os.path.exists(frames):
+        frames = open_frames(frames, reduce=reduce, prefetch=4)
     else:
         raise IOError("No such file or directory \"{}\"".format(frames))
 
@@ -217,7 +230,7 @@ def main():
     for k, frame in enumerate(frames):
 
         # load image
-        img = plt.imread(frame)
+        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
         # create a mask
         mask = np.zeros(img.shape).astype(int)
@@ -278,7 +291,8 @@ def main():
             except Exception:
                 pbar.write(f"warning: could not process frame {k}")
 
-        # append to output
+        # append to output, in full resolution pixels
+        df[["i", "j"]] *= reduce
         DF.append(df[["i", "j", "frame"]])
 
         pbar.update()
@@ -323,6 +337,16 @@ if __name__ == '__main__':
                         default=[256, 256, 1024, 512],
                         help="Region of Interest. Format is top_left dx, dy.",)
 
+    parser.add_argument("--reduce", "-reduce",
+                        nargs=1,
+                        action="store",
+                        dest="reduce",
+                        default=[1],
+                        required=False,
+                        help="Decode the frames at 1/2, 1/4 or 1/8 of their "
+                             "resolution. The models were trained on full "
+                             "resolution tiles. Default is 1.",)
+
     parser.add_argument("--frames-to-process", "-nframes", "--nframes", "-N",
                         nargs=1,
                         action="store",
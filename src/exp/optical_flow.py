@@ -16,23 +16,13 @@ import argparse
 
 import datetime
 
-from glob import glob
-from natsort import natsorted
-
 import numpy as np
 
-import pickle
 import pandas as pd
 import xarray as xr
 
 import cv2
 
-from scipy.interpolate import (LinearNDInterpolator,
-                               NearestNDInterpolator,
-                               CloughTocher2DInterpolator)
-
-import xarray as xr
-
 from tqdm import tqdm
 
 from matplotlib import path
@@ -47,6 +37,17 @@ except ImportError:
 import warnings
 # warnings.simplefilter("ignore", UserWarning)
 
+# shared post-processing modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from rectification import RectificationPlan  # noqa
+from camera_calibration import CameraCalibration  # noqa
+
+from frame_source import open_frames, read_ahead  # noqa
+from frame_cache import FrameCache, array_hash  # noqa
+
+from flow_io import FlowWriter  # noqa
+
 
 # <<< GUI >>>
 def flex_add_argument(f):
@@ -83,99 +84,37 @@ else:
 # <<< END GUI >>>
 
 
-def find_homography(uv: np.ndarray, xyz: np.ndarray, mtx: np.ndarray,
-                    dist_coeffs: np.ndarray = np.zeros((1, 4)), z: float = 0,
-                    compute_error: bool = False):
+def projected_frames(images, plan: RectificationPlan, prefetch: int = 4,
+                     cache: FrameCache = None):
     """
-    Find homography based on ground control points.
+    Read and project grey frames on a background thread.
 
-    Parameters
-    ----------
-    uv : np.ndarray
-        Nx2 array of image coordinates of gcps.
-    xyz : np.ndarray
-        Nx3 array of real-world coordinates of gcps.
-    mtx : np.ndarray
-        3x3 array containing the camera matrix
-    dist_coeffs : np.ndarray
-        1xN array with distortion coefficients with N = 4, 5 or 8
-    z : float
-        Real-world elevation to which the image should be projected.
-    compute_error : bool
-        Will compute re-projection erros in pixels if true.
-
-    Returns
-    -------
-    error: float
-        Rectification error in pixels or nan if compute_error=False.
-    H: np.ndarray
-        3x3 homography matrix.
-    """
-    uv = np.asarray(uv).astype(np.float32)
-    xyz = np.asarray(xyz).astype(np.float32)
-    mtx = np.asarray(mtx).astype(np.float32)
-
-    # compute camera pose
-    retval, rvec, tvec = cv2.solvePnP(xyz, uv, mtx, dist_coeffs)
-
-    # convert rotation vector to rotation matrix
-    R = cv2.Rodrigues(rvec)[0]
-
-    # assume height of projection plane
-    R[:, 2] = R[:, 2] * z
-
-    # add translation vector
-    R[:, 2] = R[:, 2] + tvec.flatten()
-
-    # compute homography
-    H = np.linalg.inv(np.dot(mtx, R))
-
-    # normalize homography
-    H = H / H[-1, -1]
-
-    # compute errors
-    if compute_error:
-        tot_error = 0
-        total_points = 0
-        for i in range(len(xyz)):
-            reprojected_points, _ = cv2.projectPoints(xyz[i],
-                                                      rvec, tvec,
-                                                      mtx,
-                                                      dist_coeffs)
-            tot_error += np.sum(np.abs(uv[i] - reprojected_points)**2)
-            total_points += i
-        mean_error_px = np.sqrt(tot_error / total_points)
-    else:
-        mean_error_px = None
-
-    return mean_error_px, H
-
-
-def rectify_image(img: np.ndarray, mtx: np.ndarray):
-    """
-    Rectify mage coordinates.
+    Frames are decoded and projected ahead of the consumer, which can then
+    spend its time computing the flow. At most ``prefetch`` frames are held
+    in memory.
 
     Parameters
     ----------
-    img : np.ndarray
-        Input image aray.
-    mtx : np.ndarray
-        3x3 array containing the camera matrix
+    images : FrameSource
+        Grey frames, see frame_source.py.
+    plan : RectificationPlan
+        Projection of the raw frames onto the grid.
+    prefetch : int
+        Maximum number of frames read ahead.
+    cache : FrameCache
+        Cache of projected frames, keyed by frame and projection. Only the
+        frames missing from it are decoded and projected. Optional.
 
     Returns
     -------
-    x, y: np.ndarray
-        rectified coordinates
+    frames : generator
+        Projected grey frames.
     """
-
-    # get_pixel_coordinates(img)
-    u, v = np.meshgrid(range(img.shape[1]), range(img.shape[0]))
-    uv = np.vstack((u.flatten(), v.flatten())).T
-
-    # transform image using homography
-    xy = cv2.perspectiveTransform(np.asarray([uv]).astype(np.float32), mtx)[0]
-
-    return xy[:, 0].reshape(u.shape[:2]), xy[:, 1].reshape(v.shape[:2])
+    if cache is not None:
+        key = array_hash(plan.map_x, plan.map_y, plan.method)
+        return read_ahead(iter(images.cached(cache, plan.rectify, key)),
+                          prefetch)
+    return read_ahead((plan.rectify(frame) for frame in images), prefetch)
 
 
 @gui_decorator
@@ -196,7 +135,7 @@ def main():
                             dest="input",
                             default="../../data/boomerang",
                             required=False,
-                            help="Input folder with images.",
+                            help="Input folder with images, or video file.",
                             widget='DirChooser')
 
         parser.add_argument("--camera_matrix", "-mtx",
@@ -237,7 +176,7 @@ def main():
                         dest="input",
                         default="../../data/boomerang",
                         required=False,
-                        help="Input folder with images.",)
+                        help="Input folder with images, or video file.",)
 
         parser.add_argument("--camera_matrix", "-mtx",
                             action="store",
@@ -322,6 +261,16 @@ def main():
                         default=2,
                         help="Aquistion frequency in Hz. Default is 2Hz.")
 
+    parser.add_argument("--frame_index",
+                        action="store",
+                        dest="frame_index",
+                        required=False,
+                        default="",
+                        help="Frame index written by the capture. Frame "
+                             "times are read from it instead of using "
+                             "--start_time and --frequency. Default is to "
+                             "look for one in the input folder.")
+
     parser.add_argument("--image_format",
                         action="store",
                         dest="image_format",
@@ -389,6 +338,42 @@ def main():
                              "for the polynomial expansion; for poly_n=5, you can set poly_sigma=1.1, for poly_n=7, "
                              "a good value would be poly_sigma=1.5.")
 
+    parser.add_argument("--prefetch",
+                        action="store",
+                        dest="prefetch",
+                        default=4,
+                        help="Number of frames decoded and projected ahead "
+                             "of the flow computation. Default is 4.")
+
+    parser.add_argument("--precision",
+                        action="store",
+                        dest="precision",
+                        default="float32",
+                        help="Output storage type. One of float64, float32 or "
+                             "int16 (scaled). Default is float32.")
+
+    parser.add_argument("--complevel",
+                        action="store",
+                        dest="complevel",
+                        default=4,
+                        help="Output compression level (0-9). Zero disables "
+                             "compression. Default is 4.")
+
+    parser.add_argument("--cache_dir",
+                        action="store",
+                        dest="cache_dir",
+                        default="",
+                        help="Folder to keep the projected frames in, so "
+                             "that runs over the same frames skip decoding. "
+                             "Default is no cache.")
+
+    parser.add_argument("--cache_size",
+                        action="store",
+                        dest="cache_size",
+                        default=10,
+                        help="Cache size in GB. Least recently used frames "
+                             "are evicted. Default is 10.")
+
     parser.add_argument("--show_results", "-show",
                         action="store_true",
                         dest="show",
@@ -397,23 +382,15 @@ def main():
     args = parser.parse_args()
 
     # read camera matrix and distortion coefficients
-    if args.camera_matrix.lower().endswith("json"):
-        with open(args.camera_matrix, 'r') as f:
-            cam = json.load(f)
-            mtx = np.asarray(cam["camera_matrix"])
-            dist = np.asarray(cam["distortion_coefficients"])
-    else:
-        with open(args.camera_matrix, 'rb') as f:
-            cam = pickle.load(f)
-            mtx = cam["camera_matrix"]
-            dist = cam["distortion_coefficients"]
+    calibration = CameraCalibration.load(args.camera_matrix)
 
     # parse time and FPS
     start_date = datetime.datetime.strptime(args.start_time, "%Y%m%d:%H%M%S")
     freq = float(args.aquisition_frequency)
 
     # search for images
-    images = natsorted(glob(args.input + "/*{}".format(args.image_format)))
+    images = open_frames(args.input, args.image_format,
+                         index_file=args.frame_index or None, grey=True)
     start = datetime.datetime.now()
     print(f"  -- Found {len(images)} images, starting at {start}")
     if int(args.n_images) == -1:
@@ -425,7 +402,6 @@ def main():
         images = images[0:n_images]
     
     print("  -- Processing {} images.".format(n_images))
-    first_img = cv2.imread(images[0])
 
     # read gcp coordinates
     df = pd.read_csv(args.gcps)
@@ -439,27 +415,10 @@ def main():
     else:
         pheight = float(args.projection_height)
 
-    error, H = find_homography(uv, xyz, mtx, dist_coeffs=dist, z=pheight,
-                               compute_error=args.reprojection_error)
-    ximg, yimg = rectify_image(first_img, H)
-    if error:
-        print(f"  -- Re-projection error is {round(error, 1)} pixels")
-
-    # image coordinate points
-    XY = np.vstack([ximg.flatten(), yimg.flatten()]).T
-
     # get points inside bbox
     bbox = args.bbox.split(",")
     bbox = np.array([float(bbox[0]), float(bbox[1]),
                      float(bbox[2]), float(bbox[3])])
-    rect = patches.Rectangle((bbox[0], bbox[1]), bbox[2], bbox[3],
-                             linewidth=2, edgecolor='r', facecolor='none')
-    insiders = rect.contains_points(XY)
-    insiders_idx = np.arange(0, len(XY), 1)[insiders]
-    outsiders_idx = np.arange(0, len(XY), 1)[~insiders]
-    # iimg, jimg = np.unravel_index(outsiders_idx, ximg.shape)
-
-    points = XY[insiders_idx, :]
 
     # define grid
     dx = float(args.dx)
@@ -469,9 +428,21 @@ def main():
         dy = min(dx, dy)
         print("   -- warning: can only handle dx=dy. I am using the smallest.")
 
-    xlin = np.arange(bbox[0], bbox[0] + bbox[2], dx)
-    ylin = np.arange(bbox[1], bbox[1] + bbox[3], dy)
-    grid_x, grid_y = np.meshgrid(xlin, ylin)
+    # the projection onto the grid is a single remap of the raw frame
+    methods = {"nearest": "nearest", "linear": "linear", "ct": "cubic"}
+    if args.interp_method.lower() not in methods:
+        raise ValueError("Wrong interpolation methd. Use linear, nearest or ct.")
+    h, w = images.shape[:2]
+    plan = RectificationPlan.build(calibration, xyz, uv, bbox, dx, dy,
+                                   (w, h), projection_height=pheight,
+                                   method=methods[args.interp_method.lower()],
+                                   compute_error=args.reprojection_error)
+    if plan.error:
+        print(f"  -- Re-projection error is {round(plan.error, 1)} pixels")
+
+    xlin = plan.xlin
+    ylin = plan.ylin
+    grid_x, grid_y = plan.grid
 
     # read the mask
     with open(args.mask) as f:
@@ -485,11 +456,6 @@ def main():
     outsiders_idx = np.arange(0, len(grid_points), 1)[~insiders]
     imask, jmask = np.unravel_index(outsiders_idx, grid_x.shape)
 
-    # get new camera matrix
-    h,  w = first_img.shape[:2]
-    newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-        mtx, dist, (w, h), 1, (w, h))
-
     # parameter specifying the image scale (<1) to build pyramids for each image;
     # pyr_scale=0.5 means a classical pyramid, where each next layer is twice smaller than
     # the previous one.
@@ -516,44 +482,26 @@ def main():
     # a good value would be poly_sigma=1.5.
     poly_sigma = float(args.poly_sigma)  # 1.1
 
+    # frame times, exact if the capture wrote a frame index
+    start_date, seconds = images.times(start_date, freq)
+
     # < timeloop >
     pbar = tqdm(total=len(images) - 1)
 
-    # output variables
-    uout = np.zeros([len(images) - 1, grid_x.shape[0], grid_y.shape[1]])
-    vout = np.zeros([len(images) - 1, grid_x.shape[0], grid_y.shape[1]])
-    mout = np.zeros([len(images) - 1, grid_x.shape[0], grid_y.shape[1]])
-    aout = np.zeros([len(images) - 1, grid_x.shape[0], grid_y.shape[1]])
-
-    times = np.array([start_date] * (len(images) - 1))
-    now = start_date
-    dt = datetime.timedelta(seconds=1 / freq)
-
-    for i in range(len(images) - 1):
-
-        # read the image
-        prv = cv2.cvtColor(cv2.imread(images[i]), cv2.COLOR_BGR2GRAY)
-        nxt = cv2.cvtColor(cv2.imread(images[i + 1]), cv2.COLOR_BGR2GRAY)
-        
-        # undistort
-        prv = cv2.undistort(prv, mtx, dist, None, newcameramtx)
-        nxt = cv2.undistort(nxt, mtx, dist, None, newcameramtx)
-
-        # project
-        if args.interp_method.lower()  == "linear":
-            fp = LinearNDInterpolator(XY[insiders_idx], prv.flatten()[insiders_idx])
-            fn = LinearNDInterpolator(XY[insiders_idx], nxt.flatten()[insiders_idx])
-        elif args.interp_method.lower()  == "nearest":
-            fp = NearestNDInterpolator(XY[insiders_idx], prv.flatten()[insiders_idx])
-            fn = NearestNDInterpolator(XY[insiders_idx], nxt.flatten()[insiders_idx])
-        elif args.interp_method.lower()  == "ct":
-            fp = CloughTocher2DInterpolator(XY[insiders_idx], prv.flatten()[insiders_idx])
-            fn = CloughTocher2DInterpolator(XY[insiders_idx], nxt.flatten()[insiders_idx])
-        else:
-            raise ValueError("Wrong interpolation methd. Use linear, nearest or ct.")
-        
-        prv = fp(grid_x, grid_y)
-        nxt = fn(grid_x, grid_y)
+    # stream the output to disk as it is computed
+    writer = FlowWriter(args.output, xlin, ylin, precision=args.precision,
+                        complevel=int(args.complevel))
+
+
+    # every frame is read and projected only once, ahead of the flow
+    cache = None
+    if args.cache_dir:
+        cache = FrameCache(args.cache_dir, float(args.cache_size) * 1e9)
+    frames = projected_frames(images, plan, prefetch=int(args.prefetch),
+                              cache=cache)
+    prv = next(frames)
+
+    for i, nxt in enumerate(frames):
 
         # compute the flow
         uv = cv2.calcOpticalFlowFarneback(prv, nxt, None, pyr_scale, levels,
@@ -564,7 +512,7 @@ def main():
         # magnitude is how much the pixel moved
         mag, ang = cv2.cartToPolar(uv[...,0], uv[...,1])
         displacement = mag * dx  # how much the pixel moved times the grid size
-        # speed = displacement * freq  # dS/dt -> this gives m/s
+        # speed = displacement / dt  # dS/dt -> this gives m/s
 
         # go back to u,v
         u, v = uv[...,0], uv[...,1]
@@ -574,35 +522,23 @@ def main():
         mag[imask, jmask] = np.ma.masked  # apply mask
         ang[imask, jmask] = np.ma.masked  # apply mask
 
+        # the flow is stamped with the time of the first frame, dt is the
+        # time between the two frames
+        now = start_date + datetime.timedelta(seconds=seconds[i])
+        writer.append(now, dt=seconds[i + 1] - seconds[i],
+                      u=u, v=v, angle=ang, displacement=mag)
 
-        uout[i, :, :] = u
-        vout[i, :, :] = v
-        mout[i, :, :] = mag
-        aout[i, :, :] = ang
-
-        # time increment
-        times[i] = now
-        now += dt
+        # carry the projected frame forward
+        prv = nxt
 
         pbar.update()
     pbar.close()
 
-    ds = xr.Dataset()
-    # write flow variable
-    ds['u'] = (('time', 'x', 'y'), uout)
-    ds['v'] = (('time', 'x', 'y'), vout)
-    ds['angle'] = (('time', 'x', 'y'), aout)
-    ds['displacement'] = (('time', 'x', 'y'), mout)
-    # write coordinates
-    ds.coords['time'] = times
-    ds.coords["x"] = xlin
-    ds.coords["y"] = ylin
-    # write to file
-    units = 'days since 2000-01-01 00:00:00'
-    calendar = 'gregorian'
-    encoding = dict(time=dict(units=units, calendar=calendar))
-    ds.to_netcdf(args.output, encoding=encoding)
-
+    writer.close()
+    if cache is not None:
+        print(f"  -- Frame cache: {cache.hits} frames read, "
+              f"{cache.misses} decoded")
+    ds = xr.open_dataset(args.output)
     print("\n Final dataset:")
     print(ds)
 
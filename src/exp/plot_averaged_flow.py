@@ -77,6 +77,13 @@ if __name__ == '__main__':
                         required=False,
                         help="Average image to overlay on.")
 
+    parser.add_argument("--block", "-b",
+                        action="store",
+                        dest="block",
+                        default=64,
+                        required=False,
+                        help="Number of time steps read from disk at once.")
+
     args = parser.parse_args()
 
     CUT = float(args.cut)
@@ -101,18 +108,22 @@ if __name__ == '__main__':
     Wa = Welford()
     # Wd = Welford()
 
-    # compute the average iteratively
-    pbar = tqdm(total=len(ds["time"].values))
-    for i, time in enumerate(ds["time"].values):
+    # compute the average iteratively, reading only a block of time steps
+    # from disk at a time
+    ntimes = ds.sizes["time"]
+    block = int(args.block)
+    pbar = tqdm(total=ntimes)
+    for i in range(0, ntimes, block):
 
-        a = ds.isel(time=i)["angle"].values
-        d = ds.isel(time=i)["displacement"].values
+        a = ds["angle"][i:i + block].values
+        d = ds["displacement"][i:i + block].values
 
-        # Wu.add(u)
-        Wa.add(a)
-        Wd.add(d)
+        for k in range(len(a)):
+            # Wu.add(u)
+            Wa.add(a[k])
+            Wd.add(d[k])
 
-        pbar.update()
+        pbar.update(len(a))
     pbar.close()
 
     # get the average and deviations
@@ -44,6 +44,14 @@ import subprocess
 import stat
 import time
 
+# threading
+import queue
+import threading
+
+# images
+import numpy as np
+import cv2
+
 # files
 from glob import glob
 from natsort import natsorted
@@ -55,11 +63,161 @@ import datetime
 import json
 import argparse
 
-# PySpin
-import PySpin
+# PySpin, not needed with the synthetic camera
+try:
+    import PySpin
+    SpinnakerException = PySpin.SpinnakerException
+except ImportError:
+    PySpin = None
+
+    class SpinnakerException(Exception):
+        """Stand-in for PySpin.SpinnakerException."""
+
+
+# raw bursts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from raw_burst import BAYER_CODES, RawBurstWriter  # noqa
+from frame_index import SUFFIX, FrameIndexWriter  # noqa
+from image_statistics import BackgroundStatistics  # noqa
+from image_statistics import requested_products, write_products  # noqa
+
+# synthetic camera
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "sim"))
+from synthetic_camera import SyntheticCamera  # noqa
+
+
+def write_image(raw, fname, code, statistics=None):
+    """
+    Debayer a raw frame and write it to disk.
+
+    :param raw: Raw frame.
+    :param fname: Output file name.
+    :param code: OpenCV colour conversion code, or None.
+    :param statistics: Accumulator fed with the debayered frame.
+    :type raw: numpy.ndarray
+    :type fname: str
+    :type code: int
+    :type statistics: BackgroundStatistics Default = None.
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+    img = raw if code is None else cv2.cvtColor(raw, code)
+    if statistics is not None:
+        # the raw buffer goes back to the ring, the debayered one does not
+        statistics.add(img, copy=code is None)
+    return cv2.imwrite(fname, img)
+
+
+class EncoderPool:
+    """
+    Debayer and write raw frames on a pool of encoder threads.
+
+    The grab thread copies each raw buffer into one of ``ring_size``
+    preallocated slots and returns immediately, so the camera buffer is
+    released before any conversion or disk I/O happens. When all the slots
+    are in use the frame is dropped and counted instead of stalling the
+    acquisition. OpenCV releases the GIL while debayering and encoding, so
+    the encoders run in parallel with the grab thread.
+
+    :param ring_size: Number of raw frames that can be queued.
+    :param workers: Number of encoder threads. Use one worker to keep the
+                    frames in order.
+    :param write: Function called as write(raw, *args) for each frame,
+                  returning True if successful.
+    :type ring_size: int Default = 32.
+    :type workers: int Default = 2.
+    :type write: callable Default = write_image.
+    """
+
+    def __init__(self, ring_size=32, workers=2, write=write_image):
+
+        self.write = write
+        self.ring_size = max(1, int(ring_size))
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+        self.slots = []
+
+        # counters
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.latencies = []  # seconds from submit to written
+
+        self.threads = [threading.Thread(target=self._encode, daemon=True)
+                        for _ in range(max(1, int(workers)))]
+        for thread in self.threads:
+            thread.start()
+
+    def _allocate(self, raw):
+        """Allocate the ring slots from the first frame."""
+        for _ in range(self.ring_size):
+            self.slots.append(np.empty_like(raw))
+            self.free.put(len(self.slots) - 1)
+
+    def submit(self, raw, *args):
+        """
+        Queue a raw frame for encoding.
+
+        :param raw: Raw frame. It is copied, so it can be released after.
+        :param args: Arguments passed to the write function.
+        :type raw: numpy.ndarray
+        :return: True if the frame was queued, False if it was dropped.
+        :rtype: bool
+        """
+        if not self.slots:
+            self._allocate(raw)
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+        np.copyto(self.slots[slot], raw)
+        self.pending.put((slot, time.monotonic(), args))
+        depth = self.depth
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+        return True
+
+    @property
+    def depth(self):
+        """Return the number of frames waiting to be encoded."""
+        return self.ring_size - self.free.qsize() if self.slots else 0
+
+    def _encode(self):
+        """Encoder thread loop."""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            slot, submitted, args = item
+            try:
+                success = self.write(self.slots[slot], *args)
+            except Exception as ex:  # a dead encoder would stall the ring
+                print("Error: %s" % ex)
+                success = False
+            finally:
+                self.free.put(slot)
+            with self.lock:
+                if success:
+                    self.written += 1
+                    self.latencies.append(time.monotonic() - submitted)
+                else:
+                    self.failed += 1
+
+    def close(self):
+        """Wait for the queued frames to be written and stop the threads."""
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
 
 
-    
 def set_camera_parameters(cam, nodemap, nodemap_tldevice, fps=5, height=1080,
                           width=1920, offsetx=80, offsety=236):
     """
@@ -143,23 +301,39 @@ def set_camera_parameters(cam, nodemap, nodemap_tldevice, fps=5, height=1080,
        
         
 
-    except PySpin.SpinnakerException as ex:
+    except SpinnakerException as ex:
         print("Error: %s" % ex)
         return False
 
     return result
 
 
-def acquire_images(cam, nodemap, nodemap_tldevice):
+def acquire_images(cam, nodemap, nodemap_tldevice, fps=None, ring_size=32,
+                   encoders=2, log_interval=1, products=None):
     """
     Acquires and saves N images from a device.
 
+    Acquisition and encoding are decoupled: this thread only grabs frames
+    and copies the raw buffers to an EncoderPool, which debayers and writes
+    them in the background. Dropped frames, queue depth and the sustained
+    frame rate are logged every log_interval seconds.
+
     :param cam: Camera to acquire images from.
     :param nodemap: Device nodemap.
     :param nodemap_tldevice: Transport layer device nodemap.
+    :param fps: Configured frame rate, used to check the sustained rate.
+    :param ring_size: Number of raw frames that can wait to be encoded.
+    :param encoders: Number of encoder threads.
+    :param log_interval: Seconds between status messages.
+    :param products: Image products accumulated during the capture.
     :type cam: CameraPtr
     :type nodemap: INodeMap
     :type nodemap_tldevice: INodeMap
+    :type fps: float Default = None.
+    :type ring_size: int Default = 32.
+    :type encoders: int Default = 2.
+    :type log_interval: float Default = 1.
+    :type products: list Default = None.
     :return: True if successful, False otherwise.
     :rtype: bool
     """
@@ -221,6 +395,10 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
 
         print("Acquisition mode set to continuous...")
 
+        # Per-frame exposure and gain are read from the chunk data
+        if EXT == "raw":
+            enable_chunk_data(nodemap)
+
         # Begin acquiring images
         #
         # *** NOTES ***
@@ -258,107 +436,376 @@ def acquire_images(cam, nodemap, nodemap_tldevice):
         # By default, if no specific color processing algorithm is set, the image
         # processor will default to NEAREST_NEIGHBOR method.
         processor.SetColorProcessing(PySpin.SPINNAKER_COLOR_PROCESSING_ALGORITHM_HQ_LINEAR)
-        # Retrieve, convert, and save images
-              
-       
-       
-        for i in range(NUM_IMAGES):
-            try:
 
-                # Retrieve next received image
-                #
-                # *** NOTES ***
-                # Capturing an image houses images on the camera buffer.
-                # Trying to capture an image that does not exist will hang the
-                # camera.
-                #
-                # *** LATER ***
-                # Once an image from the buffer is saved and/or no longer
-                # needed, the image must be released in order to keep the
-                # buffer from filling up.
-                image_result = cam.GetNextImage()
+        stats = grab_images(cam, device_serial_number, processor, fps=fps,
+                            ring_size=ring_size, encoders=encoders,
+                            log_interval=log_interval, products=products)
+        result &= stats is not None
 
-                # Ensure image completion
-                #
-                # *** NOTES ***
-                # Images can easily be checked for completion. This should be
-                # done whenever a complete image is expected or required.
-                # Further, check image status for a little more insight into
-                # why an image is incomplete.
-                if image_result.IsIncomplete():
-                    print("Image incomplete with image status %d ..." %
-                          image_result.GetImageStatus())
+    except SpinnakerException as ex:
+        print("Error: %s" % ex)
+        return False
 
-                else:
+    return result
 
-                    # Print image information; height and width recorded in
-                    # pixels
-                    #
-                    # *** NOTES ***
-                    # Images have quite a bit of available metadata including
-                    # things such as CRC, image status, and offset values, to
-                    # name a few.
-                    width = image_result.GetWidth()
-                    height = image_result.GetHeight()
-                    # print("Grabbed Image %d, width = %d, height = %d" %
-                    #       (i, width, height))
-
-                    # Convert image to RGB8
-                    #
-                    # *** NOTES ***
-                    # Images can be converted between pixel formats by using
-                    # the appropriate enumeration value. Unlike the original
-                    # image, the converted one does not need to be released as
-                    # it does not affect the camera buffer.
-                    #
-                    # When converting images, color processing algorithm is an
-                    # optional parameter.
-                    image_converted = processor.Convert(image_result, PySpin.PixelFormat_RGB8)
-
-                    # Create a unique filename
-                    now = today.strftime("%Y%m%d_%H%M%S")
-                    if device_serial_number:
-                        filename = "{}-{}-{}.{}".format(device_serial_number,
-                                                        now, str(i).zfill(6),
-                                                        EXT)
-                    else:  # if serial number is empty
-                        filename = "{}-{}.{}".format(now, str(i).zfill(6),
-                                                     EXT)
-
-                    # Save image
-                    #
-                    # *** NOTES ***
-                    # The standard practice of the examples is to use device
-                    # serial numbers to keep images of one device from
-                    # overwriting those of another.
-                    image_converted.Save(os.path.join(OUTPATH, filename))
-                    print("Image saved at %s" % filename)
-
-                    #  Release image
-                    #
-                    #  *** NOTES ***
-                    # Images retrieved directly from the camera  (i.e.
-                    # non-converted images) need to be released in order
-                    # to keep from filling the buffer.
-                    image_result.Release()
-                    # print("")
-
-            except PySpin.SpinnakerException as ex:
-                print("Error: %s" % ex)
-                return False
 
-        # End acquisition
-        #
-        # *** NOTES ***
-        # Ending acquisition appropriately helps ensure that devices clean up
-        # properly and do not need to be power-cycled to maintain integrity.
-        cam.EndAcquisition()
+def grab_images(cam, device_serial_number="", processor=None, fps=None,
+                ring_size=32, encoders=2, log_interval=1, products=None):
+    """
+    Grab NUM_IMAGES frames and hand them to the encoders.
+
+    Only the acquisition calls (GetNextImage, EndAcquisition and the image
+    accessors) are used here, so any camera that implements them, such as
+    the synthetic camera in src/sim, can be used.
+
+    :param cam: Camera to acquire images from, already acquiring.
+    :param device_serial_number: Serial number used in the file names.
+    :param processor: Image processor used for pixel formats that are not
+                      in BAYER_CODES.
+    :param fps: Configured frame rate, used to check the sustained rate.
+    :param ring_size: Number of raw frames that can wait to be encoded.
+    :param encoders: Number of encoder threads.
+    :param log_interval: Seconds between status messages.
+    :param products: Image products (see image_statistics.PRODUCTS)
+                     accumulated from the frames as they are grabbed and
+                     written to the products folder at the end.
+    :type cam: CameraPtr
+    :type device_serial_number: str
+    :type processor: ImageProcessor
+    :type fps: float Default = None.
+    :type ring_size: int Default = 32.
+    :type encoders: int Default = 2.
+    :type log_interval: float Default = 1.
+    :type products: list Default = None.
+    :return: Pipeline counters, or None if the acquisition failed.
+    :rtype: dict
+    """
+    # Retrieve images and hand them to the encoders
+    #
+    # *** NOTES ***
+    # Only the raw buffer is copied here. Debayering and writing happen
+    # on the encoder threads, so a slow disk does not fill the camera
+    # buffer.
+    #
+    # With "format": "raw", frames are not debayered at all. They are
+    # appended with their metadata to a single burst file, in order, by
+    # one writer thread and can be converted later with
+    # post/debayer_burst.py.
+    #
+    # The frame id, camera timestamp and host clocks of every queued
+    # frame are recorded in the burst, or in a frame index next to the
+    # images, so that post-processing uses the exact frame times.
+    #
+    # Image products are accumulated on a background thread from the
+    # debayered frames, so they are ready when the burst ends.
+    statistics = None
+    if products:
+        statistics = BackgroundStatistics(maxsize=4, dtype=np.float32,
+                                          keep_frames=False)
+
+    burst = None
+    index = None
+    if EXT == "raw":
+        now = today.strftime("%Y%m%d_%H%M%S")
+        if device_serial_number:
+            filename = "{}-{}.burst".format(device_serial_number, now)
+        else:  # if serial number is empty
+            filename = "{}.burst".format(now)
+        pixel_format = cam.PixelFormat.GetCurrentEntry().GetSymbolic()
+        burst = RawBurstWriter(
+            os.path.join(OUTPATH, filename),
+            cam.Width.GetValue(), cam.Height.GetValue(),
+            pixel_format=pixel_format,
+            dtype="u2" if pixel_format.endswith("16") else "u1",
+            channels=3 if pixel_format == "BGR8" else 1,
+            attrs={"serial": device_serial_number, "date": now,
+                   "framerate": fps})
+
+        def write_raw(raw, metadata):
+            burst.append(raw, **metadata)
+            if statistics is not None:
+                statistics.add(raw, BAYER_CODES.get(pixel_format),
+                               copy=True)
+            return True
+
+        pool = EncoderPool(ring_size=ring_size, workers=1,
+                           write=write_raw)
+    else:
+        pool = EncoderPool(ring_size=ring_size, workers=encoders)
+        now = today.strftime("%Y%m%d_%H%M%S")
+        if device_serial_number:
+            filename = "{}-{}{}".format(device_serial_number, now,
+                                        SUFFIX)
+        else:  # if serial number is empty
+            filename = "{}{}".format(now, SUFFIX)
+        index = FrameIndexWriter(os.path.join(OUTPATH, filename))
+
+    grabbed = 0
+    incomplete = 0
+    skipped = 0  # frames lost on the camera side
+    last_frame_id = None
+    start = time.monotonic()
+    last_log = start
+
+    for i in range(NUM_IMAGES):
+        try:
+
+            # Retrieve next received image
+            #
+            # *** NOTES ***
+            # Capturing an image houses images on the camera buffer.
+            # Trying to capture an image that does not exist will hang the
+            # camera.
+            #
+            # *** LATER ***
+            # Once an image from the buffer is copied, the image must be
+            # released in order to keep the buffer from filling up.
+            image_result = cam.GetNextImage()
+            host_monotonic = time.monotonic()
+            host_time = time.time()
+
+            # gaps in the frame id are frames the camera dropped
+            frame_id = image_result.GetFrameID()
+            if last_frame_id is not None and \
+                    frame_id > last_frame_id + 1:
+                skipped += frame_id - last_frame_id - 1
+            last_frame_id = frame_id
+
+            # Ensure image completion
+            #
+            # *** NOTES ***
+            # Images can easily be checked for completion. This should be
+            # done whenever a complete image is expected or required.
+            # Further, check image status for a little more insight into
+            # why an image is incomplete.
+            if image_result.IsIncomplete():
+                incomplete += 1
+                print("Image incomplete with image status %d ..." %
+                      image_result.GetImageStatus())
+
+            elif burst is not None:
+                grabbed += 1
+                metadata = get_frame_metadata(image_result)
+                metadata["host_monotonic"] = host_monotonic
+                metadata["host_time"] = host_time
+                pool.submit(image_result.GetNDArray(), metadata)
+
+            else:
+                grabbed += 1
+
+                # Create a unique filename
+                now = today.strftime("%Y%m%d_%H%M%S")
+                if device_serial_number:
+                    filename = "{}-{}-{}.{}".format(device_serial_number,
+                                                    now, str(i).zfill(6),
+                                                    EXT)
+                else:  # if serial number is empty
+                    filename = "{}-{}.{}".format(now, str(i).zfill(6),
+                                                 EXT)
+
+                # Copy the raw buffer
+                #
+                # *** NOTES ***
+                # 8-bit Bayer and mono frames are copied as they are and
+                # debayered by the encoders. Other pixel formats are
+                # converted to RGB8 here, which is slower.
+                pixel_format = image_result.GetPixelFormatName()
+                if pixel_format in BAYER_CODES and \
+                        not pixel_format.endswith("16"):
+                    raw = image_result.GetNDArray()
+                    code = BAYER_CODES[pixel_format]
+                else:
+                    raw = processor.Convert(
+                        image_result, PySpin.PixelFormat_RGB8).GetNDArray()
+                    code = cv2.COLOR_RGB2BGR
+                if pool.submit(raw, os.path.join(OUTPATH, filename),
+                               code, statistics):
+                    index.append(filename, frame_id,
+                                 image_result.GetTimeStamp(),
+                                 host_monotonic, host_time)
+
+            #  Release image
+            #
+            #  *** NOTES ***
+            # Images retrieved directly from the camera  (i.e.
+            # non-converted images) need to be released in order
+            # to keep from filling the buffer.
+            image_result.Release()
+
+            # report the pipeline status
+            tick = time.monotonic()
+            if tick - last_log >= log_interval:
+                last_log = tick
+                print_pipeline_status(pool, grabbed, incomplete, skipped,
+                                      tick - start, fps)
+
+        except SpinnakerException as ex:
+            print("Error: %s" % ex)
+            pool.close()
+            if burst is not None:
+                burst.close()
+            if index is not None:
+                index.close()
+            if statistics is not None:
+                statistics.close()
+            return None
+
+    # End acquisition
+    #
+    # *** NOTES ***
+    # Ending acquisition appropriately helps ensure that devices clean up
+    # properly and do not need to be power-cycled to maintain integrity.
+    cam.EndAcquisition()
+    elapsed = time.monotonic() - start
+
+    # wait for the encoders to write the remaining frames
+    print("\nWaiting for %d frames to be written..." % pool.depth)
+    pool.close()
+    if burst is not None:
+        burst.close()
+    if index is not None:
+        index.close()
+    print_pipeline_status(pool, grabbed, incomplete, skipped, elapsed,
+                          fps)
+    if fps and grabbed / max(elapsed, 1e-9) < 0.95 * fps:
+        print("Warning: sustained frame rate is below the configured "
+              "%.2f fps." % fps)
+
+    # write the image products
+    if statistics is not None:
+        stats = statistics.close()
+        now = today.strftime("%Y%m%d_%H%M%S")
+        if device_serial_number:
+            root = "{}-{}".format(device_serial_number, now)
+        else:  # if serial number is empty
+            root = now
+        fnames = write_products(stats, os.path.join(OUTPATH, "products",
+                                                    root), products)
+        print("Products from %d frames (%d skipped):" %
+              (stats.count, statistics.skipped))
+        for fname in fnames:
+            print(fname)
+
+    return {"grabbed": grabbed,
+            "written": pool.written,
+            "dropped": pool.dropped,
+            "skipped": skipped,
+            "incomplete": incomplete,
+            "failed": pool.failed,
+            "max_depth": pool.max_depth,
+            "elapsed": elapsed,
+            "latencies": list(pool.latencies)}
+
+
+
+def enable_chunk_data(nodemap, entries=("ExposureTime", "Gain")):
+    """
+    Enable chunk data so that metadata is sent along with each image.
 
-    except PySpin.SpinnakerException as ex:
+    :param nodemap: Device nodemap.
+    :param entries: Chunk entries to enable.
+    :type nodemap: INodeMap
+    :type entries: tuple
+    :return: True if successful, False otherwise.
+    :rtype: bool
+    """
+    try:
+        node_chunk_mode = PySpin.CBooleanPtr(nodemap.GetNode("ChunkModeActive"))
+        if not PySpin.IsAvailable(node_chunk_mode) \
+                or not PySpin.IsWritable(node_chunk_mode):
+            print("Unable to activate chunk mode.")
+            return False
+        node_chunk_mode.SetValue(True)
+
+        node_chunk_selector = PySpin.CEnumerationPtr(
+            nodemap.GetNode("ChunkSelector"))
+        for entry in entries:
+            node_entry = node_chunk_selector.GetEntryByName(entry)
+            if not PySpin.IsAvailable(node_entry) \
+                    or not PySpin.IsReadable(node_entry):
+                print("Chunk entry %s not available." % entry)
+                continue
+            node_chunk_selector.SetIntValue(node_entry.GetValue())
+
+            node_chunk_enable = PySpin.CBooleanPtr(
+                nodemap.GetNode("ChunkEnable"))
+            if PySpin.IsAvailable(node_chunk_enable) and \
+                    PySpin.IsWritable(node_chunk_enable):
+                node_chunk_enable.SetValue(True)
+
+    except SpinnakerException as ex:
         print("Error: %s" % ex)
         return False
 
-    return result
+    return True
+
+
+def get_frame_metadata(image):
+    """
+    Read the metadata of an image.
+
+    :param image: Image retrieved from the camera.
+    :type image: ImagePtr
+    :return: Frame id, camera timestamp (ns), exposure (us) and gain (dB).
+             Exposure and gain are NaN if chunk data is not available.
+    :rtype: dict
+    """
+    metadata = {"frame_id": image.GetFrameID(),
+                "timestamp": image.GetTimeStamp(),
+                "exposure": np.nan,
+                "gain": np.nan}
+    try:
+        chunk_data = image.GetChunkData()
+        metadata["exposure"] = chunk_data.GetExposureTime()
+        metadata["gain"] = chunk_data.GetGain()
+    except SpinnakerException:
+        pass
+    return metadata
+
+
+def print_pipeline_status(pool, grabbed, incomplete, skipped, elapsed,
+                          fps=None):
+    """
+    Print the acquisition pipeline counters.
+
+    :param pool: Encoder pool.
+    :param grabbed: Number of complete frames grabbed.
+    :param incomplete: Number of incomplete frames.
+    :param skipped: Number of frames dropped by the camera.
+    :param elapsed: Seconds since the start of the acquisition.
+    :param fps: Configured frame rate.
+    :type pool: EncoderPool
+    :type grabbed: int
+    :type incomplete: int
+    :type skipped: int
+    :type elapsed: float
+    :type fps: float Default = None.
+    """
+    rate = grabbed / max(elapsed, 1e-9)
+    target = " (configured %.2f)" % fps if fps else ""
+    print("Grabbed %d, written %d, dropped %d (queue) + %d (camera) + "
+          "%d (incomplete), failed %d, queue depth %d/%d (max %d), "
+          "%.2f fps%s" % (grabbed, pool.written, pool.dropped, skipped,
+                          incomplete, pool.failed, pool.depth, pool.ring_size,
+                          pool.max_depth, rate, target))
+
+
+def print_last_frame():
+    """
+    Print the last image written by the capture.
+
+    The notification script attaches the last line printed, so only
+    images are listed: raw bursts (which can be several GB) and frame
+    indexes are skipped. In raw mode, the last image product is printed
+    instead, and nothing if there are no products.
+    """
+    images = [f for f in natsorted(glob(OUTPATH + "/*"))
+              if os.path.isfile(f) and not f.endswith((SUFFIX, ".burst"))]
+    if not images:
+        images = natsorted(glob(os.path.join(OUTPATH, "products", "*.png")))
+    if images:
+        print("\nLast frame saved:")
+        print(images[-1])
 
 
 def print_device_info(nodemap):
@@ -392,7 +839,7 @@ def print_device_info(nodemap):
         else:
             print("Device control information not available.")
 
-    except PySpin.SpinnakerException as ex:
+    except SpinnakerException as ex:
         print("Error: %s" % ex)
         return False
 
@@ -407,10 +854,21 @@ def run_single_camera(cam, cfg):
     example for more in-depth comments on setting up cameras.
 
     :param cam: Camera to run on.
-    :type cam: CameraPtr
+    :param cfg: Configuration.
+    :type cam: CameraPtr or SyntheticCamera
+    :type cfg: dict
     :return: True if successful, False otherwise.
     :rtype: bool
     """
+    # the synthetic camera has no nodemaps to set up
+    if isinstance(cam, SyntheticCamera):
+        cam.BeginAcquisition()
+        stats = grab_images(cam, cam.serial, fps=cfg["capture"]["framerate"],
+                            ring_size=cfg["capture"].get("ring_size", 32),
+                            encoders=cfg["capture"].get("encoders", 2),
+                            products=requested_products(cfg))
+        return stats is not None
+
     try:
         result = True
 
@@ -434,12 +892,16 @@ def run_single_camera(cam, cfg):
                                         offsety=cfg["capture"]["offset"][1])
 
         # Acquire images
-        result &= acquire_images(cam, nodemap, nodemap_tldevice)
+        result &= acquire_images(cam, nodemap, nodemap_tldevice,
+                                 fps=cfg["capture"]["framerate"],
+                                 ring_size=cfg["capture"].get("ring_size", 32),
+                                 encoders=cfg["capture"].get("encoders", 2),
+                                 products=requested_products(cfg))
 
         # Deinitialize camera
         cam.DeInit()
 
-    except PySpin.SpinnakerException as ex:
+    except SpinnakerException as ex:
         print("Error: %s" % ex)
         result = False
 
@@ -525,6 +987,18 @@ def main():
 
     result = True
 
+    # Synthetic camera, see src/sim
+    if cfg["capture"].get("backend", "spinnaker") == "synthetic":
+        print("\nRunning capture cycle for a synthetic camera...")
+        cam = SyntheticCamera.from_config(cfg)
+        result &= run_single_camera(cam, cfg)
+        print_last_frame()
+        return result
+
+    if PySpin is None:
+        raise ImportError("PySpin is not installed. Install Spinnaker or set "
+                          "\"backend\": \"synthetic\" in the configuration.")
+
     # Retrieve singleton reference to system object
     system = PySpin.System.GetInstance()
 
@@ -571,8 +1045,7 @@ def main():
         print("My work is done!")
 
         # print the last frame save, this simplify the notification script
-        print("\nLast frame saved:")
-        print(natsorted(glob(OUTPATH+"/*"))[-1])
+        print_last_frame()
 
     # Release reference to camera
     # NOTE: Unlike the C++ examples, we cannot rely on pointer objects
@@ -1,33 +1,9 @@
+import os
 import argparse
 import numpy as np
 import cv2
-from glob import glob
-from natsort import natsorted
-from tqdm import tqdm
-from skimage.util import img_as_float64  # Add this import
-
-class Welford:
-    def __init__(self):
-        self.k = 0
-        self.M1 = 0
-        self.M2 = 0
-
-    def add(self, x):
-        self.k += 1
-        delta = x - self.M1
-        self.M1 += delta / self.k
-        delta2 = x - self.M1
-        self.M2 += delta * delta2
-
-    @property
-    def mean(self):
-        return self.M1
-
-    @property
-    def var(self):
-        if self.k < 2:
-            return np.nan
-        return self.M2 / (self.k - 1)
+from image_statistics import compute_statistics, scale_to_uint8
+from frame_source import open_frames
 
 def process_images(image_paths, output_folder):
     image_count = len(image_paths)
@@ -35,44 +11,19 @@ def process_images(image_paths, output_folder):
         print("No images found in the input folder.")
         return
 
-    # Initialize the accumulators for average and variance
-    avg_image = np.zeros(cv2.imread(image_paths[0]).shape, dtype=np.float64)
-    w = Welford()
-
-    # Initialize the darkest image with white pixels
-    darkest_image = 255 * np.ones(cv2.imread(image_paths[0]).shape, dtype=np.uint8)
-
-    # Initialize the brightest image with black pixels
-    brightest_image = np.zeros(cv2.imread(image_paths[0]).shape, dtype=np.uint8)
-
-    # Iterate over the images, skipping the first 10
-    for image_path in tqdm(image_paths[10:], desc="Processing Images"):
-        image = cv2.imread(image_path)
-
-        # Update the average image
-        avg_image += (image.astype(np.float64) - avg_image) / (image_count - 10 + 1)
-
-        # Update the variance image using Welford's method
-        img_as_float = img_as_float64(image)
-        w.add(img_as_float)
-        variance_image = w.var
-
-        # Update the darkest image
-        darkest_image = np.minimum(darkest_image, image)
-
-        # Update the brightest image
-        brightest_image = np.maximum(brightest_image, image)
+    # Accumulate the average, variance, darkest and brightest images in a
+    # single pass over the images, skipping the first 10
+    stats = compute_statistics(image_paths[10:], keep_frames=False,
+                               workers=int(args.workers))
 
     # Scale the variance values as per the provided mechanics
-    min_var = variance_image.min()
-    max_var = variance_image.max()
-    scaled_variance_image = ((variance_image - min_var) / (max_var - min_var) * 255).astype(np.uint8)
+    scaled_variance_image = scale_to_uint8(stats.var)
 
     # Save the processed images
-    cv2.imwrite(args.timex, avg_image.astype(np.uint8))
+    cv2.imwrite(args.timex, np.round(stats.mean).astype(np.uint8))
     cv2.imwrite(args.variance, scaled_variance_image)
-    cv2.imwrite(args.darkest, darkest_image)
-    cv2.imwrite(args.brightest, brightest_image)
+    cv2.imwrite(args.darkest, stats.min)
+    cv2.imwrite(args.brightest, stats.max)
 
 if __name__ == "__main__":
     # Argument parser
@@ -83,7 +34,7 @@ if __name__ == "__main__":
                         action="store",
                         dest="input",
                         required=True,
-                        help="Input folder with images file.")
+                        help="Input folder with images, or video file.")
 
     parser.add_argument("--brightest", "-b",
                         action="store",
@@ -120,13 +71,20 @@ if __name__ == "__main__":
                         required=False,
                         help="Output folder for processed images.")
                         
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of worker processes. Default is the "
+                             "number of cores.")
+
     args = parser.parse_args()
 
     # Get a list of image file paths and sort them
-    image_paths = natsorted(glob(args.input + "/*"))
+    image_paths = open_frames(args.input)
 
     # Create the output folder if it doesn't exist
-    import os
     os.makedirs(args.output, exist_ok=True)
 
     # Process the images iteratively
@@ -7,17 +7,17 @@ Find the brightest and darkest images via color space conversions.
 # DATE     : 22/04/2021
 # VERSION  : 1.0
 """
+import os
 import argparse
-from glob import glob
-from natsort import natsorted
 
-import numpy as np
+import cv2
 
-from skimage.io import imread, imsave
+from image_statistics import compute_statistics
+from frame_source import open_frames
 
-from skimage.color import rgb2hsv
-
-from tqdm import tqdm
+# the frames are ranked on copies decoded at no less than this size
+# ([width, height]), only the brightest and darkest are decoded in full
+RANKING_SIZE = [480, 270]
 
 
 if __name__ == "__main__":
@@ -32,7 +32,7 @@ if __name__ == "__main__":
                         action="store",
                         dest="input",
                         required=True,
-                        help="Input folder with images file.",)
+                        help="Input folder with images, or video file.",)
 
     parser.add_argument("--brightest", "-b",
                         action="store",
@@ -48,41 +48,36 @@ if __name__ == "__main__":
                         required=False,
                         help="Output name for darkest image.",)
 
-    args = parser.parse_args()
-
-    # main()
-
-    imlist = natsorted(glob(args.input + "/*"))
-
-    # assuming all images are the same size, get dimensions of first image
-    h, w, c = imread(imlist[0]).shape
-    N = len(imlist)
-
-    # create a numpy array of floats to store the average (assume RGB images)
-    arr = np.zeros((h, w, c), np.float64)
-
-    # progress bar
-    pbar = tqdm(total=N)
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of worker processes. Default is the "
+                             "number of cores.")
 
-    # build up average pixel intensities, casting each image as an array of
-    # floats
-    brightness = []
-    for i, im in enumerate(imlist):
+    parser.add_argument("--full-resolution",
+                        action="store_true",
+                        dest="full_resolution",
+                        help="Rank the frames at full resolution.",)
 
-        # ignore files that are not images
-        try:
-            img = imread(im)
-        except Exception:
-            pass
+    args = parser.parse_args()
 
-        imarr = rgb2hsv(img)
+    # main()
 
-        brightness.append(imarr[:, :, 2].sum())
+    imlist = open_frames(args.input)
+    ranked = imlist if args.full_resolution else \
+        imlist.at_resolution(RANKING_SIZE)
 
-        pbar.update()
+    # rank the frames by their summed brightness (i.e., the V in HSV)
+    stats = compute_statistics(ranked, workers=int(args.workers),
+                               keep_frames=False)
 
-    pbar.close()
+    # decode the brightest and darkest frames in full
+    names = imlist.names
+    brightest = imlist[names.index(stats.images[stats.brightest_index])]
+    darkest = imlist[names.index(stats.images[stats.darkest_index])]
 
     # save the outputs
-    imsave(args.brightest, imread(imlist[np.argmax(brightness)]))
-    imsave(args.darkest, imread(imlist[np.argmin(brightness)]))
+    cv2.imwrite(args.brightest, brightest)
+    cv2.imwrite(args.darkest, darkest)
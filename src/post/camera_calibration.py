@@ -0,0 +1,245 @@
+"""
+Camera calibration shared by the post-processing and calibration scripts.
+
+# SCRIPT   : camera_calibration.py
+# POURPOSE : Load a camera calibration (JSON or pickle) once, and build the
+#            undistortion maps for an image size only once. The maps are
+#            fixed-point (CV_16SC2), which cv2.remap uses much faster than
+#            cv2.undistort rebuilds its maps on every call, and they are
+#            saved next to the calibration file so that the next run does
+#            not build them again.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import json
+import pickle
+
+import numpy as np
+
+import cv2
+
+from frame_cache import array_hash
+
+
+class CameraCalibration:
+    """
+    Camera matrix and distortion coefficients, with cached undistortion.
+
+    Parameters
+    ----------
+    mtx, dist : np.ndarray
+        Camera matrix and distortion coefficients.
+    fname : str
+        Calibration file. If given, the undistortion maps are saved next to
+        it. Optional.
+    """
+
+    def __init__(self, mtx: np.ndarray, dist: np.ndarray, fname: str = None):
+
+        self.mtx = np.asarray(mtx, dtype=np.float64)
+        self.dist = np.asarray(dist, dtype=np.float64)
+        self.fname = fname
+
+        # as {(width, height, alpha): ...}
+        self._new_matrices = {}
+        self._maps = {}
+
+    @classmethod
+    def load(cls, fname: str):
+        """
+        Load a calibration written by the calibration scripts.
+
+        Parameters
+        ----------
+        fname : str
+            Calibration file in JSON or pickle format.
+
+        Returns
+        -------
+        calibration : CameraCalibration
+            The calibration.
+        """
+        if fname.lower().endswith("json"):
+            with open(fname, 'r') as f:
+                cam = json.load(f)
+        else:
+            with open(fname, 'rb') as f:
+                cam = pickle.load(f)
+        return cls(cam["camera_matrix"], cam["distortion_coefficients"],
+                   fname=fname)
+
+    def new_camera_matrix(self, image_size: tuple, alpha: float = 1):
+        """
+        Return the camera matrix of the undistorted image.
+
+        Parameters
+        ----------
+        image_size : tuple
+            Image size as (width, height).
+        alpha : float
+            Free scaling parameter, see cv2.getOptimalNewCameraMatrix(). One
+            keeps all the pixels of the raw image.
+
+        Returns
+        -------
+        newcameramtx : np.ndarray
+            Camera matrix of the undistorted image.
+        roi : tuple
+            Region of the undistorted image with valid pixels only.
+        """
+        size = (int(image_size[0]), int(image_size[1]))
+        key = size + (float(alpha), )
+        if key not in self._new_matrices:
+            self._new_matrices[key] = cv2.getOptimalNewCameraMatrix(
+                self.mtx, self.dist, size, alpha, size)
+        return self._new_matrices[key]
+
+    def _maps_fname(self, image_size: tuple, alpha: float):
+        root = os.path.splitext(self.fname)[0]
+        return "{}.undistort_{}x{}_{:g}.npz".format(root, image_size[0],
+                                                    image_size[1], alpha)
+
+    def undistort_maps(self, image_size: tuple, alpha: float = 1):
+        """
+        Return the fixed-point undistortion maps for an image size.
+
+        The maps are built once per image size and alpha, and read back
+        from next to the calibration file if they were saved by an
+        earlier run with the same calibration.
+
+        Parameters
+        ----------
+        image_size : tuple
+            Image size as (width, height).
+        alpha : float
+            Free scaling parameter, see new_camera_matrix().
+
+        Returns
+        -------
+        map1, map2 : np.ndarray
+            Maps for cv2.remap(), as given by cv2.initUndistortRectifyMap()
+            with CV_16SC2.
+        """
+        size = (int(image_size[0]), int(image_size[1]))
+        key = size + (float(alpha), )
+        if key in self._maps:
+            return self._maps[key]
+
+        digest = array_hash(self.mtx, self.dist, size, float(alpha))
+        fname = None if self.fname is None else \
+            self._maps_fname(size, float(alpha))
+
+        # saved by an earlier run
+        if fname is not None and os.path.isfile(fname):
+            try:
+                with np.load(fname) as data:
+                    if str(data["key"]) == digest:
+                        self._maps[key] = (data["map1"], data["map2"])
+                        return self._maps[key]
+            except (OSError, ValueError, KeyError):  # damaged, build again
+                pass
+
+        newcameramtx, roi = self.new_camera_matrix(size, alpha)
+        map1, map2 = cv2.initUndistortRectifyMap(
+            self.mtx, self.dist, None, newcameramtx, size, cv2.CV_16SC2)
+        self._maps[key] = (map1, map2)
+
+        # save for the next run, written atomically as several scripts may
+        # share the calibration
+        if fname is not None:
+            tmp = "{}.{}.tmp".format(fname, os.getpid())
+            try:
+                with open(tmp, "wb") as f:
+                    np.savez(f, map1=map1, map2=map2, key=digest)
+                os.replace(tmp, fname)
+            except OSError:  # e.g. read-only, keep them in memory only
+                if os.path.isfile(tmp):
+                    os.remove(tmp)
+
+        return self._maps[key]
+
+    def undistort(self, frame: np.ndarray, alpha: float = 1,
+                  interpolation: int = cv2.INTER_LINEAR):
+        """
+        Undistort a frame.
+
+        This gives the same result as cv2.undistort() with the camera
+        matrix from new_camera_matrix(), without rebuilding the maps.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Raw (distorted) frame.
+        alpha : float
+            Free scaling parameter, see new_camera_matrix().
+        interpolation : int
+            OpenCV interpolation flag.
+
+        Returns
+        -------
+        dst : np.ndarray
+            Undistorted frame.
+        """
+        h, w = frame.shape[:2]
+        map1, map2 = self.undistort_maps((w, h), alpha)
+        return cv2.remap(frame, map1, map2, interpolation)
+
+    def solve_pose(self, xyz: np.ndarray, uv: np.ndarray):
+        """
+        Find the camera pose from ground control points.
+
+        Parameters
+        ----------
+        xyz, uv : np.ndarray
+            Nx3 real-world and Nx2 raw image coordinates of the gcps.
+
+        Returns
+        -------
+        rvec, tvec : np.ndarray
+            Rotation and translation vectors, see cv2.solvePnP().
+        """
+        retval, rvec, tvec = cv2.solvePnP(
+            np.asarray(xyz, dtype=np.float64),
+            np.asarray(uv, dtype=np.float64), self.mtx, self.dist)
+        return rvec, tvec
+
+    def undistorted_to_raw(self, u: np.ndarray, v: np.ndarray,
+                           image_size: tuple, alpha: float = 1):
+        """
+        Map undistorted pixel coordinates back to the raw image.
+
+        This is the mapping of undistort(), evaluated only at the requested
+        points.
+
+        Parameters
+        ----------
+        u, v : np.ndarray
+            Pixel coordinates in the undistorted image.
+        image_size : tuple
+            Image size as (width, height).
+        alpha : float
+            Free scaling parameter, see new_camera_matrix().
+
+        Returns
+        -------
+        raw : np.ndarray
+            Nx2 array of raw image coordinates.
+        """
+        newcameramtx, roi = self.new_camera_matrix(image_size, alpha)
+
+        u = np.asarray(u, dtype=np.float64).ravel()
+        v = np.asarray(v, dtype=np.float64).ravel()
+
+        # undistorted pixels to normalized camera coordinates
+        xn = (u - newcameramtx[0, 2]) / newcameramtx[0, 0]
+        yn = (v - newcameramtx[1, 2]) / newcameramtx[1, 1]
+        rays = np.vstack([xn, yn, np.ones(xn.size)]).T
+
+        # apply the distortion model to find the raw pixel coordinates
+        raw, _ = cv2.projectPoints(rays.reshape(-1, 1, 3), np.zeros(3),
+                                   np.zeros(3), self.mtx, self.dist)
+        return raw.reshape(-1, 2)
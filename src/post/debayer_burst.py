@@ -0,0 +1,172 @@
+"""
+Debayer and encode a raw burst.
+
+# SCRIPT   : debayer_burst.py
+# POURPOSE : Convert the frames of a raw Bayer burst recorded by
+#            flir/capture.py to image files, using a pool of worker
+#            processes. Can run after the capture window or on another
+#            machine.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import argparse
+
+from multiprocessing import Pool
+
+import numpy as np
+
+import cv2
+
+from tqdm import tqdm
+
+from raw_burst import RawBurst
+from frame_index import SUFFIX, FrameIndexWriter
+
+
+_worker_state = {}
+
+# formats that keep the depth of 16-bit bursts
+DEPTH16_FORMATS = ("png", "tif", "tiff")
+
+
+def init_worker(fname: str, output: str, ext: str):
+    """
+    Open the burst in a worker process.
+
+    Parameters
+    ----------
+    fname : str
+        Burst file name.
+    output : str
+        Output folder.
+    ext : str
+        Output image format.
+
+    Returns
+    -------
+    None
+    """
+    _worker_state["burst"] = RawBurst(fname)
+    _worker_state["output"] = output
+    _worker_state["ext"] = ext
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+
+
+def frame_name(burst: RawBurst, i: int, ext: str):
+    """
+    Return the file name of frame i, following the capture naming.
+
+    Parameters
+    ----------
+    burst : RawBurst
+        The burst.
+    i : int
+        Frame index.
+    ext : str
+        Image format.
+
+    Returns
+    -------
+    fname : str
+        File name.
+    """
+    serial = burst.attrs.get("serial", "")
+    date = burst.attrs.get("date", "")
+    parts = [part for part in (serial, date, str(i).zfill(6)) if part]
+    return "{}.{}".format("-".join(parts), ext)
+
+
+def debayer_frame(i: int):
+    """
+    Debayer frame i and write it to disk.
+
+    Parameters
+    ----------
+    i : int
+        Frame index.
+
+    Returns
+    -------
+    success : bool
+        True if the frame was written.
+    """
+    burst = _worker_state["burst"]
+    fname = os.path.join(_worker_state["output"],
+                         frame_name(burst, i, _worker_state["ext"]))
+    img = burst.debayer(i)
+
+    # 8-bit formats keep the most significant bits of 16-bit bursts
+    if img.dtype == np.uint16 and \
+            _worker_state["ext"].lower() not in DEPTH16_FORMATS:
+        img = (img >> 8).astype(np.uint8)
+    return cv2.imwrite(fname, img)
+
+
+if __name__ == "__main__":
+
+    print("\nDebayering raw burst, please wait...\n")
+
+    # Argument parser
+    parser = argparse.ArgumentParser()
+
+    # input file
+    parser.add_argument("--input", "-i",
+                        action="store",
+                        dest="input",
+                        required=True,
+                        help="Input raw burst file.",)
+
+    parser.add_argument("--output", "-o",
+                        action="store",
+                        dest="output",
+                        default="frames",
+                        required=False,
+                        help="Output folder.",)
+
+    parser.add_argument("--format", "-f",
+                        action="store",
+                        dest="format",
+                        default="jpeg",
+                        required=False,
+                        help="Output image format. 16-bit bursts keep "
+                             "their depth in png and tiff and are reduced "
+                             "to 8 bits otherwise. Default is jpeg.",)
+
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of worker processes. Default is the "
+                             "number of cores.")
+
+    args = parser.parse_args()
+
+    burst = RawBurst(args.input)
+    print("  -- {} frames of {}x{} pixels, {}".format(
+        len(burst), burst.width, burst.height, burst.pixel_format))
+
+    os.makedirs(args.output, exist_ok=True)
+
+    failed = 0
+    with Pool(int(args.workers), initializer=init_worker,
+              initargs=(args.input, args.output, args.format)) as pool:
+        for success in tqdm(pool.imap(debayer_frame, range(len(burst)),
+                                      chunksize=4), total=len(burst)):
+            failed += not success
+    if failed:
+        print("  -- warning: {} frames could not be written.".format(failed))
+
+    # keep the frame times next to the images
+    root = os.path.splitext(os.path.basename(args.input))[0]
+    fields = [burst.metadata(field) for field in
+              ("frame_id", "timestamp", "host_monotonic", "host_time")]
+    with FrameIndexWriter(os.path.join(args.output, root + SUFFIX)) as index:
+        for i, values in enumerate(zip(*fields)):
+            index.append(frame_name(burst, i, args.format), *values)
+
+    print("\nMy work is done!\n")
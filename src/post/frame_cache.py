@@ -0,0 +1,235 @@
+"""
+Cache decoded frames on disk.
+
+# SCRIPT   : frame_cache.py
+# POURPOSE : Keep decoded (and optionally undistorted or rectified)
+#            frames on disk as memory-mappable arrays, so that scripts
+#            that are run again over the same frames (e.g. when tuning
+#            parameters) read them back instead of decoding them again.
+#            The cache has a size cap and evicts the least recently used
+#            frames.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import hashlib
+
+import numpy as np
+
+
+# file hashes, as {(path, size, mtime): hash}
+_FILE_HASHES = {}
+
+
+def file_hash(fname: str, chunk_size: int = 1 << 22):
+    """
+    Hash the contents of a file.
+
+    Hashes are remembered for the life of the process, as long as the size
+    and modification time of the file do not change.
+
+    Parameters
+    ----------
+    fname : str
+        File name.
+    chunk_size : int
+        Bytes read at a time.
+
+    Returns
+    -------
+    digest : str
+        Hex digest of the file contents.
+    """
+    stat = os.stat(fname)
+    key = (os.path.realpath(fname), stat.st_size, stat.st_mtime_ns)
+    if key not in _FILE_HASHES:
+        h = hashlib.blake2b(digest_size=16)
+        with open(fname, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        _FILE_HASHES[key] = h.hexdigest()
+    return _FILE_HASHES[key]
+
+
+def array_hash(*items):
+    """
+    Hash arrays and other values, e.g. a camera calibration.
+
+    Parameters
+    ----------
+    items : list
+        Arrays, numbers or strings.
+
+    Returns
+    -------
+    digest : str
+        Hex digest of the items.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for item in items:
+        if isinstance(item, np.ndarray):
+            arr = np.ascontiguousarray(item)
+            h.update(str((arr.dtype.str, arr.shape)).encode())
+            h.update(arr.tobytes())
+        else:
+            h.update(repr(item).encode())
+    return h.hexdigest()
+
+
+class FrameCache:
+    """
+    On-disk cache of decoded frames with least recently used eviction.
+
+    Frames are stored as .npy files named after their key, and read back
+    as read-only memory maps. Reading a frame marks it as recently used
+    (by touching its file), and writing a frame evicts the least recently
+    used frames once the cache is larger than its size cap. Several
+    processes can share a cache: files are written atomically and frames
+    that disappear are decoded again.
+
+    Parameters
+    ----------
+    path : str
+        Cache folder. Created if needed.
+    max_size : float
+        Size cap in bytes.
+    """
+
+    def __init__(self, path: str, max_size: float = 10e9):
+
+        self.path = path
+        self.max_size = float(max_size)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        if self._size > self.max_size:
+            self.evict()
+
+    def __getstate__(self):
+        # other processes count their own writes
+        state = self.__dict__.copy()
+        state["hits"] = state["misses"] = 0
+        return state
+
+    @staticmethod
+    def key(*parts):
+        """Return the cache key for a frame, see array_hash()."""
+        return array_hash(*parts)
+
+    def __contains__(self, key: str):
+        return os.path.isfile(self._fname(key))
+
+    def _fname(self, key: str):
+        # one sub-folder per leading byte keeps folders small
+        return os.path.join(self.path, key[:2], key + ".npy")
+
+    def _entries(self):
+        """List the cached files as (fname, size, last use)."""
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for fname in files:
+                if not fname.endswith(".npy"):
+                    continue
+                fname = os.path.join(root, fname)
+                try:
+                    stat = os.stat(fname)
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((fname, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def get(self, key: str):
+        """
+        Read a frame from the cache.
+
+        Parameters
+        ----------
+        key : str
+            Frame key.
+
+        Returns
+        -------
+        frame : np.ndarray
+            Read-only memory map of the frame, or None if it is not
+            cached.
+        """
+        fname = self._fname(key)
+        try:
+            os.utime(fname)  # mark as recently used
+            frame = np.load(fname, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        except ValueError:  # truncated file, decode again
+            self._remove(fname)
+            return None
+        self.hits += 1
+        return frame
+
+    def put(self, key: str, frame: np.ndarray):
+        """
+        Write a frame missing from the cache, evicting old frames if needed.
+
+        Parameters
+        ----------
+        key : str
+            Frame key.
+        frame : np.ndarray
+            Frame array.
+
+        Returns
+        -------
+        None
+        """
+        fname = self._fname(key)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmp = "{}.{}.tmp".format(fname, os.getpid())
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(frame))
+        os.replace(tmp, fname)
+        self.misses += 1
+        self._size += os.path.getsize(fname)
+        if self._size > self.max_size:
+            self.evict()
+
+    def _remove(self, fname: str):
+        try:
+            os.remove(fname)
+        except FileNotFoundError:
+            pass
+
+    def evict(self, fraction: float = 0.9):
+        """
+        Remove the least recently used frames.
+
+        Parameters
+        ----------
+        fraction : float
+            Frames are removed until the cache is at most this fraction of
+            its size cap, so that eviction does not run on every write.
+
+        Returns
+        -------
+        None
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for fname, size, _ in entries:
+            if self._size <= self.max_size * fraction:
+                break
+            self._remove(fname)
+            self._size -= size
+
+    def clear(self):
+        """Remove all frames from the cache."""
+        for fname, _, _ in self._entries():
+            self._remove(fname)
+        self._size = 0
+
+    @property
+    def size(self):
+        """Return the size of the cache in bytes, as last counted."""
+        return self._size
@@ -0,0 +1,203 @@
+"""
+Read and write frame indexes.
+
+# SCRIPT   : frame_index.py
+# POURPOSE : Record the camera frame id, camera timestamp and host clock of
+#            every frame of a capture burst, and recover exact frame times
+#            from them in post-processing.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import csv
+
+import datetime
+
+from glob import glob
+
+import numpy as np
+
+
+# file, camera frame id, camera timestamp (ns), host monotonic clock (s)
+# and host wall clock (s since the epoch)
+FIELDS = ["file", "frame_id", "timestamp", "host_monotonic", "host_time"]
+
+SUFFIX = "-index.csv"
+
+
+class FrameIndexWriter:
+    """
+    Write a frame index in CSV format, one row per frame.
+
+    Parameters
+    ----------
+    fname : str
+        Output file name. By convention it ends with SUFFIX.
+    """
+
+    def __init__(self, fname: str):
+
+        self.f = open(fname, "w", newline="")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(FIELDS)
+
+    def append(self, file: str, frame_id: int, timestamp: int,
+               host_monotonic: float, host_time: float):
+        """
+        Append a frame.
+
+        Parameters
+        ----------
+        file : str
+            Frame file name, without the folder.
+        frame_id : int
+            Camera frame id.
+        timestamp : int
+            Camera timestamp in nanoseconds.
+        host_monotonic : float
+            Host monotonic clock in seconds.
+        host_time : float
+            Host wall clock in seconds since the epoch.
+
+        Returns
+        -------
+        None
+        """
+        self.writer.writerow([file, int(frame_id), int(timestamp),
+                              "{:.6f}".format(host_monotonic),
+                              "{:.6f}".format(host_time)])
+
+    def close(self):
+        """Close the file."""
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_frame_index(fname: str):
+    """
+    Read a frame index.
+
+    Parameters
+    ----------
+    fname : str
+        Frame index file name.
+
+    Returns
+    -------
+    index : dict
+        One array per field in FIELDS.
+    """
+    with open(fname, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    return {"file": np.array([row["file"] for row in rows], dtype=object),
+            "frame_id": np.array([int(row["frame_id"]) for row in rows],
+                                 dtype=np.int64),
+            "timestamp": np.array([int(row["timestamp"]) for row in rows],
+                                  dtype=np.int64),
+            "host_monotonic": np.array([float(row["host_monotonic"])
+                                        for row in rows]),
+            "host_time": np.array([float(row["host_time"]) for row in rows])}
+
+
+def find_frame_index(folder: str):
+    """
+    Find the frame index written by the capture in a folder.
+
+    Parameters
+    ----------
+    folder : str
+        Image folder.
+
+    Returns
+    -------
+    fname : str
+        Frame index file name, or None if there is none.
+    """
+    candidates = sorted(glob(os.path.join(folder, "*" + SUFFIX)))
+    if len(candidates) > 1:
+        print("  -- warning: found {} frame indexes, using {}".format(
+            len(candidates), candidates[0]))
+    return candidates[0] if candidates else None
+
+
+def dropped_frames(frame_id: np.ndarray):
+    """
+    Count the frames missing from a sequence of frame ids.
+
+    Parameters
+    ----------
+    frame_id : np.ndarray
+        Camera frame ids, in capture order.
+
+    Returns
+    -------
+    dropped : int
+        Number of missing frames.
+    """
+    gaps = np.diff(np.asarray(frame_id, dtype=np.int64)) - 1
+    return int(gaps[gaps > 0].sum())
+
+
+def frame_times(images: list, index_file: str = None,
+                start_date: datetime.datetime = None, freq: float = None):
+    """
+    Return the time of each image.
+
+    Times come from the camera timestamps in the frame index if one is
+    given, and the start date from the host clock of the first image.
+    Without an index, frames are assumed to be evenly spaced at ``freq``
+    from ``start_date``.
+
+    Parameters
+    ----------
+    images : list
+        Image file names.
+    index_file : str
+        Frame index file name. Optional.
+    start_date : datetime.datetime
+        Time of the first image, used without an index.
+    freq : float
+        Acquisition frequency in Hz, required without an index.
+
+    Returns
+    -------
+    start_date : datetime.datetime
+        Time of the first image.
+    seconds : np.ndarray
+        Seconds since the first image.
+    """
+    if not index_file:
+        if not freq:
+            raise ValueError("The frame rate is unknown.")
+        print("  -- No frame index, assuming frames every {} s".format(
+            1 / freq))
+        return start_date, np.arange(len(images)) / freq
+
+    if not len(images):
+        return start_date, np.zeros(0)
+
+    index = read_frame_index(index_file)
+    rows = {name: k for k, name in enumerate(index["file"])}
+    try:
+        k = np.array([rows[os.path.basename(image)] for image in images])
+    except KeyError as ex:
+        raise ValueError("Image {} is not in the frame index {}.".format(
+            ex.args[0], index_file))
+
+    timestamp = index["timestamp"][k]
+    seconds = (timestamp - timestamp[0]) / 1e9
+    start_date = datetime.datetime.fromtimestamp(index["host_time"][k[0]])
+
+    dropped = dropped_frames(index["frame_id"][k])
+    print("  -- Frame times from {}, {} dropped frame(s)".format(
+        index_file, dropped))
+
+    return start_date, seconds
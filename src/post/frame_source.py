@@ -0,0 +1,824 @@
+"""
+Read the frames of a capture, whatever the way it was stored.
+
+# SCRIPT   : frame_source.py
+# POURPOSE : Give the post-processing scripts a single, lazy way to read
+#            frames from image folders, videos (e.g. the H.264 recordings
+#            of the Raspberry Pi camera) and raw bursts, with slicing by
+#            frame or time, read-ahead on a background thread, shape
+#            probing without decoding and optional grey or reduced
+#            resolution decoding.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import queue
+import shutil
+import threading
+import subprocess
+
+import datetime
+
+from glob import glob
+from natsort import natsorted
+
+import numpy as np
+
+import cv2
+
+try:
+    from PIL import Image
+except ImportError:  # probe the images by decoding them
+    Image = None
+
+from frame_cache import file_hash
+from frame_index import SUFFIX, find_frame_index, frame_times
+from raw_burst import BAYER_CODES, RawBurst
+from video_frames import INDEX_SUFFIX, count_frames, index_h264, is_h264
+from video_frames import is_video, read_video_index
+
+
+# decode-time reductions, see cv2.IMREAD_REDUCED_*
+REDUCTIONS = [1, 2, 4, 8]
+
+# cv2.imread flags as {(grey, reduce): flag}
+IMREAD_FLAGS = {(False, 1): cv2.IMREAD_COLOR,
+                (False, 2): cv2.IMREAD_REDUCED_COLOR_2,
+                (False, 4): cv2.IMREAD_REDUCED_COLOR_4,
+                (False, 8): cv2.IMREAD_REDUCED_COLOR_8,
+                (True, 1): cv2.IMREAD_GRAYSCALE,
+                (True, 2): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                (True, 4): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                (True, 8): cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+BURST_EXTENSIONS = [".burst"]
+
+# image files listed when a folder is opened without an image format
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".jpe", ".png", ".tif", ".tiff", ".bmp",
+                    ".dib", ".webp", ".jp2", ".pbm", ".pgm", ".ppm", ".pnm",
+                    ".sr", ".ras", ".exr", ".hdr", ".pic"]
+
+
+def read_ahead(frames, prefetch: int = 4):
+    """
+    Consume an iterable on a background thread.
+
+    Items are produced ahead of the consumer, which can then spend its
+    time on them while the next ones are decoded. At most ``prefetch``
+    items are held in memory. Exceptions are re-raised in the consumer.
+
+    Parameters
+    ----------
+    frames : iterable
+        Items to produce, e.g. a FrameSource or a generator over one.
+    prefetch : int
+        Maximum number of items read ahead.
+
+    Yields
+    ------
+    frame : object
+        The items, in order.
+    """
+    items = queue.Queue(maxsize=max(1, prefetch))
+    done = object()
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for item in frames:
+                if stop.is_set():
+                    return
+                items.put(item)
+            items.put(done)
+        except Exception as ex:  # re-raised in the consumer
+            items.put(ex)
+
+    worker = threading.Thread(target=producer, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # unblock the producer if the consumer stops early
+        stop.set()
+        while worker.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                worker.join(0.01)
+
+
+def reduced_size(width: int, height: int, reduce: int = 1,
+                 round_up: bool = True):
+    """
+    Return the frame size after a decode-time reduction.
+
+    JPEG decoders scale in the DCT domain and round up, other formats are
+    resized by OpenCV and round down.
+
+    Parameters
+    ----------
+    width, height : int
+        Full frame size.
+    reduce : int
+        One of REDUCTIONS.
+    round_up : bool
+        Round up (JPEG) or down.
+
+    Returns
+    -------
+    width, height : int
+        Reduced frame size.
+    """
+    if round_up:
+        return -(-width // reduce), -(-height // reduce)
+    return width // reduce, height // reduce
+
+
+def pick_reduction(width: int, height: int, min_size: list = None):
+    """
+    Return the largest reduction that keeps frames at least min_size.
+
+    Parameters
+    ----------
+    width, height : int
+        Full frame size.
+    min_size : list
+        Minimum frame size needed as [width, height]. Either can be None
+        (or zero) to leave that side unconstrained. Default is full size.
+
+    Returns
+    -------
+    reduce : int
+        One of REDUCTIONS.
+    """
+    if not min_size:
+        return 1
+    min_width, min_height = [int(v or 0) for v in min_size]
+    reduce = 1
+    for r in REDUCTIONS:
+        # rounded down, so that the size holds for all formats
+        if width // r >= min_width and height // r >= min_height:
+            reduce = r
+    return reduce
+
+
+class FrameSource:
+    """
+    Frames of a capture, decoded lazily.
+
+    Sources are sequences: len() gives the number of frames, an integer
+    index decodes a single frame and a slice returns a view on a range of
+    frames that is decoded only when iterated. Iterating decodes the
+    frames in order, optionally ``prefetch`` frames ahead on a background
+    thread.
+
+    Subclasses implement _read() and the probing of the full frame size,
+    and can override _decode() to decode sequences more efficiently.
+
+    Decoded frames can be kept in an on-disk cache (see cached() and
+    frame_cache.FrameCache), so that frames are decoded only once across
+    runs.
+
+    Parameters
+    ----------
+    nframes : int
+        Number of frames.
+    grey : bool
+        Decode to grey if true.
+    reduce : int
+        Decode at 1/reduce of the resolution, one of REDUCTIONS.
+    prefetch : int
+        Frames decoded ahead when iterating. Default is 0 (no thread).
+    """
+
+    # frames can be decoded independently, in several processes
+    parallel = True
+
+    def __init__(self, nframes: int, grey: bool = False, reduce: int = 1,
+                 prefetch: int = 0):
+
+        if int(reduce) not in REDUCTIONS:
+            raise ValueError("Reduction must be one of {}.".format(
+                REDUCTIONS))
+        self.grey = bool(grey)
+        self.reduce = int(reduce)
+        self.prefetch = int(prefetch)
+        self.nframes = int(nframes)
+        self.range = range(self.nframes)
+        self.cache = None
+        self.transform = None
+        self.transform_key = ""
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, item):
+        """Decode frame item, or return a view on a slice of frames."""
+        if isinstance(item, slice):
+            view = object.__new__(type(self))
+            view.__dict__.update(self.__dict__)
+            view.range = self.range[item]
+            if view.range.step < 0:
+                raise ValueError("Frames can only be read forwards.")
+            return view
+        if self.cache is not None:
+            return next(self._cached(range(self.range[item],
+                                           self.range[item] + 1)))
+        return self._read(self.range[item])
+
+    def __iter__(self):
+        if self.cache is not None:
+            frames = self._cached(self.range)
+        else:
+            frames = self._decode(self.range)
+        if self.prefetch > 0:
+            return read_ahead(frames, self.prefetch)
+        return frames
+
+    def _read(self, n: int):
+        """Decode frame n of the full source."""
+        raise NotImplementedError
+
+    def _decode(self, indexes: range):
+        """Decode frames of the full source, in order."""
+        for n in indexes:
+            yield self._read(n)
+
+    def _cached(self, indexes: range):
+        """Read frames from the cache, decoding only the missing ones."""
+        keys = [self.cache.key(self.frame_key(n), self.grey, self.reduce,
+                               self.transform_key) for n in indexes]
+
+        # the missing frames are decoded in one go, in order
+        missing = [n for n, key in zip(indexes, keys)
+                   if key not in self.cache]
+        decoded = self._decode(missing)
+        missing = set(missing)
+
+        for n, key in zip(indexes, keys):
+            frame = None if n in missing else self.cache.get(key)
+            if frame is None:
+                # frames evicted meanwhile are decoded on their own
+                frame = next(decoded) if n in missing else self._read(n)
+                if frame is not None and self.transform is not None:
+                    frame = self.transform(frame)
+                if frame is not None:
+                    self.cache.put(key, frame)
+            yield frame
+
+    def cached(self, cache, transform=None, transform_key: str = ""):
+        """
+        Return a view that keeps the decoded frames in an on-disk cache.
+
+        Frames are keyed by the hash of their file, their number in it,
+        the grey conversion and reduction, and the transform key. Frames
+        found in the cache are returned as read-only memory maps, the
+        others are decoded, transformed and added to the cache.
+
+        Parameters
+        ----------
+        cache : frame_cache.FrameCache
+            The cache.
+        transform : callable
+            Function applied to the decoded frames before they are cached,
+            e.g. an undistortion or a rectification. Optional.
+        transform_key : str
+            Hash of everything the transform depends on (e.g. the camera
+            calibration, see frame_cache.array_hash()). Required with a
+            transform.
+
+        Returns
+        -------
+        view : FrameSource
+            The same frames, read through the cache. Its shape is that of
+            the frames before the transform.
+        """
+        if transform is not None and not transform_key:
+            raise ValueError("A transform needs a key to be cached.")
+        view = self[:]
+        view.cache = cache
+        view.transform = transform
+        view.transform_key = transform_key
+        return view
+
+    def frame_key(self, n: int):
+        """Return what identifies frame n of the full source on disk."""
+        return "{}:{}".format(file_hash(self.fname), n)
+
+    def _convert(self, frame: np.ndarray):
+        """Apply the grey conversion and reduction to a full frame."""
+        if frame is None:
+            return None
+        if self.grey and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.reduce > 1:
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame,
+                               reduced_size(width, height, self.reduce),
+                               interpolation=cv2.INTER_AREA)
+        return frame
+
+    def full_size(self):
+        """Return the full resolution frame size as (width, height)."""
+        raise NotImplementedError
+
+    @property
+    def shape(self):
+        """Shape of the decoded frames, probed without decoding."""
+        width, height = reduced_size(*self.full_size(), self.reduce)
+        return (height, width) if self.grey else (height, width, 3)
+
+    @property
+    def dtype(self):
+        return np.dtype(np.uint8)
+
+    def at_resolution(self, min_size: list = None):
+        """
+        Return a view decoded at the lowest resolution that is enough.
+
+        Scripts that do not need full resolution frames (e.g. to rank
+        frames by brightness or to feed a small model input) declare the
+        frame size they need, and the frames are decoded at the largest
+        reduction that still gives it. For JPEG images the reduction is
+        done by the decoder, which is several times faster than decoding
+        the full frame.
+
+        Parameters
+        ----------
+        min_size : list
+            Minimum frame size needed as [width, height]. Either can be
+            None. Default is full resolution.
+
+        Returns
+        -------
+        view : FrameSource
+            The same frames, decoded at the chosen reduction.
+        """
+        view = self[:]
+        view.reduce = pick_reduction(*self.full_size(), min_size)
+        return view
+
+    def frame_name(self, i: int):
+        """Return the name of frame i of the view."""
+        raise NotImplementedError
+
+    @property
+    def names(self):
+        """Names of the frames of the view."""
+        return [self.frame_name(i) for i in range(len(self))]
+
+    def seconds(self, freq: float = None):
+        """
+        Return the time of every frame of the full source.
+
+        Parameters
+        ----------
+        freq : float
+            Frame rate, used when the source has no frame times.
+
+        Returns
+        -------
+        seconds : np.ndarray
+            Seconds since the first frame.
+        """
+        if not freq:
+            raise ValueError("The frame rate is unknown.")
+        return np.arange(self.nframes) / freq
+
+    def times(self, start_date: datetime.datetime = None,
+              freq: float = None):
+        """
+        Return the time of each frame of the view.
+
+        Parameters
+        ----------
+        start_date : datetime.datetime
+            Time of the first frame, used if the source has no clock.
+        freq : float
+            Frame rate, used if the source has no frame times.
+
+        Returns
+        -------
+        start_date : datetime.datetime
+            Time of the first frame of the view.
+        seconds : np.ndarray
+            Seconds since the first frame of the view.
+        """
+        seconds = self.seconds(freq)[self.range.start:self.range.stop:
+                                     self.range.step]
+        if not len(seconds):
+            return start_date, seconds
+        if start_date is not None:
+            start_date += datetime.timedelta(seconds=float(seconds[0]))
+        return start_date, seconds - seconds[0]
+
+    def time_slice(self, start: float = None, stop: float = None,
+                   step: int = 1, freq: float = None):
+        """
+        Return a view on the frames between two times.
+
+        Parameters
+        ----------
+        start, stop : float
+            Seconds since the first frame of the view. Frames with
+            start <= t < stop are kept. Optional.
+        step : int
+            Keep every step-th frame. Default is 1.
+        freq : float
+            Frame rate, used if the source has no frame times.
+
+        Returns
+        -------
+        view : FrameSource
+            The frames.
+        """
+        _, seconds = self.times(freq=freq)
+        first = 0 if start is None else int(np.searchsorted(seconds, start))
+        last = len(seconds) if stop is None else \
+            int(np.searchsorted(seconds, stop))
+        return self[first:last:step]
+
+
+class ImageFrames(FrameSource):
+    """
+    Frames stored as image files.
+
+    Reductions use the decode-time scaling of cv2.imread(), which for
+    JPEG decodes only the DCT coefficients needed.
+
+    Parameters
+    ----------
+    files : list
+        Image file names, in time order.
+    index_file : str
+        Frame index written by the capture, see frame_index.py. Optional,
+        searched for in the folder of the first image if not given.
+    grey, reduce, prefetch
+        See FrameSource.
+    """
+
+    def __init__(self, files: list, index_file: str = None, **kwargs):
+
+        super().__init__(len(files), **kwargs)
+        self.files = list(files)
+        self.index_file = index_file
+
+    @property
+    def flag(self):
+        """cv2.imread() flag for the grey conversion and reduction."""
+        return IMREAD_FLAGS[(self.grey, self.reduce)]
+
+    def _read(self, n: int):
+        # None for files that are not images
+        return cv2.imread(self.files[n], self.flag)
+
+    def full_size(self):
+        fname = self.files[self.range[0] if len(self) else 0]
+        if Image is not None:
+            try:
+                with Image.open(fname) as img:  # reads the header only
+                    return img.size
+            except OSError:
+                pass
+        height, width = cv2.imread(fname).shape[:2]
+        return width, height
+
+    @property
+    def shape(self):
+        fname = self.files[self.range[0] if len(self) else 0]
+        jpeg = os.path.splitext(fname)[1].lower() in [".jpg", ".jpeg"]
+        width, height = reduced_size(*self.full_size(), self.reduce,
+                                     round_up=jpeg)
+        return (height, width) if self.grey else (height, width, 3)
+
+    def frame_name(self, i: int):
+        return self.files[self.range[i]]
+
+    def frame_key(self, n: int):
+        return file_hash(self.files[n])
+
+    def _index_file(self):
+        """Return the frame index of the images, if there is one."""
+        if self.index_file is None and self.files:
+            return find_frame_index(os.path.dirname(self.files[0]))
+        return self.index_file
+
+    def seconds(self, freq: float = None):
+        _, seconds = frame_times(self.files, self._index_file(), None, freq)
+        return seconds
+
+    def times(self, start_date: datetime.datetime = None,
+              freq: float = None):
+        index_file = self._index_file()
+        if index_file:
+            # exact times, and the start date from the host clock
+            files = self.files[self.range.start:self.range.stop:
+                               self.range.step]
+            return frame_times(files, index_file, start_date, freq)
+        return super().times(start_date, freq)
+
+
+class VideoFrames(FrameSource):
+    """
+    Frames of a video file, decoded on demand.
+
+    Iterating decodes the video once, in order. With the ffmpeg backend,
+    a single ffmpeg process pipes raw frames (already grey and reduced,
+    if asked) to this process. The opencv backend decodes in-process with
+    cv2.VideoCapture.
+
+    H.264 streams are indexed (see video_frames.index_h264(), the index
+    written by the capture is used if there is one), so that with the
+    ffmpeg backend views and single frames start decoding from the last
+    keyframe before the first frame wanted instead of from the start of
+    the file.
+
+    Parameters
+    ----------
+    fname : str
+        Video file name.
+    backend : str
+        "ffmpeg", "opencv" or "auto" (ffmpeg if it is installed).
+    resolution : list
+        Frame size as [width, height]. Probed from the file if not given.
+    grey, reduce, prefetch
+        See FrameSource.
+    """
+
+    def __init__(self, fname: str, backend: str = "auto",
+                 resolution: list = None, **kwargs):
+
+        if not os.path.isfile(fname):
+            raise IOError("No such file or directory \"{}\"".format(fname))
+        if backend == "auto":
+            backend = "ffmpeg" if shutil.which("ffmpeg") else "opencv"
+        if backend not in ["ffmpeg", "opencv"]:
+            raise ValueError("Unknown backend {}.".format(backend))
+
+        self.fname = fname
+        self.backend = backend
+
+        cap = cv2.VideoCapture(fname)
+        if resolution is None:
+            resolution = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                          int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        self.width, self.height = [int(v) for v in resolution]
+        if self.width <= 0 or self.height <= 0:
+            raise ValueError("Could not probe the frame size of {}, give "
+                             "the resolution.".format(fname))
+
+        self.index = None
+        if is_h264(fname):
+            index_file = os.path.splitext(fname)[0] + INDEX_SUFFIX
+            if os.path.isfile(index_file):
+                self.index = read_video_index(index_file)
+            else:
+                self.index = index_h264(fname, self.fps)
+            nframes = len(self.index["frame"])
+        else:
+            nframes = count_frames(fname)
+
+        super().__init__(nframes, **kwargs)
+
+    @property
+    def parallel(self):
+        # workers can only start from a keyframe with an index
+        return self.backend == "ffmpeg" and self.index is not None
+
+    def full_size(self):
+        return self.width, self.height
+
+    def _read(self, n: int):
+        frames = self._decode(range(n, n + 1))
+        try:
+            return next(frames)
+        except StopIteration:
+            raise IndexError("Could not decode frame {} of {}.".format(
+                n, self.fname))
+        finally:
+            frames.close()
+
+    def frame_at(self, seconds: float, freq: float = None):
+        """
+        Decode the frame of the view nearest to a time.
+
+        Parameters
+        ----------
+        seconds : float
+            Seconds since the first frame of the view.
+        freq : float
+            Frame rate, if the video has no frame times.
+
+        Returns
+        -------
+        frame : np.ndarray
+            BGR (or grey) frame.
+        """
+        _, times = self.times(freq=freq)
+        return self[int(np.argmin(np.abs(times - seconds)))]
+
+    def seconds(self, freq: float = None):
+        if self.index is not None and np.isfinite(self.index["time"]).all():
+            return self.index["time"]
+        return super().seconds(freq if freq else self.fps)
+
+    def frame_name(self, i: int):
+        """Return a name for frame i of the view, like <root>-000012."""
+        root = os.path.splitext(os.path.basename(self.fname))[0]
+        return "{}-{}".format(root, str(self.range[i]).zfill(6))
+
+    def _decode(self, indexes: range):
+        if not indexes:
+            return
+        wanted = iter(indexes)
+        n = next(wanted)
+
+        # start from the last keyframe before the first frame
+        key = 0
+        if self.index is not None and self.backend == "ffmpeg":
+            keyframes = np.flatnonzero(self.index["keyframe"][:n + 1])
+            key = int(keyframes[-1]) if keyframes.size else 0
+
+        for k, frame in enumerate(self._stream(key), start=key):
+            if k < n:
+                continue
+            yield frame
+            n = next(wanted, None)
+            if n is None:
+                return
+
+    def _stream(self, key: int = 0):
+        """Decode all frames, from keyframe key on (ffmpeg only)."""
+        if self.backend == "opencv":
+            cap = cv2.VideoCapture(self.fname)
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        return
+                    yield self._convert(frame)
+            finally:
+                cap.release()
+
+        # ffmpeg converts and scales the frames itself
+        height, width = self.shape[:2]
+        cmd = ["ffmpeg", "-loglevel", "error"]
+        if key > 0:
+            cmd += ["-f", "h264", "-skip_initial_bytes",
+                    str(self.index["offset"][key])]
+        cmd += ["-i", self.fname,
+                "-vsync", "0", "-f", "rawvideo",
+                "-pix_fmt", "gray" if self.grey else "bgr24",
+                "-s", "{}x{}".format(width, height), "-sws_flags", "area",
+                "pipe:1"]
+        size = int(np.prod(self.shape))
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                bufsize=size)
+        try:
+            while True:
+                frame = np.empty(self.shape, dtype=np.uint8)
+                if proc.stdout.readinto(frame.data.cast("B")) < size:
+                    return
+                yield frame
+        finally:
+            # stop the decoder if the consumer stops early
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+
+class BurstFrames(FrameSource):
+    """
+    Frames of a raw burst written by the FLIR capture, debayered on
+    demand.
+
+    Parameters
+    ----------
+    fname : str
+        Burst file name.
+    grey, reduce, prefetch
+        See FrameSource.
+    """
+
+    def __init__(self, fname: str, **kwargs):
+
+        self.fname = fname
+        self._burst = RawBurst(fname)
+        super().__init__(len(self._burst), **kwargs)
+
+    def __getstate__(self):
+        # the memory map is opened again in other processes
+        state = self.__dict__.copy()
+        state["_burst"] = None
+        return state
+
+    @property
+    def burst(self):
+        if self._burst is None:
+            self._burst = RawBurst(self.fname)
+        return self._burst
+
+    def _read(self, n: int):
+        return self._convert(self.burst.debayer(n))
+
+    def full_size(self):
+        return self.burst.width, self.burst.height
+
+    @property
+    def shape(self):
+        # Bayer frames are debayered to BGR, others keep their channels
+        burst = self.burst
+        width, height = reduced_size(*self.full_size(), self.reduce)
+        colour = BAYER_CODES.get(burst.pixel_format) is not None or \
+            burst.header.get("channels", 1) == 3
+        return (height, width, 3) if colour and not self.grey \
+            else (height, width)
+
+    @property
+    def dtype(self):
+        # 16-bit bursts decode to uint16
+        return np.dtype(self.burst.header["pixel_dtype"])
+
+    def frame_name(self, i: int):
+        """Return a name for frame i of the view, like debayer_burst.py."""
+        attrs = self.burst.attrs
+        parts = [part for part in (attrs.get("serial", ""),
+                                   attrs.get("date", ""),
+                                   str(self.range[i]).zfill(6)) if part]
+        return "-".join(parts)
+
+    def seconds(self, freq: float = None):
+        timestamp = self.burst.metadata("timestamp").astype(np.float64)
+        if len(timestamp) and timestamp.any():
+            return (timestamp - timestamp[0]) / 1e9
+        return super().seconds(freq)
+
+    def times(self, start_date: datetime.datetime = None,
+              freq: float = None):
+        host_time = self.burst.metadata("host_time")
+        if len(self) and np.isfinite(host_time[self.range.start]):
+            start_date = datetime.datetime.fromtimestamp(
+                host_time[self.range.start])
+            _, seconds = super().times(None, freq)
+            return start_date, seconds
+        return super().times(start_date, freq)
+
+
+def open_frames(path: str, image_format: str = "", index_file: str = None,
+                **kwargs):
+    """
+    Open the frames of a capture.
+
+    Parameters
+    ----------
+    path : str
+        A folder with images, a glob pattern, an image, a video or a raw
+        burst.
+    image_format : str
+        Image extension used when a folder is given. Default is all the
+        image files (see IMAGE_EXTENSIONS). Frame indexes and the products
+        folder written by the capture are never listed.
+    index_file : str
+        Frame index of the images, see ImageFrames. Optional.
+    kwargs : dict
+        Options of the source, see FrameSource and its subclasses.
+
+    Returns
+    -------
+    frames : FrameSource
+        The frames.
+    """
+    if is_video(path):
+        return VideoFrames(path, **kwargs)
+    if os.path.isfile(path) and \
+            os.path.splitext(path)[1].lower() in BURST_EXTENSIONS:
+        return BurstFrames(path, **kwargs)
+
+    if os.path.isdir(path):
+        files = [f for f in glob(os.path.join(path,
+                                              "*{}".format(image_format)))
+                 if os.path.isfile(f) and
+                 not f.endswith((SUFFIX, INDEX_SUFFIX))]
+        if not image_format:
+            files = [f for f in files if os.path.splitext(f)[1].lower()
+                     in IMAGE_EXTENSIONS]
+        files = natsorted(files)
+    elif any(c in path for c in "*?["):
+        files = natsorted(glob(path))
+    elif os.path.isfile(path):
+        files = [path]
+    else:
+        raise IOError("No such file or directory \"{}\"".format(path))
+    return ImageFrames(files, index_file=index_file, **kwargs)
@@ -0,0 +1,621 @@
+"""
+Compute image statistics in a single pass.
+
+# SCRIPT   : image_statistics.py
+# POURPOSE : Accumulate the mean, variance, minimum, maximum, brightest and
+#            darkest frames and, optionally, percentiles of a series of
+#            images in one pass over the decoded frames. Partial
+#            statistics can be merged, so chunks of images can be reduced
+#            in parallel.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import queue
+import threading
+
+from multiprocessing import Pool
+
+import numpy as np
+
+import cv2
+
+from tqdm import tqdm
+
+from frame_source import FrameSource, ImageFrames
+
+
+# products that can be written by write_products()
+PRODUCTS = ["average", "deviation", "variance", "brightest", "darkest"]
+
+# largest memory, in bytes, for the percentile histograms of all the
+# workers. A 2368x1812 colour frame with 32 bins needs 1.5 GB.
+MAX_HISTOGRAM_BYTES = 512 * 2**20
+
+
+def histogram_bytes(shape: tuple, bins: int = 32):
+    """
+    Return the memory needed by the percentile histograms of a frame.
+
+    Parameters
+    ----------
+    shape : tuple
+        Frame shape.
+    bins : int
+        Number of histogram bins.
+
+    Returns
+    -------
+    nbytes : int
+        Size of the histograms in bytes.
+    """
+    return int(np.prod(shape)) * int(bins) * np.dtype(np.uint32).itemsize
+
+
+class ImageStatistics:
+    """
+    Running statistics of a series of images.
+
+    The mean and variance are updated with Welford's algorithm. All updates
+    are done in place on preallocated buffers, so adding a frame does not
+    allocate full-frame temporaries. Buffers are allocated from the first
+    frame added. Statistics of consecutive chunks of frames can be combined
+    with merge().
+
+    Parameters
+    ----------
+    dtype : np.dtype
+        Accumulator precision, np.float32 or np.float64.
+    percentiles : list
+        Percentiles (0-100) to estimate. Percentiles are computed from
+        per-pixel histograms of uint8 frames, which take
+        4 x pixels x channels x bins bytes. Frames that need more than
+        MAX_HISTOGRAM_BYTES are refused: use reduced frames (e.g.
+        open_frames(path, reduce=4)) or fewer bins. Optional.
+    bins : int
+        Number of histogram bins used for the percentiles. Must divide 256.
+        Default is 32.
+    keep_frames : bool
+        Keep a copy of the brightest and darkest frames if true.
+    """
+
+    def __init__(self, dtype=np.float64, percentiles: list = None,
+                 bins: int = 32, keep_frames: bool = True):
+
+        if bins < 1 or bins > 256 or 256 % bins != 0:
+            raise ValueError("The number of bins must divide 256.")
+
+        self.dtype = np.dtype(dtype)
+        self.percentiles = list(percentiles) if percentiles else []
+        self.bins = int(bins)
+        self.keep_frames = keep_frames
+
+        self.k = 0
+        self.shape = None
+        self.images = []
+        self.brightness = []
+        self.brightest_index = None
+        self.darkest_index = None
+        self.brightest = None
+        self.darkest = None
+
+    def _allocate(self, frame: np.ndarray):
+        """Allocate the accumulators from the first frame."""
+        self.shape = frame.shape
+        self.M1 = np.zeros(frame.shape, dtype=self.dtype)
+        self.M2 = np.zeros(frame.shape, dtype=self.dtype)
+        self._delta = np.empty(frame.shape, dtype=self.dtype)
+        self._tmp = np.empty(frame.shape, dtype=self.dtype)
+        self.min = frame.copy()
+        self.max = frame.copy()
+
+        # brightness is the V channel of the HSV colour space
+        self._value = np.empty(frame.shape[:2], dtype=frame.dtype)
+
+        if self.percentiles:
+            if frame.dtype != np.uint8:
+                raise ValueError("Percentiles are only available for uint8 "
+                                 "images.")
+            nbytes = histogram_bytes(frame.shape, self.bins)
+            if nbytes > MAX_HISTOGRAM_BYTES:
+                raise ValueError(
+                    "Percentiles of {} frames need {:.1f} GB of histograms."
+                    " Use reduced frames or fewer bins.".format(
+                        "x".join(str(n) for n in frame.shape), nbytes / 2**30))
+            self.histogram = np.zeros((frame.size, self.bins),
+                                      dtype=np.uint32)
+            self._offsets = np.arange(frame.size, dtype=np.intp) * self.bins
+            self._bin = np.empty(frame.size, dtype=np.intp)
+
+    def add(self, frame: np.ndarray):
+        """
+        Add a frame to the statistics.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Image array. All frames must have the same shape and dtype.
+
+        Returns
+        -------
+        None
+        """
+        if self.shape is None:
+            self._allocate(frame)
+        elif frame.shape != self.shape:
+            raise ValueError("Frame shape {} does not match {}.".format(
+                frame.shape, self.shape))
+
+        self.k += 1
+
+        # Welford's update: M1 += (x - M1) / k; M2 += (x - M1_old)(x - M1)
+        np.subtract(frame, self.M1, out=self._delta, casting="unsafe")
+        np.multiply(self._delta, 1 / self.k, out=self._tmp)
+        self.M1 += self._tmp
+        np.subtract(frame, self.M1, out=self._tmp, casting="unsafe")
+        self._tmp *= self._delta
+        self.M2 += self._tmp
+
+        # per-pixel extremes
+        np.minimum(self.min, frame, out=self.min)
+        np.maximum(self.max, frame, out=self.max)
+
+        # frame brightness
+        if frame.ndim == 3:
+            np.max(frame, axis=2, out=self._value)
+            brightness = self._value.sum(dtype=np.float64)
+        else:
+            brightness = frame.sum(dtype=np.float64)
+        self.brightness.append(brightness)
+        index = self.k - 1
+        if self.brightest_index is None or \
+                brightness > self.brightness[self.brightest_index]:
+            self.brightest_index = index
+            if self.keep_frames:
+                self.brightest = frame.copy()
+        if self.darkest_index is None or \
+                brightness < self.brightness[self.darkest_index]:
+            self.darkest_index = index
+            if self.keep_frames:
+                self.darkest = frame.copy()
+
+        # histograms for the percentiles
+        if self.percentiles:
+            np.floor_divide(frame.ravel(), 256 // self.bins, out=self._bin,
+                            casting="unsafe")
+            np.minimum(self._bin, self.bins - 1, out=self._bin)
+            self._bin += self._offsets
+            self.histogram.ravel()[self._bin] += 1
+
+    def merge(self, other):
+        """
+        Merge the statistics of the frames that follow this chunk.
+
+        The mean and variance are combined with Chan et al. parallel
+        formula. Frame indexes of ``other`` are shifted so that they
+        follow the frames of this chunk.
+
+        Parameters
+        ----------
+        other : ImageStatistics
+            Statistics of the next chunk of frames.
+
+        Returns
+        -------
+        self : ImageStatistics
+            The merged statistics.
+        """
+        if other.k == 0:
+            return self
+        if self.k == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        if other.shape != self.shape:
+            raise ValueError("Frame shape {} does not match {}.".format(
+                other.shape, self.shape))
+
+        # Chan's update of the mean and the sum of squared differences
+        n = self.k + other.k
+        delta = other.M1 - self.M1
+        self.M1 += delta * (other.k / n)
+        delta *= delta
+        delta *= self.k * other.k / n
+        self.M2 += other.M2
+        self.M2 += delta
+
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+
+        # the earliest frame wins ties, as in the serial path
+        offset = self.k
+        if other.brightness[other.brightest_index] > \
+                self.brightness[self.brightest_index]:
+            self.brightest_index = other.brightest_index + offset
+            self.brightest = other.brightest
+        if other.brightness[other.darkest_index] < \
+                self.brightness[self.darkest_index]:
+            self.darkest_index = other.darkest_index + offset
+            self.darkest = other.darkest
+        self.brightness += other.brightness
+        self.images += other.images
+
+        if self.percentiles:
+            self.histogram += other.histogram
+
+        self.k = n
+        return self
+
+    def __getstate__(self):
+        """Do not pickle the scratch buffers."""
+        state = self.__dict__.copy()
+        for key in ("_delta", "_tmp", "_value", "_offsets", "_bin"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        """Re-allocate the scratch buffers."""
+        self.__dict__.update(state)
+        if self.shape is not None:
+            self._delta = np.empty(self.shape, dtype=self.dtype)
+            self._tmp = np.empty(self.shape, dtype=self.dtype)
+            self._value = np.empty(self.shape[:2], dtype=self.min.dtype)
+            if self.percentiles:
+                size = int(np.prod(self.shape))
+                self._offsets = np.arange(size, dtype=np.intp) * self.bins
+                self._bin = np.empty(size, dtype=np.intp)
+
+    @property
+    def count(self):
+        """Return the number of frames added."""
+        return self.k
+
+    @property
+    def mean(self):
+        """Return the mean image."""
+        return self.M1
+
+    @property
+    def var(self):
+        """Return the sample variance image."""
+        if self.k < 2:
+            return np.full(self.shape, np.nan, dtype=self.dtype)
+        return self.M2 / (self.k - 1)
+
+    @property
+    def std(self):
+        """Return the sample standard deviation image."""
+        return np.sqrt(self.var)
+
+    def percentile(self, q: float):
+        """
+        Estimate a percentile image from the per-pixel histograms.
+
+        Parameters
+        ----------
+        q : float
+            Percentile (0-100). Must be one of the percentiles requested
+            at creation.
+
+        Returns
+        -------
+        img : np.ndarray
+            Percentile image, linearly interpolated within the bins.
+        """
+        if q not in self.percentiles:
+            raise ValueError("Percentile {} was not requested.".format(q))
+
+        width = 256 / self.bins
+        target = q / 100 * self.k
+        cumulative = np.cumsum(self.histogram, axis=1)
+
+        # first bin in which the cumulative count reaches the target
+        ibin = np.argmax(cumulative >= target, axis=1)
+        rows = np.arange(len(ibin))
+        counts = self.histogram[rows, ibin].astype(np.float64)
+        below = cumulative[rows, ibin] - counts
+        frac = np.divide(target - below, counts,
+                         out=np.zeros_like(counts), where=counts > 0)
+
+        return ((ibin + frac) * width).reshape(self.shape)
+
+
+class BackgroundStatistics:
+    """
+    Accumulate image statistics on a background thread.
+
+    Frames are queued by add() and reduced by a worker thread, so a
+    capture loop can feed frames as they are grabbed without waiting for
+    the update. When the queue is full the frame is skipped and counted
+    instead of stalling the caller.
+
+    Parameters
+    ----------
+    maxsize : int
+        Number of frames that can wait to be added. Default is 4.
+    kwargs
+        Passed to ImageStatistics.
+    """
+
+    def __init__(self, maxsize: int = 4, **kwargs):
+
+        self.stats = ImageStatistics(**kwargs)
+        self.queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self.skipped = 0
+        self.failed = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, frame: np.ndarray, code: int = None, copy: bool = False):
+        """
+        Queue a frame.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Image array. It must not be modified after it is queued,
+            unless copy is true.
+        code : int
+            OpenCV colour conversion code applied before the update
+            (e.g. to debayer a raw frame). Optional.
+        copy : bool
+            Queue a copy of the frame, for buffers that are reused. The
+            copy is only made if the frame is queued.
+
+        Returns
+        -------
+        queued : bool
+            False if the frame was skipped.
+        """
+        if self.queue.full():
+            self.skipped += 1
+            return False
+        try:
+            self.queue.put_nowait((frame.copy() if copy else frame, code))
+        except queue.Full:  # filled by another thread meanwhile
+            self.skipped += 1
+            return False
+        return True
+
+    def _run(self):
+        """Worker thread loop."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, code = item
+            try:
+                if code is not None:
+                    frame = cv2.cvtColor(frame, code)
+                self.stats.add(frame)
+            except (cv2.error, ValueError) as ex:
+                print("  -- warning: frame not added to the statistics, "
+                      "{}".format(ex))
+                self.failed += 1
+
+    def close(self):
+        """
+        Wait for the queued frames and stop the thread.
+
+        Returns
+        -------
+        stats : ImageStatistics
+            The accumulated statistics.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        return self.stats
+
+
+def requested_products(cfg: dict):
+    """
+    List the products switched on in a capture configuration.
+
+    Parameters
+    ----------
+    cfg : dict
+        Configuration as read from the JSON file. Products are switched on
+        with true flags in cfg["post_processing"].
+
+    Returns
+    -------
+    products : list
+        Products, in the order of PRODUCTS.
+    """
+    options = cfg.get("post_processing", {})
+    return [product for product in PRODUCTS if options.get(product, False)]
+
+
+def write_products(stats: ImageStatistics, root: str,
+                   products: list = PRODUCTS, ext: str = "png"):
+    """
+    Write image products from the accumulated statistics.
+
+    Parameters
+    ----------
+    stats : ImageStatistics
+        The statistics.
+    root : str
+        Output path and file name prefix. Products are saved as
+        <root>-<product>.<ext>.
+    products : list
+        Products to write, see PRODUCTS.
+    ext : str
+        Image format. Default is png.
+
+    Returns
+    -------
+    fnames : list
+        Files written.
+    """
+    if stats.count == 0:
+        return []
+
+    # the average keeps the depth of the frames (e.g. 16-bit bursts)
+    images = {"average":
+              lambda: np.round(stats.mean).astype(stats.min.dtype),
+              "deviation": lambda: scale_to_uint8(stats.std),
+              "variance": lambda: scale_to_uint8(stats.var),
+              "brightest": lambda: stats.max,
+              "darkest": lambda: stats.min}
+
+    folder = os.path.dirname(root)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    fnames = []
+    for product in products:
+        if product in ("deviation", "variance") and stats.count < 2:
+            continue
+        fname = "{}-{}.{}".format(root, product, ext)
+        cv2.imwrite(fname, images[product]())
+        fnames.append(fname)
+    return fnames
+
+
+def scale_to_uint8(arr: np.ndarray):
+    """
+    Scale an array to the 0-255 range and cast it to uint8.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        Input array.
+
+    Returns
+    -------
+    out : np.ndarray
+        Scaled uint8 array.
+    """
+    vmin = arr.min()
+    vmax = arr.max()
+    if vmax == vmin:
+        return np.zeros(arr.shape, dtype=np.uint8)
+    return ((arr - vmin) * (255 / (vmax - vmin))).astype(np.uint8)
+
+
+def reduce_images(images: list, dtype=np.float64, percentiles: list = None,
+                  bins: int = 32, keep_frames: bool = True, pbar=None):
+    """
+    Compute the statistics of a list of images serially.
+
+    Files that cannot be decoded as images are skipped.
+
+    Parameters
+    ----------
+    images : list or FrameSource
+        List of image files, or frames from frame_source.py.
+    dtype, percentiles, bins, keep_frames
+        See ImageStatistics.
+    pbar : tqdm
+        Progress bar to update. Optional.
+
+    Returns
+    -------
+    stats : ImageStatistics
+        The accumulated statistics.
+    """
+    stats = ImageStatistics(dtype=dtype, percentiles=percentiles, bins=bins,
+                            keep_frames=keep_frames)
+    if not isinstance(images, FrameSource):
+        images = ImageFrames(images)
+    for image, img in zip(images.names, images):
+
+        # ignore files that are not images
+        if img is not None:
+            stats.add(img)
+            stats.images.append(image)
+
+        if pbar is not None:
+            pbar.update()
+
+    return stats
+
+
+def _reduce_chunk(task: tuple):
+    """Reduce a chunk of images in a worker process."""
+    images, kwargs = task
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+    return len(images), reduce_images(images, **kwargs)
+
+
+def compute_statistics(images: list, dtype=np.float64,
+                       percentiles: list = None, bins: int = 32,
+                       keep_frames: bool = True, progress: bool = True,
+                       workers: int = 1):
+    """
+    Compute the statistics of a list of images in a single pass.
+
+    Files that cannot be decoded as images are skipped. With more than one
+    worker, the list is split into consecutive chunks that are reduced in
+    a process pool and then merged in order, which gives the same result
+    as the serial path within floating point tolerance. Sources that can
+    only be decoded from the start (see FrameSource.parallel) are reduced
+    serially.
+
+    Parameters
+    ----------
+    images : list or FrameSource
+        List of image files, or frames from frame_source.py.
+    dtype : np.dtype
+        Accumulator precision, np.float32 or np.float64.
+    percentiles : list
+        Percentiles (0-100) to estimate. Each worker keeps its own
+        histograms, so fewer workers are used if they would need more than
+        MAX_HISTOGRAM_BYTES in total. Optional.
+    bins : int
+        Number of histogram bins used for the percentiles.
+    keep_frames : bool
+        Keep a copy of the brightest and darkest frames if true.
+    progress : bool
+        Show a progress bar if true.
+    workers : int
+        Number of worker processes. Default is 1 (serial).
+
+    Returns
+    -------
+    stats : ImageStatistics
+        The accumulated statistics. Frame indexes refer to the decoded
+        images, see ``stats.images``.
+    """
+    kwargs = dict(dtype=dtype, percentiles=percentiles, bins=bins,
+                  keep_frames=keep_frames)
+
+    pbar = tqdm(total=len(images), disable=not progress)
+
+    if not isinstance(images, FrameSource):
+        images = ImageFrames(images)
+
+    workers = max(1, min(int(workers), len(images)))
+    if not images.parallel:
+        workers = 1
+
+    # each worker holds its own histograms, on top of the merged ones
+    if percentiles and workers > 1 and len(images):
+        nbytes = histogram_bytes(images.shape, bins)
+        fit = max(1, MAX_HISTOGRAM_BYTES // max(nbytes, 1) - 1)
+        if fit < workers:
+            print("  -- warning: percentile histograms take {:.0f} MB per "
+                  "worker, using {} worker(s) instead of {}".format(
+                      nbytes / 2**20, fit, workers))
+            workers = fit
+    if workers == 1:
+        stats = reduce_images(images, pbar=pbar, **kwargs)
+    else:
+        # a few chunks per worker keeps the pool balanced
+        nchunks = min(len(images), workers * 4)
+        chunks = [images[chunk[0]:chunk[-1] + 1] for chunk in
+                  np.array_split(np.arange(len(images)), nchunks)]
+
+        stats = ImageStatistics(**kwargs)
+        with Pool(workers) as pool:
+            for n, partial in pool.imap(_reduce_chunk,
+                                        [(chunk, kwargs) for chunk in chunks]):
+                stats.merge(partial)
+                pbar.update(n)
+    pbar.close()
+
+    return stats
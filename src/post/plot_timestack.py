@@ -8,14 +8,14 @@ Plot a timestack created fro timestack.py
 # VERSION  : 1.0
 """
 
-import pickle
-
 import argparse
 
 import numpy as np
 
 import matplotlib.pyplot as plt
 
+from timestack_io import read_timestack
+
 
 def construct_rgba_vector(img, n_alpha=0):
     """
@@ -57,7 +57,8 @@ if __name__ == '__main__':
                         action="store",
                         dest="input",
                         required=True,
-                        help="Input timestack in pickle format.",)
+                        help="Input timestack in NetCDF (.nc) or pickle "
+                             "format.",)
 
     parser.add_argument("--output", "-o",
                         action="store",
@@ -65,11 +66,27 @@ if __name__ == '__main__':
                         required=True,
                         help="Output figure name.",)
 
+    parser.add_argument("--tmin",
+                        action="store",
+                        dest="tmin",
+                        default=None,
+                        required=False,
+                        help="Start of the time window to plot in seconds. "
+                             "Only this window is read from NetCDF files.",)
+
+    parser.add_argument("--tmax",
+                        action="store",
+                        dest="tmax",
+                        default=None,
+                        required=False,
+                        help="End of the time window to plot in seconds.",)
+
     args = parser.parse_args()
 
     # read
-    with open(args.input, 'rb') as f:
-        inp = pickle.load(f)
+    tmin = None if args.tmin is None else float(args.tmin)
+    tmax = None if args.tmax is None else float(args.tmax)
+    inp = read_timestack(args.input, tmin=tmin, tmax=tmax)
 
     # extrat the needed variables
     rgb = inp["rgb"]
@@ -0,0 +1,268 @@
+"""
+Read and write raw Bayer bursts.
+
+# SCRIPT   : raw_burst.py
+# POURPOSE : Append raw camera frames and their metadata to a single file
+#            that can be memory-mapped and debayered later.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import json
+
+import numpy as np
+
+import cv2
+
+
+MAGIC = "picoastal-raw-burst"
+VERSION = 1
+HEADER_SIZE = 4096
+
+# per-frame metadata stored in front of each frame
+METADATA = [("frame_id", "<u8"),
+            ("timestamp", "<u8"),  # camera clock, nanoseconds
+            ("exposure", "<f8"),  # microseconds
+            ("gain", "<f8"),  # dB
+            ("host_monotonic", "<f8"),  # host monotonic clock, seconds
+            ("host_time", "<f8")]  # host wall clock, seconds since epoch
+
+# OpenCV debayering codes for the camera Bayer pixel formats, None for
+# formats that need no conversion. Note that OpenCV names the patterns
+# after the second row, so an RGGB sensor (BayerRG8) needs
+# COLOR_BayerBG2BGR. 16-bit formats debayer to 16-bit BGR.
+BAYER_CODES = {"BayerRG8": cv2.COLOR_BayerBG2BGR_EA,
+               "BayerBG8": cv2.COLOR_BayerRG2BGR_EA,
+               "BayerGR8": cv2.COLOR_BayerGB2BGR_EA,
+               "BayerGB8": cv2.COLOR_BayerGR2BGR_EA,
+               "BayerRG16": cv2.COLOR_BayerBG2BGR_EA,
+               "BayerBG16": cv2.COLOR_BayerRG2BGR_EA,
+               "BayerGR16": cv2.COLOR_BayerGB2BGR_EA,
+               "BayerGB16": cv2.COLOR_BayerGR2BGR_EA,
+               "Mono8": None,
+               "Mono16": None,
+               "BGR8": None}
+
+
+def record_dtype(width: int, height: int, dtype="u1", metadata=METADATA,
+                 channels: int = 1):
+    """
+    Return the numpy dtype of one burst record.
+
+    Parameters
+    ----------
+    width, height : int
+        Frame size.
+    dtype : str
+        Pixel dtype. Default is uint8.
+    metadata : list
+        List of (name, dtype) metadata fields.
+    channels : int
+        Number of channels. Default is 1 (Bayer or mono).
+
+    Returns
+    -------
+    dtype : np.dtype
+        Structured dtype with the metadata fields followed by "pixels".
+    """
+    shape = (height, width) if channels == 1 else (height, width, channels)
+    return np.dtype([tuple(field) for field in metadata] +
+                    [("pixels", np.dtype(dtype).str, shape)])
+
+
+class RawBurstWriter:
+    """
+    Append raw frames to a burst file.
+
+    The file starts with a JSON header padded to HEADER_SIZE bytes,
+    followed by one fixed-size record per frame with the metadata and the
+    raw pixels. Frames are written as they arrive, without conversion, so
+    the cost per frame is a single write of the sensor data. A burst cut
+    short (e.g. by a power failure) is still readable up to its last
+    complete record.
+
+    Parameters
+    ----------
+    fname : str
+        Output file name.
+    width, height : int
+        Frame size.
+    pixel_format : str
+        Camera pixel format, e.g. BayerRG8. See BAYER_CODES.
+    dtype : str
+        Pixel dtype. Default is uint8.
+    channels : int
+        Number of channels. Default is 1 (Bayer or mono).
+    attrs : dict
+        Extra attributes stored in the header (serial number, start date,
+        frame rate, ...). Must be JSON serializable. Optional.
+    """
+
+    def __init__(self, fname: str, width: int, height: int,
+                 pixel_format: str = "BayerRG8", dtype="u1",
+                 channels: int = 1, attrs: dict = None):
+
+        self.dtype = record_dtype(width, height, dtype, channels=channels)
+        self.nframes = 0
+
+        header = {"format": MAGIC,
+                  "version": VERSION,
+                  "header_size": HEADER_SIZE,
+                  "width": int(width),
+                  "height": int(height),
+                  "pixel_format": pixel_format,
+                  "pixel_dtype": np.dtype(dtype).str,
+                  "channels": int(channels),
+                  "metadata": METADATA,
+                  "attrs": attrs if attrs else {}}
+        header = json.dumps(header).encode("utf-8")
+        if len(header) >= HEADER_SIZE:
+            raise ValueError("Burst header is too large.")
+
+        self.f = open(fname, "wb")
+        self.f.write(header.ljust(HEADER_SIZE, b" "))
+
+        # only the metadata is packed here, the pixels are written from the
+        # frame buffer directly
+        self._metadata = np.zeros(1, dtype=np.dtype(METADATA))
+        self._pixels = self.dtype["pixels"]
+
+    def append(self, frame: np.ndarray, frame_id: int = 0,
+               timestamp: int = 0, exposure: float = np.nan,
+               gain: float = np.nan, host_monotonic: float = np.nan,
+               host_time: float = np.nan):
+        """
+        Append a frame.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            Raw frame with the burst size and dtype.
+        frame_id : int
+            Camera frame id.
+        timestamp : int
+            Camera timestamp in nanoseconds.
+        exposure : float
+            Exposure time in microseconds.
+        gain : float
+            Gain in dB.
+        host_monotonic : float
+            Host monotonic clock in seconds.
+        host_time : float
+            Host wall clock in seconds since the epoch.
+
+        Returns
+        -------
+        None
+        """
+        if frame.shape != self._pixels.shape or \
+                frame.dtype != self._pixels.base:
+            raise ValueError("Frame {} {} does not match the burst {} "
+                             "{}.".format(frame.shape, frame.dtype,
+                                          self._pixels.shape,
+                                          self._pixels.base))
+        self._metadata[0] = (frame_id, timestamp, exposure, gain,
+                             host_monotonic, host_time)
+        self.f.write(self._metadata.tobytes())
+        self.f.write(np.ascontiguousarray(frame).data)
+        self.nframes += 1
+
+    def close(self):
+        """Close the file."""
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RawBurst:
+    """
+    Read a burst written by RawBurstWriter.
+
+    Frames are memory-mapped, so opening a burst is cheap and only the
+    frames that are accessed are read from disk.
+
+    Parameters
+    ----------
+    fname : str
+        Burst file name.
+    """
+
+    def __init__(self, fname: str):
+
+        with open(fname, "rb") as f:
+            header = json.loads(f.read(HEADER_SIZE).decode("utf-8"))
+        if header.get("format") != MAGIC:
+            raise ValueError("{} is not a raw burst.".format(fname))
+
+        self.fname = fname
+        self.header = header
+        self.width = header["width"]
+        self.height = header["height"]
+        self.pixel_format = header["pixel_format"]
+        self.attrs = header["attrs"]
+        self.dtype = record_dtype(self.width, self.height,
+                                  header["pixel_dtype"], header["metadata"],
+                                  channels=header.get("channels", 1))
+
+        # ignore an incomplete last record
+        with open(fname, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell() - header["header_size"]
+        nframes = max(size, 0) // self.dtype.itemsize
+        if nframes > 0:
+            self.records = np.memmap(fname, dtype=self.dtype, mode="r",
+                                     offset=header["header_size"],
+                                     shape=(nframes, ))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        """Return the raw frame(s) i."""
+        return self.records["pixels"][i]
+
+    def metadata(self, field: str):
+        """
+        Return a metadata field for all frames.
+
+        Parameters
+        ----------
+        field : str
+            One of the METADATA fields.
+
+        Returns
+        -------
+        values : np.ndarray
+            Field values.
+        """
+        return np.asarray(self.records[field])
+
+    def debayer(self, i: int):
+        """
+        Debayer frame i.
+
+        Parameters
+        ----------
+        i : int
+            Frame index.
+
+        Returns
+        -------
+        img : np.ndarray
+            Frame in BGR (or grey for mono bursts), as read by OpenCV.
+        """
+        raw = self[i]
+        if self.pixel_format not in BAYER_CODES:
+            raise ValueError("Unsupported pixel format {}.".format(
+                self.pixel_format))
+        code = BAYER_CODES[self.pixel_format]
+        if code is None:
+            return np.array(raw)
+        return cv2.cvtColor(raw, code)
@@ -0,0 +1,328 @@
+"""
+Precomputed rectification plans.
+
+# SCRIPT   : rectification.py
+# POURPOSE : Fold undistortion and homography into a single pair of remap
+#            maps that can be built once and re-used for every frame.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import numpy as np
+
+import cv2
+
+from camera_calibration import CameraCalibration
+
+
+INTERPOLATION_METHODS = {"nearest": cv2.INTER_NEAREST,
+                         "linear": cv2.INTER_LINEAR,
+                         "cubic": cv2.INTER_CUBIC}
+
+
+def read_camera_matrix(fname: str):
+    """
+    Read the camera matrix and distortion coefficients.
+
+    Parameters
+    ----------
+    fname : str
+        Camera matrix file in JSON or pickle format.
+
+    Returns
+    -------
+    mtx, dist : np.ndarray
+        Camera matrix and distortion coefficients.
+    """
+    calibration = CameraCalibration.load(fname)
+    return calibration.mtx, calibration.dist
+
+
+def read_gcps(fname: str):
+    """
+    Read ground control points.
+
+    Parameters
+    ----------
+    fname : str
+        File with x,y,z,u,v data in csv format. The first line is a header.
+
+    Returns
+    -------
+    xyz, uv : np.ndarray
+        Nx3 real-world and Nx2 image coordinates of the gcps.
+    """
+    xyz = []
+    uv = []
+    with open(fname, "r") as f:
+        for i, line in enumerate(f.readlines()):
+            if i > 0:  # ignore header
+                xyz.append([line.split(",")[0],
+                            line.split(",")[1],
+                            line.split(",")[2]])
+                uv.append([line.split(",")[3],
+                           line.split(",")[4]])
+    xyz = np.array(xyz).astype(np.float32)
+    uv = np.array(uv).astype(np.float32)
+    return xyz, uv
+
+
+def find_homography(uv: np.ndarray, xyz: np.ndarray, mtx: np.ndarray,
+                    dist_coeffs: np.ndarray = np.zeros((1, 4)), z: float = 0,
+                    compute_error: bool = False):
+    """
+    Find homography based on ground control points.
+
+    Parameters
+    ----------
+    uv : np.ndarray
+        Nx2 array of image coordinates of gcps.
+    xyz : np.ndarray
+        Nx3 array of real-world coordinates of gcps.
+    mtx : np.ndarray
+        3x3 array containing the camera matrix
+    dist_coeffs : np.ndarray
+        1xN array with distortion coefficients with N = 4, 5 or 8
+    z : float
+        Real-world elevation to which the image should be projected.
+    compute_error : bool
+        Will compute re-projection erros in pixels if true.
+
+    Returns
+    -------
+    error: float
+        Rectification error in pixels or nan if compute_error=False.
+    H: np.ndarray
+        3x3 homography matrix.
+    """
+    uv = np.asarray(uv).astype(np.float32)
+    xyz = np.asarray(xyz).astype(np.float32)
+    mtx = np.asarray(mtx).astype(np.float32)
+
+    # compute camera pose
+    retval, rvec, tvec = cv2.solvePnP(xyz, uv, mtx, dist_coeffs)
+
+    # convert rotation vector to rotation matrix
+    R = cv2.Rodrigues(rvec)[0]
+
+    # assume height of projection plane
+    R[:, 2] = R[:, 2] * z
+
+    # add translation vector
+    R[:, 2] = R[:, 2] + tvec.flatten()
+
+    # compute homography
+    H = np.linalg.inv(np.dot(mtx, R))
+
+    # normalize homography
+    H = H / H[-1, -1]
+
+    # compute errors
+    if compute_error:
+        tot_error = 0
+        total_points = 0
+        for i in range(len(xyz)):
+            reprojected_points, _ = cv2.projectPoints(xyz[i],
+                                                      rvec, tvec,
+                                                      mtx,
+                                                      dist_coeffs)
+            tot_error += np.sum(np.abs(uv[i] - reprojected_points)**2)
+            total_points += i
+        mean_error_px = np.sqrt(tot_error / total_points)
+    else:
+        mean_error_px = None
+
+    return mean_error_px, H
+
+
+class RectificationPlan:
+    """
+    Lookup table that maps a raw (distorted) frame onto a metric grid.
+
+    The plan is built once from the camera calibration, the ground control
+    points, the bounding box and the grid resolution. Rectifying a frame is
+    then a single ``cv2.remap`` call.
+
+    Parameters
+    ----------
+    map_x, map_y : np.ndarray
+        Raw image coordinates sampled by each grid cell (float32).
+    xlin, ylin : np.ndarray
+        Grid coordinates in x and y.
+    dx, dy : float
+        Grid resolution in x and y.
+    image_size : tuple
+        Raw image size as (width, height).
+    method : str
+        Interpolation method. One of nearest, linear or cubic.
+    error : float
+        Re-projection error in pixels, if computed.
+    """
+
+    def __init__(self, map_x: np.ndarray, map_y: np.ndarray,
+                 xlin: np.ndarray, ylin: np.ndarray, dx: float, dy: float,
+                 image_size: tuple, method: str = "nearest",
+                 error: float = None):
+
+        if method not in INTERPOLATION_METHODS:
+            raise ValueError("Wrong interpolation method. Use nearest, "
+                             "linear or cubic.")
+
+        self.map_x = np.asarray(map_x, dtype=np.float32)
+        self.map_y = np.asarray(map_y, dtype=np.float32)
+        self.xlin = np.asarray(xlin)
+        self.ylin = np.asarray(ylin)
+        self.dx = float(dx)
+        self.dy = float(dy)
+        self.image_size = (int(image_size[0]), int(image_size[1]))
+        self.method = method
+        self.error = error
+
+        # fixed-point maps are noticeably faster in cv2.remap
+        self._map1, self._map2 = cv2.convertMaps(self.map_x, self.map_y,
+                                                 cv2.CV_16SC2)
+
+    @classmethod
+    def build(cls, calibration: CameraCalibration, xyz: np.ndarray,
+              uv: np.ndarray, bbox: np.ndarray, dx: float, dy: float,
+              image_size: tuple, projection_height: float = None,
+              method: str = "nearest", compute_error: bool = False):
+        """
+        Build a rectification plan.
+
+        Parameters
+        ----------
+        calibration : CameraCalibration
+            Camera calibration.
+        xyz, uv : np.ndarray
+            Real-world and image coordinates of the gcps.
+        bbox : np.ndarray
+            Bounding box as [xmin, ymin, width, height].
+        dx, dy : float
+            Grid resolution in x and y.
+        image_size : tuple
+            Raw image size as (width, height).
+        projection_height : float
+            Projection height in meters. Default is the mean gcp height.
+        method : str
+            Interpolation method. One of nearest, linear or cubic.
+        compute_error : bool
+            Will compute re-projection erros in pixels if true.
+
+        Returns
+        -------
+        plan : RectificationPlan
+            The rectification plan.
+        """
+        w, h = image_size
+
+        if projection_height is None:
+            projection_height = xyz[:, 2].mean()
+
+        # the homography maps undistorted pixels to the projection plane
+        error, H = find_homography(uv, xyz, calibration.mtx,
+                                   dist_coeffs=calibration.dist,
+                                   z=projection_height,
+                                   compute_error=compute_error)
+
+        # metric grid
+        xlin = np.arange(bbox[0], bbox[0] + bbox[2], dx)
+        ylin = np.arange(bbox[1], bbox[1] + bbox[3], dy)
+        grid_x, grid_y = np.meshgrid(xlin, ylin)
+
+        # project the grid back to undistorted image coordinates
+        XY1 = np.vstack([grid_x.ravel(), grid_y.ravel(),
+                         np.ones(grid_x.size)])
+        uvw = np.dot(np.linalg.inv(H), XY1)
+
+        # points behind the camera have the opposite sign of the image
+        # centre after the projective division
+        centre = np.dot(H, [w / 2, h / 2, 1])
+        valid = np.sign(uvw[2]) == np.sign(centre[2])
+        uvw[2, ~valid] = 1
+        u = uvw[0] / uvw[2]
+        v = uvw[1] / uvw[2]
+
+        raw = calibration.undistorted_to_raw(u, v, (w, h))
+
+        valid &= (u >= 0) & (u <= w - 1) & (v >= 0) & (v <= h - 1)
+        raw[~valid] = -1  # sampled as the constant border
+
+        map_x = raw[:, 0].reshape(grid_x.shape)
+        map_y = raw[:, 1].reshape(grid_x.shape)
+
+        return cls(map_x, map_y, xlin, ylin, dx, dy, (w, h),
+                   method=method, error=error)
+
+    @property
+    def grid(self):
+        """Return the grid coordinates as two 2D arrays."""
+        return np.meshgrid(self.xlin, self.ylin)
+
+    def rectify(self, img: np.ndarray):
+        """
+        Rectify a raw frame.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            Raw (distorted) frame with the size used to build the plan.
+
+        Returns
+        -------
+        rect : np.ndarray
+            Rectified frame with shape (len(ylin), len(xlin), ...).
+        """
+        h, w = img.shape[:2]
+        if (w, h) != self.image_size:
+            raise ValueError("Image size {} does not match the rectification "
+                             "plan {}.".format((w, h), self.image_size))
+
+        return cv2.remap(img, self._map1, self._map2,
+                         INTERPOLATION_METHODS[self.method],
+                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+    def save(self, fname: str):
+        """
+        Save the plan to disk in npz format.
+
+        Parameters
+        ----------
+        fname : str
+            Output file name.
+
+        Returns
+        -------
+        None
+            Will write to file instead.
+        """
+        error = np.nan if self.error is None else self.error
+        np.savez(fname, map_x=self.map_x, map_y=self.map_y,
+                 xlin=self.xlin, ylin=self.ylin,
+                 dx=self.dx, dy=self.dy,
+                 image_size=np.array(self.image_size),
+                 method=self.method, error=error)
+
+    @classmethod
+    def load(cls, fname: str):
+        """
+        Load a plan saved with RectificationPlan.save().
+
+        Parameters
+        ----------
+        fname : str
+            Input file name.
+
+        Returns
+        -------
+        plan : RectificationPlan
+            The rectification plan.
+        """
+        with np.load(fname) as data:
+            error = float(data["error"])
+            return cls(data["map_x"], data["map_y"],
+                       data["xlin"], data["ylin"],
+                       float(data["dx"]), float(data["dy"]),
+                       tuple(data["image_size"]), method=str(data["method"]),
+                       error=None if np.isnan(error) else error)
@@ -1,8 +1,8 @@
 """
-Rectify a given image.
+Rectify a given image or a folder of images.
 
 # SCRIPT   : rectify.py
-# POURPOSE : Rectify a given image.
+# POURPOSE : Rectify a given image or a folder of images.
 # AUTHOR   : Caio Eadi Stringari
 # DATE     : 29/06/2021
 # VERSION  : 1.0
@@ -10,25 +10,28 @@ Rectify a given image.
 
 import os
 import sys
+import time
 
 # arguments
-import json
 import argparse
 
-import numpy as np
+from multiprocessing import Pool
 
-import pickle
+import numpy as np
 
 import cv2
 
-from scipy.interpolate import griddata
-
-import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 
 from osgeo import gdal
 from osgeo import osr
 
+from tqdm import tqdm
+
+from rectification import RectificationPlan, read_gcps
+from camera_calibration import CameraCalibration
+from frame_source import FrameSource, open_frames
+
 try:
     import gooey
     from gooey import GooeyParser
@@ -75,101 +78,6 @@ else:
 # <<< END GUI >>>
 
 
-def find_homography(uv: np.ndarray, xyz: np.ndarray, mtx: np.ndarray,
-                    dist_coeffs: np.ndarray = np.zeros((1, 4)), z: float = 0,
-                    compute_error: bool = False):
-    """
-    Find homography based on ground control points.
-
-    Parameters
-    ----------
-    uv : np.ndarray
-        Nx2 array of image coordinates of gcps.
-    xyz : np.ndarray
-        Nx3 array of real-world coordinates of gcps.
-    mtx : np.ndarray
-        3x3 array containing the camera matrix
-    dist_coeffs : np.ndarray
-        1xN array with distortion coefficients with N = 4, 5 or 8
-    z : float
-        Real-world elevation to which the image should be projected.
-    compute_error : bool
-        Will compute re-projection erros in pixels if true.
-
-    Returns
-    -------
-    error: float
-        Rectification error in pixels or nan if compute_error=False.
-    H: np.ndarray
-        3x3 homography matrix.
-    """
-    uv = np.asarray(uv).astype(np.float32)
-    xyz = np.asarray(xyz).astype(np.float32)
-    mtx = np.asarray(mtx).astype(np.float32)
-
-    # compute camera pose
-    retval, rvec, tvec = cv2.solvePnP(xyz, uv, mtx, dist_coeffs)
-
-    # convert rotation vector to rotation matrix
-    R = cv2.Rodrigues(rvec)[0]
-
-    # assume height of projection plane
-    R[:, 2] = R[:, 2] * z
-
-    # add translation vector
-    R[:, 2] = R[:, 2] + tvec.flatten()
-
-    # compute homography
-    H = np.linalg.inv(np.dot(mtx, R))
-
-    # normalize homography
-    H = H / H[-1, -1]
-
-    # compute errors
-    if compute_error:
-        tot_error = 0
-        total_points = 0
-        for i in range(len(xyz)):
-            reprojected_points, _ = cv2.projectPoints(xyz[i],
-                                                      rvec, tvec,
-                                                      mtx,
-                                                      dist_coeffs)
-            tot_error += np.sum(np.abs(uv[i] - reprojected_points)**2)
-            total_points += i
-        mean_error_px = np.sqrt(tot_error / total_points)
-    else:
-        mean_error_px = None
-
-    return mean_error_px, H
-
-
-def rectify_image(img: np.ndarray, mtx: np.ndarray):
-    """
-    Rectify mage coordinates.
-
-    Parameters
-    ----------
-    img : np.ndarray
-        Input image aray.
-    mtx : np.ndarray
-        3x3 array containing the camera matrix
-
-    Returns
-    -------
-    x, y: np.ndarray
-        rectified coordinates
-    """
-
-    # get_pixel_coordinates(img)
-    u, v = np.meshgrid(range(img.shape[1]), range(img.shape[0]))
-    uv = np.vstack((u.flatten(), v.flatten())).T
-
-    # transform image using homography
-    xy = cv2.perspectiveTransform(np.asarray([uv]).astype(np.float32), mtx)[0]
-
-    return xy[:, 0].reshape(u.shape[:2]), xy[:, 1].reshape(v.shape[:2])
-
-
 def save_as_geotiff(grid_x: np.ndarray, grid_y: np.ndarray, dx: float,
                     dy: float, rgb: np.ndarray, epsg: int, outfile: str):
     """
@@ -220,6 +128,127 @@ def save_as_geotiff(grid_x: np.ndarray, grid_y: np.ndarray, dx: float,
     dst_ds = None
 
 
+# the worker processes hold their own copy of the geometry
+_worker_state = {}
+
+
+def init_worker(plan: RectificationPlan, epsg: int):
+    """
+    Share the rectification geometry with a worker process.
+
+    Parameters
+    ----------
+    plan : RectificationPlan
+        The rectification plan.
+    epsg : int
+        EPSG code for georefencing.
+
+    Returns
+    -------
+    None
+    """
+    _worker_state["plan"] = plan
+    _worker_state["grid"] = plan.grid
+    _worker_state["epsg"] = epsg
+    cv2.setNumThreads(1)  # parallelism comes from the pool
+
+
+def rectify_frames(task: tuple):
+    """
+    Rectify consecutive frames and save them as geotiffs.
+
+    Parameters
+    ----------
+    task : tuple
+        Frames (a FrameSource view) and output file names.
+
+    Returns
+    -------
+    results : list
+        Input frame name and processing time in seconds of each frame.
+    """
+    frames, outfiles = task
+
+    plan = _worker_state["plan"]
+    grid_x, grid_y = _worker_state["grid"]
+
+    results = []
+    start = time.perf_counter()
+    for inp, img, outfile in zip(frames.names, frames, outfiles):
+        rgb = cv2.cvtColor(plan.rectify(img), cv2.COLOR_BGR2RGB)
+        save_as_geotiff(grid_x, grid_y, plan.dx, plan.dy, rgb,
+                        _worker_state["epsg"], outfile)
+        now = time.perf_counter()
+        results.append((inp, now - start))
+        start = now
+
+    return results
+
+
+def rectify_batch(images: FrameSource, plan: RectificationPlan, output: str,
+                  epsg: int, workers: int = 1):
+    """
+    Rectify several images using a pool of worker processes.
+
+    Each worker gets a run of consecutive frames, so videos are decoded
+    from a keyframe once per run.
+
+    Parameters
+    ----------
+    images : FrameSource
+        Input frames, see frame_source.py. Output names follow the frame
+        names.
+    plan : RectificationPlan
+        The rectification plan, shared by all frames.
+    output : str
+        Output folder.
+    epsg : int
+        EPSG code for georefencing.
+    workers : int
+        Number of worker processes.
+
+    Returns
+    -------
+    None
+        Will write to files instead.
+    """
+    os.makedirs(output, exist_ok=True)
+    outfiles = [os.path.join(
+        output, os.path.splitext(os.path.basename(name))[0] + ".tiff")
+        for name in images.names]
+
+    workers = max(1, min(workers, len(images)))
+    if not images.parallel:
+        workers = 1
+    print(f"\n  -- Rectifying {len(images)} images with {workers} "
+          "workers...")
+
+    # a few runs per worker keeps the pool balanced
+    nchunks = min(len(images), workers * 4)
+    tasks = [(images[chunk[0]:chunk[-1] + 1],
+              outfiles[chunk[0]:chunk[-1] + 1])
+             for chunk in np.array_split(np.arange(len(images)), nchunks)]
+
+    elapsed = []
+    start = time.perf_counter()
+    pbar = tqdm(total=len(images))
+    with Pool(workers, initializer=init_worker,
+              initargs=(plan, epsg)) as pool:
+        for results in pool.imap(rectify_frames, tasks):
+            for inp, dt in results:
+                elapsed.append(dt)
+                pbar.set_postfix(frame=os.path.basename(inp),
+                                 seconds=round(dt, 3))
+                pbar.update()
+    pbar.close()
+    wall = time.perf_counter() - start
+
+    elapsed = np.array(elapsed)
+    print(f"  -- Per-frame time: mean {elapsed.mean():.3f}s, "
+          f"median {np.median(elapsed):.3f}s, max {elapsed.max():.3f}s")
+    print(f"  -- Wall time: {wall:.1f}s ({len(images) / wall:.1f} frames/s)")
+
+
 def plot(grid_x: np.ndarray, grid_y: np.ndarray, rgb: np.ndarray,
          gcps: np.ndarray = None):
     """
@@ -286,7 +315,8 @@ def main():
                             dest="input",
                             default="../../doc/average.png",
                             required=False,
-                            help="Input Image.",)
+                            help="Input image, folder with images, glob "
+                                 "pattern, video or raw burst.",)
 
         parser.add_argument("--camera_matrix", "-mtx",
                             action="store",
@@ -306,15 +336,19 @@ def main():
                             action="store",
                             dest="output",
                             required=False,
-                            default="rectified.tiff",
-                            help="Rectified image in geotiff format.")
+                            default=None,
+                            help="Rectified image in geotiff format, or "
+                                 "output folder if the input has several "
+                                 "images. Default is rectified.tiff, or "
+                                 "rectified for several images.")
 
     else:  # add the same thing but a nicer widget
         parser.add_argument("--input", "-i",
                             action="store",
                             dest="input",
                             required=False,
-                            help="Input image.",
+                            help="Input image, folder with images, glob "
+                                 "pattern, video or raw burst.",
                             default="../../doc/average.png",
                             widget='FileChooser')
 
@@ -338,8 +372,11 @@ def main():
                             action="store",
                             dest="output",
                             required=False,
-                            default="rectified.tiff",
-                            help="Rectified image in geotiff format.",
+                            default=None,
+                            help="Rectified image in geotiff format, or "
+                                 "output folder if the input has several "
+                                 "images. Default is rectified.tiff, or "
+                                 "rectified for several images.",
                             widget='FileChooser')
 
     parser.add_argument("--projection_height",
@@ -374,7 +411,8 @@ def main():
                         action="store",
                         dest="interp_method",
                         default="nearest",
-                        help="Interpolation method. Default is nearest.")
+                        help="Interpolation method. One of nearest, linear "
+                             "or cubic. Default is nearest.")
 
     parser.add_argument("--dx", "-dx",
                         action="store",
@@ -388,6 +426,33 @@ def main():
                         default=1,
                         help="Grid resolution (y) in meters. Default is 1m.")
 
+    parser.add_argument("--plan",
+                        action="store",
+                        dest="plan",
+                        required=False,
+                        default="",
+                        help="Rectification plan in npz format. It is built "
+                             "and saved here if the file does not exist, "
+                             "otherwise it is loaded and the geometry "
+                             "arguments are ignored.")
+
+    parser.add_argument("--image_format",
+                        action="store",
+                        dest="image_format",
+                        required=False,
+                        default="jpg",
+                        help="Input images format if the input is a folder. "
+                             "Default is jpg.")
+
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of worker processes used to rectify "
+                             "several images. Default is the number of "
+                             "cores.")
+
     parser.add_argument("--show_results", "-show",
                         action="store_true",
                         dest="show",
@@ -395,107 +460,72 @@ def main():
 
     args = parser.parse_args()
 
-    # read camera matrix and distortion coefficients
-    if args.camera_matrix.lower().endswith("json"):
-        with open(args.camera_matrix, 'r') as f:
-            cam = json.load(f)
-            mtx = np.asarray(cam["camera_matrix"])
-            dist = np.asarray(cam["distortion_coefficients"])
-    else:
-        with open(args.camera_matrix, 'rb') as f:
-            cam = pickle.load(f)
-            mtx = cam["camera_matrix"]
-            dist = cam["distortion_coefficients"]
-
-    # read image
-    img = cv2.cvtColor(cv2.imread(args.input), cv2.COLOR_BGR2RGB)
+    # search for images
+    images = open_frames(args.input, args.image_format)
+    if not len(images):
+        raise IOError("No images found in \"{}\"".format(args.input))
+    batch = len(images) > 1 or os.path.isdir(args.input)
 
-    # undistort
-    h,  w = img.shape[:2]
-    newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-        mtx, dist, (w, h), 1, (w, h))
+    # a folder for several images
+    output = args.output
+    if not output:
+        output = "rectified" if batch else "rectified.tiff"
 
-    # undistort image
-    dst = cv2.undistort(img, mtx, dist, None, newcameramtx)
+    # image size
+    h, w = images.shape[:2]
 
     # read coordinates
-    xyz = []
-    uv = []
-    f = open(args.gcps, "r")
-    for i, line in enumerate(f.readlines()):
-        if i > 0:  # ignore header
-            xyz.append([line.split(",")[0],
-                        line.split(",")[1],
-                        line.split(",")[2]])
-            uv.append([line.split(",")[3],
-                       line.split(",")[4]])
-    f.close()
-    xyz = np.array(xyz).astype(np.float32)
-    uv = np.array(uv).astype(np.float32)
-
-    # rectify
-    if int(args.projection_height) == int(-999):
-        pheight = xyz[:, 2].mean()
+    xyz, uv = read_gcps(args.gcps)
+
+    # load the rectification plan if it exists, otherwise build it
+    if args.plan and os.path.isfile(args.plan):
+        print(f"  -- Loading rectification plan from {args.plan}")
+        plan = RectificationPlan.load(args.plan)
+    else:
+        # read camera matrix and distortion coefficients
+        calibration = CameraCalibration.load(args.camera_matrix)
+
+        # rectify
+        if int(args.projection_height) == int(-999):
+            pheight = xyz[:, 2].mean()
+        else:
+            pheight = float(args.projection_height)
+
+        # bounding box
+        bbox = args.bbox.split(",")
+        bbox = np.array([float(bbox[0]), float(bbox[1]),
+                         float(bbox[2]), float(bbox[3])])
+
+        plan = RectificationPlan.build(
+            calibration, xyz, uv, bbox, float(args.dx), float(args.dy),
+            (w, h),
+            projection_height=pheight, method=args.interp_method,
+            compute_error=args.reprojection_error)
+        if plan.error:
+            print(f"  -- Re-projection error is {round(plan.error, 1)} "
+                  "pixels")
+
+        if args.plan:
+            plan.save(args.plan)
+            print(f"  -- Rectification plan saved to {args.plan}")
+
+    if batch:
+        rectify_batch(images, plan, output, int(args.epsg),
+                      workers=int(args.workers))
     else:
-        pheight = float(args.projection_height)
-
-    error, H = find_homography(uv, xyz, mtx, dist_coeffs=dist, z=pheight,
-                               compute_error=args.reprojection_error)
-    ximg, yimg = rectify_image(img, H)
-    if error:
-        print(f"  -- Re-projection error is {round(error, 1)} pixels")
-
-    # image coordinate points
-    XY = np.vstack([ximg.flatten(), yimg.flatten()]).T
-
-    # bounding box
-    bbox = args.bbox.split(",")
-    bbox = np.array([float(bbox[0]), float(bbox[1]),
-                     float(bbox[2]), float(bbox[3])])
-
-    # mask points outside the bounding box
-    rect = patches.Rectangle((bbox[0], bbox[1]), bbox[2], bbox[3],
-                             linewidth=2, edgecolor='r', facecolor='none')
-
-    insiders = rect.contains_points(XY)
-    insiders_idx = np.arange(0, len(XY), 1)[insiders]
-    outsiders_idx = np.arange(0, len(XY), 1)[~insiders]
-    iimg, jimg = np.unravel_index(outsiders_idx, ximg.shape)
-
-    # copy and mask
-    ximg_m = ximg.copy()
-    yimg_m = yimg.copy()
-    img_m = img.copy()
-    dst_m = dst.copy()
-
-    ximg_m[iimg, jimg] = np.ma.masked
-    yimg_m[iimg, jimg] = np.ma.masked
-    img_m[iimg, jimg, :] = np.ma.masked
-    dst_m[iimg, jimg, :] = np.ma.masked
-
-    print("\n  -- Interpolating, please wait...")
-    # interpolate
-    points = XY[insiders_idx, :]
-
-    dx = float(args.dx)
-    dy = float(args.dy)
-    grid_x, grid_y = np.meshgrid(np.arange(bbox[0], bbox[0] + bbox[2], dx),
-                                 np.arange(bbox[1], bbox[1] + bbox[3], dy))
-
-    values = np.vstack([dst_m[:, :, 0].flatten()[insiders_idx],
-                        dst_m[:, :, 1].flatten()[insiders_idx],
-                        dst_m[:, :, 2].flatten()[insiders_idx]]).T
-    rgb = griddata(points,
-                   values,
-                   (grid_x, grid_y),
-                   method=args.interp_method).clip(0, 255)
-
-    # output
-    save_as_geotiff(grid_x, grid_y, dx, dy, rgb, args.epsg, args.output)
-
-    # plot
-    if args.show:
-        plot(grid_x, grid_y, rgb, gcps=xyz)
+        print("\n  -- Rectifying, please wait...")
+        rgb = cv2.cvtColor(plan.rectify(images[0]), cv2.COLOR_BGR2RGB)
+
+        dx = plan.dx
+        dy = plan.dy
+        grid_x, grid_y = plan.grid
+
+        # output
+        save_as_geotiff(grid_x, grid_y, dx, dy, rgb, args.epsg, output)
+
+        # plot
+        if args.show:
+            plot(grid_x, grid_y, rgb, gcps=xyz)
 
     print("\nMy work is done!\n")
 
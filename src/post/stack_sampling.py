@@ -0,0 +1,246 @@
+"""
+Sample timestack pixels directly from raw frames.
+
+# SCRIPT   : stack_sampling.py
+# POURPOSE : Map the timestack samples through the distortion model once so
+#            that each frame only needs a gather from the raw image.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import numpy as np
+
+import cv2
+
+from camera_calibration import CameraCalibration
+
+
+STATISTICS = {"mean": np.mean,
+              "median": np.median,
+              "max": np.max,
+              "min": np.min,
+              "deviation": np.std,
+              "variance": np.var}
+
+
+class StackSampler:
+    """
+    Gather timestack samples from raw (distorted) frames.
+
+    Each sample is bilinearly interpolated from the raw frame at the
+    location that cv2.undistort would have used, so the result matches
+    sampling the undistorted frame without undistorting it.
+
+    Parameters
+    ----------
+    map_x, map_y : np.ndarray
+        NxK raw image coordinates of the N points and their K neighbours.
+    statistic : str
+        Statistic used to reduce the K neighbours. Default is mean.
+    """
+
+    def __init__(self, map_x: np.ndarray, map_y: np.ndarray,
+                 statistic: str = "mean"):
+
+        # always NxK, contiguous as required by cv2.remap
+        self.map_x = np.ascontiguousarray(
+            np.atleast_2d(np.asarray(map_x, dtype=np.float32).T).T)
+        self.map_y = np.ascontiguousarray(
+            np.atleast_2d(np.asarray(map_y, dtype=np.float32).T).T)
+
+        if statistic not in STATISTICS:
+            print("  -- warning: unknown statistic for n. of neighbours > 1, "
+                  "falling back to np.mean.")
+            statistic = "mean"
+        self.statistic = statistic
+        self.operator = STATISTICS[statistic]
+
+    @classmethod
+    def from_undistorted_pixels(cls, i: np.ndarray, j: np.ndarray,
+                                calibration: CameraCalibration,
+                                image_size: tuple, statistic: str = "mean"):
+        """
+        Build a sampler from row and column indexes in the undistorted image.
+
+        Parameters
+        ----------
+        i, j : np.ndarray
+            N or NxK row and column indexes in the undistorted image.
+        calibration : CameraCalibration
+            Camera calibration.
+        image_size : tuple
+            Image size as (width, height).
+        statistic : str
+            Statistic used to reduce the K neighbours.
+
+        Returns
+        -------
+        sampler : StackSampler
+            The sampler.
+        """
+        i = np.asarray(i)
+        j = np.asarray(j)
+
+        raw = calibration.undistorted_to_raw(j, i, image_size)
+
+        return cls(raw[:, 0].reshape(i.shape), raw[:, 1].reshape(i.shape),
+                   statistic=statistic)
+
+    @classmethod
+    def from_world_points(cls, xyz: np.ndarray, rvec: np.ndarray,
+                          tvec: np.ndarray, calibration: CameraCalibration,
+                          image_size: tuple, neighbours: int = 1,
+                          statistic: str = "mean", chunk_size: int = 256):
+        """
+        Build a sampler by projecting real-world points into the raw image.
+
+        With one neighbour, each point is bilinearly interpolated at its
+        projection. With K neighbours, each point is sampled at the K raw
+        pixels whose centres are the closest to it on the projection plane,
+        nearest first. They are found from the local Jacobian of the
+        projection, among the pixels around the projected point only, so
+        no pixel of the image needs to be projected.
+
+        Parameters
+        ----------
+        xyz : np.ndarray
+            Nx3 real-world coordinates of the points.
+        rvec, tvec : np.ndarray
+            Camera pose, see CameraCalibration.solve_pose().
+        calibration : CameraCalibration
+            Camera calibration.
+        image_size : tuple
+            Image size as (width, height).
+        neighbours : int
+            Number of pixels per point.
+        statistic : str
+            Statistic used to reduce the K neighbours.
+        chunk_size : int
+            Number of points searched at a time.
+
+        Returns
+        -------
+        sampler : StackSampler
+            The sampler.
+        """
+        xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+        w, h = image_size
+        neighbours = int(neighbours)
+
+        def project(points):
+            raw, _ = cv2.projectPoints(points.reshape(-1, 1, 3), rvec, tvec,
+                                       calibration.mtx, calibration.dist)
+            return raw.reshape(-1, 2)
+
+        raw = project(xyz)
+        if neighbours <= 1:
+            return cls(raw[:, 0], raw[:, 1], statistic=statistic)
+
+        # pixels per real-world unit along x and y (central differences)
+        step = 1e-3
+        jac = np.empty((len(xyz), 2, 2))
+        for axis in range(2):
+            offset = np.zeros(3)
+            offset[axis] = step
+            jac[:, :, axis] = (project(xyz + offset) -
+                               project(xyz - offset)) / (2 * step)
+
+        # real-world distance of a pixel offset d is |inv(jac) d|, and the
+        # K nearest pixels fit in an ellipse of about (sqrt(K) + 2)^2 pixels
+        inv = np.linalg.inv(jac)
+        metric = np.einsum("nki,nkj->nij", inv, inv)
+        radius2 = (np.sqrt(neighbours) + 2) ** 2 * \
+            np.sqrt(np.linalg.det(metric)) / np.pi
+        spread = np.einsum("nik,njk->nij", jac, jac)
+        extent = np.sqrt(radius2[:, None] *
+                         np.diagonal(spread, axis1=1, axis2=2))
+        window = int(np.ceil(np.nanmax(extent))) + 1
+
+        du, dv = np.meshgrid(np.arange(-window, window + 1),
+                             np.arange(-window, window + 1))
+        offsets = np.vstack([du.ravel(), dv.ravel()]).T
+
+        map_x = np.empty((len(xyz), neighbours), dtype=np.float32)
+        map_y = np.empty((len(xyz), neighbours), dtype=np.float32)
+        for start in range(0, len(xyz), chunk_size):
+            chunk = slice(start, start + chunk_size)
+
+            # candidate pixel centres around each projected point
+            centre = np.round(raw[chunk])
+            cand = centre[:, None, :] + offsets[None, :, :]
+            d = np.einsum("nij,nkj->nki", inv[chunk],
+                          cand - raw[chunk][:, None, :])
+            distance = (d ** 2).sum(axis=2)
+
+            # only pixels of the image can be sampled
+            outside = (cand[..., 0] < 0) | (cand[..., 0] > w - 1) | \
+                (cand[..., 1] < 0) | (cand[..., 1] > h - 1)
+            distance[outside] = np.inf
+
+            nearest = np.argpartition(distance, neighbours - 1,
+                                      axis=1)[:, :neighbours]
+            order = np.argsort(np.take_along_axis(distance, nearest, axis=1),
+                               axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+
+            pixels = np.take_along_axis(cand, nearest[..., None], axis=1)
+            map_x[chunk] = pixels[..., 0]
+            map_y[chunk] = pixels[..., 1]
+
+        return cls(map_x, map_y, statistic=statistic)
+
+    @property
+    def npoints(self):
+        """Return the number of points sampled."""
+        return self.map_x.shape[0]
+
+    @property
+    def neighbours(self):
+        """Return the number of neighbours per point."""
+        return self.map_x.shape[1]
+
+    def gather(self, img: np.ndarray):
+        """
+        Gather the raw samples of a frame.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            Raw frame as read by OpenCV (BGR).
+
+        Returns
+        -------
+        samples : np.ndarray
+            NxKx3 RGB samples, with the frame dtype.
+        """
+        samples = cv2.remap(img, self.map_x, self.map_y, cv2.INTER_LINEAR,
+                            borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return samples.reshape(self.map_x.shape + (-1, ))[..., ::-1]
+
+    def sample(self, img: np.ndarray, out: np.ndarray = None):
+        """
+        Sample a frame, reducing the neighbours of each point.
+
+        Parameters
+        ----------
+        img : np.ndarray
+            Raw uint8 frame as read by OpenCV (BGR).
+        out : np.ndarray
+            Nx3 array to write the result to. Optional.
+
+        Returns
+        -------
+        rgb : np.ndarray
+            Nx3 RGB values scaled to [0, 1].
+        """
+        samples = self.gather(img)
+        if self.neighbours == 1:
+            rgb = samples[:, 0, :] / 255.
+        else:
+            rgb = self.operator(samples / 255., axis=1)
+
+        if out is None:
+            return rgb
+        out[...] = rgb
+        return out
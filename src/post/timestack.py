@@ -9,7 +9,6 @@ Create a timestack from a series of images.
 """
 
 import os
-from posixpath import basename
 import sys
 
 # arguments
@@ -18,23 +17,22 @@ import argparse
 
 import datetime
 
-from glob import glob
-from natsort import natsorted
-
 import numpy as np
 
 import pickle
 
 import cv2
 
-from scipy.interpolate import griddata
-
 from scipy.spatial import KDTree
 
 from tqdm import tqdm
 
-from matplotlib import path
-import matplotlib.patches as patches
+from frame_source import open_frames
+from frame_cache import FrameCache
+from camera_calibration import CameraCalibration
+from stack_sampling import StackSampler
+from timestack_io import TimestackWriter, read_timestack
+
 import matplotlib.pyplot as plt
 
 
@@ -178,6 +176,63 @@ def rectify_image(img: np.ndarray, mtx: np.ndarray):
     return xy[:, 0].reshape(u.shape[:2]), xy[:, 1].reshape(v.shape[:2])
 
 
+def read_stacklines(fname: str):
+    """
+    Read timestack lines from a GeoJSON file.
+
+    Parameters
+    ----------
+    fname : str
+        GeoJSON file with one LineString feature per timestack. The feature
+        property "name", if present, is used to name the outputs.
+
+    Returns
+    -------
+    stacklines : list
+        List of (name, Nx2 coordinates) tuples.
+    """
+    with open(fname) as f:
+        data = json.load(f)
+
+    stacklines = []
+    for k, feature in enumerate(data["features"]):
+        coords = np.array(feature["geometry"]["coordinates"], dtype=float)
+        properties = feature.get("properties") or {}
+        name = str(properties.get("name", k))
+        stacklines.append((name, coords[:, :2]))
+    return stacklines
+
+
+def build_stackline(coords: np.ndarray, npoints: int):
+    """
+    Sample a (poly)line at equally spaced points.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        Nx2 array with the line vertices.
+    npoints : int
+        Number of points in the timestack.
+
+    Returns
+    -------
+    points : np.ndarray
+        npointsx2 array with the timestack points.
+    length : float
+        Length of the line.
+    """
+    # distance along the line at each vertex
+    distance = np.concatenate(
+        [[0], np.cumsum(np.sqrt((np.diff(coords, axis=0)**2).sum(axis=1)))])
+    length = distance[-1]
+
+    s = np.linspace(0, length, npoints)
+    stack_x = np.interp(s, distance, coords[:, 0])
+    stack_y = np.interp(s, distance, coords[:, 1])
+
+    return np.vstack([stack_x, stack_y]).T, length
+
+
 @gui_decorator
 def main():
 
@@ -196,7 +251,7 @@ def main():
                             dest="input",
                             default="../../data/boomerang",
                             required=False,
-                            help="Input folder with images.",)
+                            help="Input folder with images, or video file.",)
 
         parser.add_argument("--camera_matrix", "-mtx",
                             action="store",
@@ -217,7 +272,8 @@ def main():
                             dest="output",
                             required=False,
                             default="timestack.pkl",
-                            help="Timestack in pickle format.")
+                            help="Timestack in NetCDF (.nc) or pickle "
+                                 "format.")
 
     else:  # add the same thing but a nicer widget
         parser.add_argument("--input", "-i",
@@ -225,7 +281,7 @@ def main():
                             dest="input",
                             default="../../data/boomerang",
                             required=False,
-                            help="Input folder with images.",
+                            help="Input folder with images, or video file.",
                             widget='DirChooser')
 
         parser.add_argument("--camera_matrix", "-mtx",
@@ -249,16 +305,27 @@ def main():
                             dest="output",
                             required=False,
                             default="timestack.pkl",
-                            help="Timestack in pickle format.",
+                            help="Timestack in NetCDF (.nc) or pickle "
+                                 "format.",
                             widget='FileSaver')
 
-    parser.add_argument("--timestack_line",
+    parser.add_argument("--timestack_line", "--stackline",
                         action="store",
                         dest="stackline",
+                        nargs="+",
                         required=False,
-                        default="457315.2,6422161.5,457599.4,6422063.6",
+                        default=["457315.2,6422161.5,457599.4,6422063.6"],
                         help="Coordinates of the timestack line. Format is"
-                             "\'x1,y1,x2,y2\'.")
+                             "\'x1,y1,x2,y2\'. Several lines can be given "
+                             "and are extracted in a single pass.")
+
+    parser.add_argument("--timestack_lines_file",
+                        action="store",
+                        dest="stacklines_file",
+                        required=False,
+                        default="",
+                        help="GeoJSON file with one LineString per timestack. "
+                             "Overrides --timestack_line.")
 
     parser.add_argument("--start_time",
                         action="store",
@@ -275,6 +342,16 @@ def main():
                         default=2,
                         help="Aquistion frequency in Hz. Default is 2Hz.")
 
+    parser.add_argument("--frame_index",
+                        action="store",
+                        dest="frame_index",
+                        required=False,
+                        default="",
+                        help="Frame index written by the capture. Frame "
+                             "times are read from it instead of using "
+                             "--start_time and --frequency. Default is to "
+                             "look for one in the input folder.")
+
     parser.add_argument("--image_format",
                         action="store",
                         dest="image_format",
@@ -309,6 +386,18 @@ def main():
                         help="Number of nearest neighbours to consider. "
                              "Default is 1024.")
 
+    parser.add_argument("--sampling",
+                        action="store",
+                        dest="sampling",
+                        default="tree",
+                        help="How to find the timestack pixels. tree "
+                             "rectifies every pixel of the first image and "
+                             "searches for the nearest ones. projection "
+                             "projects the timestack points into the image "
+                             "instead, which is much faster and samples "
+                             "each point bilinearly if --neighbours is 1. "
+                             "Default is tree.")
+
     parser.add_argument("--statistic",
                         action="store",
                         dest="statistic",
@@ -316,6 +405,21 @@ def main():
                         help="Which statistic to use to compute if neighbours "
                              ">1. Default is np.mean.")
 
+    parser.add_argument("--cache_dir",
+                        action="store",
+                        dest="cache_dir",
+                        default="",
+                        help="Folder to keep the decoded frames in, so that "
+                             "runs over the same frames skip decoding. "
+                             "Default is no cache.")
+
+    parser.add_argument("--cache_size",
+                        action="store",
+                        dest="cache_size",
+                        default=10,
+                        help="Cache size in GB. Least recently used frames "
+                             "are evicted. Default is 10.")
+
     parser.add_argument("--show_results", "-show",
                         action="store_true",
                         dest="show",
@@ -329,37 +433,41 @@ def main():
     args = parser.parse_args()
 
     # read camera matrix and distortion coefficients
-    if args.camera_matrix.lower().endswith("json"):
-        with open(args.camera_matrix, 'r') as f:
-            cam = json.load(f)
-            mtx = np.asarray(cam["camera_matrix"])
-            dist = np.asarray(cam["distortion_coefficients"])
-    else:
-        with open(args.camera_matrix, 'rb') as f:
-            cam = pickle.load(f)
-            mtx = cam["camera_matrix"]
-            dist = cam["distortion_coefficients"]
+    calibration = CameraCalibration.load(args.camera_matrix)
+    mtx, dist = calibration.mtx, calibration.dist
 
     # parse time and FPS
     start_date = datetime.datetime.strptime(args.start_time, "%Y%m%d:%H%M%S")
     freq = float(args.aquisition_frequency)
 
     # search for images
-    images = natsorted(glob(args.input + "/*{}".format(args.image_format)))
+    images = open_frames(args.input, args.image_format,
+                         index_file=args.frame_index or None, prefetch=4)
+    cache = None
+    if args.cache_dir:
+        cache = FrameCache(args.cache_dir, float(args.cache_size) * 1e9)
+        images = images.cached(cache)
     start = datetime.datetime.now()
     print(f"  -- Found {len(images)} images, starting at {start}")
-    first_img = cv2.imread(images[0])
+    first_img = images[0]
 
-    # build the timestack line
+    # build the timestack lines
     npoints = int(args.npoints)
-    stackline = args.stackline.split(",")
-    stackline = np.array([float(stackline[0]), float(stackline[1]),
-                          float(stackline[2]), float(stackline[3])])
-    stack_x = np.linspace(stackline[0], stackline[2], npoints)
-    stack_y = np.linspace(stackline[1], stackline[3], npoints)
-    stack_points = np.vstack([stack_x, stack_y]).T
-    stack_length = np.sqrt(
-        (stack_x[-1] - stack_x[0])**2 - (stack_y[-1] - stack_y[0])**2)
+    if args.stacklines_file:
+        stacklines = read_stacklines(args.stacklines_file)
+    else:
+        stacklines = []
+        for k, stackline in enumerate(args.stackline):
+            coords = np.array(stackline.split(","), dtype=float)
+            stacklines.append((str(k), coords.reshape(-1, 2)))
+    print(f"  -- Extracting {len(stacklines)} timestack(s)")
+
+    stack_names = [name for name, _ in stacklines]
+    stack_points, stack_lengths = [], []
+    for _, coords in stacklines:
+        points, length = build_stackline(coords, npoints)
+        stack_points.append(points)
+        stack_lengths.append(length)
 
     # read gcp coordinates
     xyz = []
@@ -384,115 +492,136 @@ def main():
 
     error, H = find_homography(uv, xyz, mtx, dist_coeffs=dist, z=pheight,
                                compute_error=args.reprojection_error)
-    ximg, yimg = rectify_image(first_img, H)
     if error:
         print(f"  -- Re-projection error is {round(error, 1)} pixels")
 
-    # image coordinate points
-    XY = np.vstack([ximg.flatten(), yimg.flatten()]).T
+    neighbours = int(args.neighbours)
+    h, w = first_img.shape[:2]
+    if args.sampling == "projection":
+
+        # project the timestack points straight into the raw image
+        rvec, tvec = calibration.solve_pose(xyz, uv)
+        points = np.vstack(stack_points)
+        points = np.hstack([points, np.full((len(points), 1), pheight)])
+        sampler = StackSampler.from_world_points(
+            points, rvec, tvec, calibration, (w, h), neighbours=neighbours,
+            statistic=args.statistic)
 
-    # build the searching tree
-    Tree = KDTree(XY)
+    elif args.sampling == "tree":
+        ximg, yimg = rectify_image(first_img, H)
 
-    # search for nearest points to the timestack line
-    neighbours = int(args.neighbours)
+        # image coordinate points
+        XY = np.vstack([ximg.flatten(), yimg.flatten()]).T
+
+        # build the searching tree
+        Tree = KDTree(XY)
+
+        # search for nearest points to all timestack lines at once
+        _, stack_indexes = Tree.query(np.vstack(stack_points), neighbours)
+        istk, jstk = np.unravel_index(stack_indexes, ximg.shape)
+
+        # map the stack pixels through the distortion model only once
+        sampler = StackSampler.from_undistorted_pixels(
+            istk, jstk, calibration, (w, h), statistic=args.statistic)
 
-    _, stack_indexes = Tree.query(stack_points, neighbours)
-    istk, jstk = np.unravel_index(stack_indexes, ximg.shape)
-
-    if args.statistic == "mean":
-        operator = np.mean
-    elif args.statistic == "median":
-        operator = np.median
-    elif args.statistic == "max":
-        operator = np.max
-    elif args.statistic == "min":
-        operator = np.min
-    elif args.statistic == "deviation":
-        operator = np.std
-    elif args.statistic == "variance":
-        operator = np.var
     else:
-        print("  -- warning: unknown statistic for n. of neighbours > 1, "
-              "falling back to np.mean.")
-        operator = np.mean
+        raise ValueError("Wrong sampling method. Use tree or projection.")
+
+    # time coordinates, exact if the capture wrote a frame index
+    start_date, stack_seconds = images.times(start_date, freq)
 
     # < timeloop >
 
     pbar = tqdm(total=len(images))
+    stack_times = np.array([start_date + datetime.timedelta(seconds=s)
+                            for s in stack_seconds])
 
-    stack_sec = 0
-    stack_now = start_date
-
-    rgb_stack = []
-    stack_datetimes = []
-    stack_seconds = []
-
-    for i, image in enumerate(images):
-
-        # read the image
-        img = cv2.cvtColor(cv2.imread(image), cv2.COLOR_BGR2RGB)
-
-        # undistort
-        h,  w = img.shape[:2]
-        newcameramtx, roi = cv2.getOptimalNewCameraMatrix(
-            mtx, dist, (w, h), 1, (w, h))
-
-        # undistort image
-        dst = cv2.undistort(img, mtx, dist, None, newcameramtx)
-        dst = dst / 255.  # to float
-
-        # extract points
-        if neighbours == 1:
-            rgb_stack.append(dst[istk, jstk, :])
-        else:
-            rgb_stack.append(operator(dst[istk, jstk, :], axis=1))
-
-        # time increment
-        dt = datetime.timedelta(seconds=1 / freq)
-        stack_datetimes.append(stack_now)
-        stack_seconds.append(stack_sec)
-        stack_now += dt
-        stack_sec += 1 / freq
-
-        pbar.update()
-    pbar.close()
-
-    # to arrays
-    rgb_stack = np.array(rgb_stack)
-    rgb_stack = np.swapaxes(rgb_stack, 0, 1)
-    stack_times = np.array(stack_datetimes)
-    stack_seconds = np.array(stack_seconds)
-
-    # output goes here
-    out = {}
-    out["seconds"] = stack_seconds
-    out["time"] = stack_times
-    out["rgb"] = rgb_stack
-    out["coordinates"] = stack_points
-    out["length"] = stack_length
-    out["points"] = npoints
-    out["neighbours"] = neighbours
-    out["statistic"] = args.statistic
-    with open(args.output, 'wb') as f:
-        pickle.dump(out, f)
-
-    # if save as RGB, save
-    if args.save_as_image:
-        bname = os.path.basename(args.output).split(".")[0]
-        plt.imsave(bname + ".png", np.flipud(rgb_stack))
-
-    
-    # plot
+    # output names, one output per line
+    root, ext = os.path.splitext(args.output)
+    if len(stack_names) == 1:
+        outputs = [args.output]
+    else:
+        outputs = ["{}_{}{}".format(root, name, ext) for name in stack_names]
+
+    if ext.lower() == ".nc":
+        # stream the samples to disk, memory does not grow with time
+        writers = [TimestackWriter(output, stack_points[k], start_date,
+                                   stack_lengths[k], neighbours=neighbours,
+                                   statistic=args.statistic,
+                                   name=stack_names[k])
+                   for k, output in enumerate(outputs)]
+        frame = np.empty((npoints * len(stacklines), 3), dtype=np.float64)
+
+        for i, img in enumerate(images):
+
+            # extract points
+            sampler.sample(img, out=frame)
+            for k, writer in enumerate(writers):
+                writer.append(frame[k * npoints:(k + 1) * npoints],
+                              stack_seconds[i])
+
+            pbar.update()
+        pbar.close()
+
+        for writer in writers:
+            writer.close()
+    else:
+        # preallocate the stacks of all lines as (points, time, rgb)
+        rgb_stacks = np.empty((npoints * len(stacklines), len(images), 3),
+                              dtype=np.float64)
+
+        for i, img in enumerate(images):
+
+            # extract points
+            sampler.sample(img, out=rgb_stacks[:, i, :])
+
+            pbar.update()
+        pbar.close()
+
+        for k, output in enumerate(outputs):
+
+            # output goes here
+            out = {}
+            out["seconds"] = stack_seconds
+            out["time"] = stack_times
+            out["rgb"] = rgb_stacks[k * npoints:(k + 1) * npoints]
+            out["coordinates"] = stack_points[k]
+            out["length"] = stack_lengths[k]
+            out["points"] = npoints
+            out["neighbours"] = neighbours
+            out["statistic"] = args.statistic
+            out["name"] = stack_names[k]
+            with open(output, 'wb') as f:
+                pickle.dump(out, f)
+
+    if cache is not None:
+        print(f"  -- Frame cache: {cache.hits} frames read, "
+              f"{cache.misses} decoded")
+
+    for k, output in enumerate(outputs):
+        print(f"  -- Timestack \"{stack_names[k]}\" saved to {output}")
+
+        if not (args.save_as_image or args.show):
+            continue
+        rgb_stack = read_timestack(output)["rgb"]
+
+        # if save as RGB, save
+        if args.save_as_image:
+            bname = os.path.basename(output).split(".")[0]
+            plt.imsave(bname + ".png", np.flipud(rgb_stack))
+
+        # plot
+        if args.show:
+            fig, ax = plt.subplots(figsize=(12, 6))
+            ax.imshow(rgb_stack,
+                      extent=[0, stack_lengths[k], 0, stack_seconds.max()],
+                      origin="lower")
+            ax.set_title(stack_names[k])
+            ax.set_xlabel("Time [s]")
+            ax.set_ylabel("Distance [m]")
+            fig.tight_layout()
     if args.show:
-        fig, ax = plt.subplots(figsize=(12, 6))
-        ax.imshow(rgb_stack, extent=[0, stack_length, 0, stack_seconds.max()],
-                  origin="lower")
-        ax.set_xlabel("Time [s]")
-        ax.set_ylabel("Distance [m]")
-        fig.tight_layout()
         plt.show()
 
-
 if __name__ == '__main__':
     main()
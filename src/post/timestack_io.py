@@ -0,0 +1,205 @@
+"""
+Read and write timestacks.
+
+# SCRIPT   : timestack_io.py
+# POURPOSE : Write timestacks incrementally to chunked, compressed NetCDF4
+#            files and read timestacks back from NetCDF4 or pickle files.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import datetime
+
+import pickle
+
+import numpy as np
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import xarray as xr
+except ImportError:
+    xr = None
+
+
+class TimestackWriter:
+    """
+    Append timestack samples to a NetCDF4 file as they are extracted.
+
+    The RGB samples are stored as uint8 in a (time, point, band) variable
+    with an unlimited time dimension. Frames are buffered and written one
+    compressed chunk at a time, so memory use does not depend on the
+    duration of the timestack.
+
+    Parameters
+    ----------
+    fname : str
+        Output file name.
+    coordinates : np.ndarray
+        Nx2 array with the timestack point coordinates.
+    start_date : datetime.datetime
+        Time of the first frame.
+    length : float
+        Length of the timestack line.
+    neighbours : int
+        Number of nearest neighbours used.
+    statistic : str
+        Statistic used to reduce the neighbours.
+    name : str
+        Timestack name.
+    chunk : int
+        Number of frames per chunk. Default is 64.
+    complevel : int
+        Compression level (0-9). Default is 4.
+    """
+
+    def __init__(self, fname: str, coordinates: np.ndarray,
+                 start_date: datetime.datetime, length: float,
+                 neighbours: int = 1, statistic: str = "mean",
+                 name: str = "0", chunk: int = 64, complevel: int = 4):
+
+        if netCDF4 is None:
+            raise ImportError("NetCDF output requires netCDF4, install it "
+                              "with pip install netcdf4.")
+
+        npoints = len(coordinates)
+        self.chunk = int(chunk)
+        self.ntimes = 0
+        self._buffer = np.empty((self.chunk, npoints, 3), dtype=np.uint8)
+        self._seconds = np.empty(self.chunk, dtype=np.float64)
+        self._nbuffer = 0
+
+        self.ds = netCDF4.Dataset(fname, "w", format="NETCDF4")
+        self.ds.createDimension("time", None)
+        self.ds.createDimension("point", npoints)
+        self.ds.createDimension("band", 3)
+
+        time = self.ds.createVariable("time", "f8", ("time", ))
+        time.units = "seconds since {}".format(
+            start_date.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        time.calendar = "gregorian"
+
+        x = self.ds.createVariable("x", "f8", ("point", ))
+        y = self.ds.createVariable("y", "f8", ("point", ))
+        distance = self.ds.createVariable("distance", "f8", ("point", ))
+        x[:] = coordinates[:, 0]
+        y[:] = coordinates[:, 1]
+        distance[:] = np.linspace(0, length, npoints)
+
+        self.rgb = self.ds.createVariable(
+            "rgb", "u1", ("time", "point", "band"), zlib=True,
+            complevel=complevel, chunksizes=(self.chunk, npoints, 3))
+        self.rgb.scale_factor = 1 / 255.
+        self.rgb.set_auto_maskandscale(False)  # packed by the writer
+
+        self.ds.setncatts({"length": length,
+                           "points": npoints,
+                           "neighbours": neighbours,
+                           "statistic": statistic,
+                           "name": name})
+
+    def append(self, rgb: np.ndarray, seconds: float):
+        """
+        Append the samples of one frame.
+
+        Parameters
+        ----------
+        rgb : np.ndarray
+            Nx3 RGB values scaled to [0, 1].
+        seconds : float
+            Seconds since the start of the timestack.
+
+        Returns
+        -------
+        None
+        """
+        self._buffer[self._nbuffer] = np.rint(rgb * 255)
+        self._seconds[self._nbuffer] = seconds
+        self._nbuffer += 1
+        if self._nbuffer == self.chunk:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames to disk."""
+        if self._nbuffer == 0:
+            return
+        i0 = self.ntimes
+        i1 = self.ntimes + self._nbuffer
+        self.ds["time"][i0:i1] = self._seconds[:self._nbuffer]
+        self.rgb[i0:i1, :, :] = self._buffer[:self._nbuffer]
+        self.ntimes = i1
+        self._nbuffer = 0
+
+    def close(self):
+        """Flush the remaining frames and close the file."""
+        self.flush()
+        self.ds.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_timestack(fname: str, tmin: float = None, tmax: float = None):
+    """
+    Read a timestack created by timestack.py.
+
+    NetCDF files are opened lazily and only the requested time window is
+    read from disk.
+
+    Parameters
+    ----------
+    fname : str
+        Timestack in NetCDF (.nc) or pickle format.
+    tmin, tmax : float
+        Time window in seconds from the start of the timestack. Optional.
+
+    Returns
+    -------
+    out : dict
+        Dictionary with the same keys as the pickle output. "rgb" has
+        shape (points, time, 3).
+    """
+    if not fname.lower().endswith(".nc"):
+        with open(fname, 'rb') as f:
+            out = pickle.load(f)
+        seconds = np.asarray(out["seconds"])
+        window = np.ones(len(seconds), dtype=bool)
+        if tmin is not None:
+            window &= seconds >= tmin
+        if tmax is not None:
+            window &= seconds <= tmax
+        out["seconds"] = seconds[window]
+        out["time"] = np.asarray(out["time"])[window]
+        out["rgb"] = out["rgb"][:, window, :]
+        return out
+
+    if xr is None:
+        raise ImportError("Reading NetCDF timestacks requires xarray, "
+                          "install it with pip install xarray netcdf4.")
+
+    with xr.open_dataset(fname) as ds:
+        seconds = ((ds["time"] - ds["time"][0]) /
+                   np.timedelta64(1, "s")).values
+        i0 = 0 if tmin is None else np.searchsorted(seconds, tmin, "left")
+        i1 = len(seconds) if tmax is None else np.searchsorted(seconds, tmax,
+                                                               "right")
+        sub = ds.isel(time=slice(i0, i1))
+
+        out = {}
+        out["seconds"] = seconds[i0:i1]
+        out["time"] = sub["time"].values
+        out["rgb"] = np.swapaxes(sub["rgb"].values, 0, 1)
+        out["coordinates"] = np.vstack([ds["x"].values, ds["y"].values]).T
+        out["length"] = ds.attrs["length"]
+        out["points"] = ds.attrs["points"]
+        out["neighbours"] = ds.attrs["neighbours"]
+        out["statistic"] = ds.attrs["statistic"]
+        out["name"] = ds.attrs["name"]
+    return out
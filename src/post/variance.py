@@ -7,18 +7,13 @@ Compute the variance of a series of images.
 # DATE     : 21/04/2021
 # VERSION  : 1.0
 """
+import os
 import argparse
-from glob import glob
-from natsort import natsorted
 
-import numpy as np
+import cv2
 
-from welford import Welford
-
-from skimage.io import imread, imsave
-from skimage.util import img_as_float64
-
-from tqdm import tqdm
+from image_statistics import compute_statistics, scale_to_uint8
+from frame_source import open_frames
 
 
 if __name__ == "__main__":
@@ -33,7 +28,7 @@ if __name__ == "__main__":
                         action="store",
                         dest="input",
                         required=True,
-                        help="Input folder with images file.",)
+                        help="Input folder with images, or video file.",)
 
     parser.add_argument("--output", "-o",
                         action="store",
@@ -42,48 +37,29 @@ if __name__ == "__main__":
                         required=False,
                         help="Output average image name.",)
 
+    parser.add_argument("--workers", "-n",
+                        action="store",
+                        dest="workers",
+                        required=False,
+                        default=os.cpu_count(),
+                        help="Number of worker processes. Default is the "
+                             "number of cores.")
+
     args = parser.parse_args()
 
     # main()
 
-    imlist = natsorted(glob(args.input + "/*"))
-
-    # assuming all images are the same size, get dimensions of first image
-    h, w, c = imread(imlist[0]).shape
-    N = len(imlist)
-
-    # create a numpy array of floats to store the average (assume RGB images)
-    arr = np.zeros((h, w, c), np.float64)
-
-    # instanciate Welford's object
-    w = Welford()
-
-    # progress bar
-    pbar = tqdm(total=N)
-
-    # add data iteratively
-    for i, im in enumerate(imlist):
-
-        # ignore files that are not images
-        try:
-            img = imread(im)
-        except Exception:
-            pass
-
-        imarr = img_as_float64(img)
-
-        w.add(imarr)
-
-        pbar.update()
+    imlist = open_frames(args.input)
 
-    pbar.close()
+    # add data iteratively using Welford's method
+    stats = compute_statistics(imlist, keep_frames=False,
+                               workers=int(args.workers))
 
     # extract the variance
-    arr = w.var_s
+    arr = stats.var
 
     # scale the values and cast to integers
-    new_arr = ((arr - arr.min()) *
-               (1 / (arr.max() - arr.min()) * 255)).astype('uint8')
+    new_arr = scale_to_uint8(arr)
 
     # save the output
-    imsave(args.output, new_arr)
+    cv2.imwrite(args.output, new_arr)
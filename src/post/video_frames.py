@@ -0,0 +1,406 @@
+"""
+Index video recordings.
+
+# SCRIPT   : video_frames.py
+# POURPOSE : Find the frames and keyframes of the H.264 recordings of the
+#            Raspberry Pi camera without decoding them, so that they can
+#            be decoded from any frame (see frame_source.VideoFrames).
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import csv
+
+import numpy as np
+
+import cv2
+
+
+VIDEO_EXTENSIONS = [".h264", ".264", ".mp4", ".mkv", ".avi", ".mov"]
+
+# annex B start code and the H.264 NAL unit types used here
+START_CODE = b"\x00\x00\x01"
+NAL_SLICE = 1
+NAL_IDR = 5
+NAL_SPS = 7
+
+# frame number, time (s), byte offset of the frame and keyframe flag of
+# every frame of an H.264 stream
+INDEX_FIELDS = ["frame", "time", "offset", "keyframe"]
+
+INDEX_SUFFIX = "-frames.csv"
+
+# profiles whose SPS carries the chroma format, bit depths and scaling
+# matrices
+HIGH_PROFILES = [100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134,
+                 135]
+
+
+def is_video(path: str):
+    """
+    Return True if path is a video file.
+
+    Parameters
+    ----------
+    path : str
+        File or folder name.
+
+    Returns
+    -------
+    video : bool
+        True for files with one of VIDEO_EXTENSIONS.
+    """
+    return os.path.isfile(path) and \
+        os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def nal_units(fname: str, chunk_size: int = 1 << 22):
+    """
+    Scan an annex B H.264 stream for NAL units, without decoding.
+
+    Parameters
+    ----------
+    fname : str
+        Elementary H.264 stream (as written by picamera).
+    chunk_size : int
+        Bytes read at a time.
+
+    Yields
+    ------
+    offset : int
+        Offset of the start code in the file.
+    nal_type : int
+        NAL unit type.
+    payload : int
+        First byte after the NAL header, or -1 at the end of the file.
+    """
+    with open(fname, "rb") as f:
+        data = f.read(chunk_size)
+        base = 0  # file offset of data[0]
+        start = 0
+        while True:
+            more = f.read(chunk_size)
+            # start codes too close to the end are scanned with the next
+            # chunk, once the bytes after them are known
+            end = len(data) - 4 if more else len(data) - 3
+            i = data.find(START_CODE, start)
+            while 0 <= i < end:
+                payload = data[i + 4] if i + 4 < len(data) else -1
+                # 4-byte start codes begin one zero earlier
+                offset = i - 1 if i > 0 and data[i - 1] == 0 else i
+                yield base + offset, data[i + 3] & 0x1F, payload
+                i = data.find(START_CODE, i + 3)
+            if not more:
+                return
+            # keep one byte before the tail to see 4-byte start codes
+            base += end - 1
+            data = data[end - 1:] + more
+            start = 1
+
+
+class BitReader:
+    """
+    Read the bits of an H.264 NAL unit payload (RBSP).
+
+    Parameters
+    ----------
+    data : bytes
+        NAL unit payload, without the emulation prevention bytes.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def u(self, n: int):
+        """Read an n-bit unsigned integer."""
+        value = 0
+        for _ in range(n):
+            if self.pos >= 8 * len(self.data):
+                raise ValueError("Truncated NAL unit.")
+            byte = self.data[self.pos >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def ue(self):
+        """Read an unsigned Exp-Golomb integer."""
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 32:
+                raise ValueError("Invalid Exp-Golomb code.")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        """Read a signed Exp-Golomb integer."""
+        k = self.ue()
+        return (k + 1) // 2 if k % 2 else -(k // 2)
+
+
+def unescape(data: bytes):
+    """Remove the emulation prevention bytes (00 00 03) of a NAL unit."""
+    return data.replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+def sps_frame_rate(sps: bytes):
+    """
+    Read the frame rate from the VUI timing of a sequence parameter set.
+
+    picamera writes the timing when recording with sps_timing=True. The
+    frame rate is time_scale / (2 num_units_in_tick), one frame being two
+    fields.
+
+    Parameters
+    ----------
+    sps : bytes
+        SPS NAL unit, from its header byte, with or without the emulation
+        prevention bytes.
+
+    Returns
+    -------
+    fps : float
+        Frame rate, or None if the SPS has no timing.
+    """
+    r = BitReader(unescape(sps[1:]))
+    profile_idc = r.u(8)
+    r.u(16)  # constraint flags and level_idc
+    r.ue()  # seq_parameter_set_id
+    if profile_idc in HIGH_PROFILES:
+        chroma_format_idc = r.ue()
+        if chroma_format_idc == 3:
+            r.u(1)  # separate_colour_plane_flag
+        r.ue()  # bit_depth_luma_minus8
+        r.ue()  # bit_depth_chroma_minus8
+        r.u(1)  # qpprime_y_zero_transform_bypass_flag
+        if r.u(1):  # seq_scaling_matrix_present_flag
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if not r.u(1):
+                    continue
+                # skip the scaling list
+                last, following = 8, 8
+                for _ in range(16 if i < 6 else 64):
+                    if following != 0:
+                        following = (last + r.se() + 256) % 256
+                    last = following if following != 0 else last
+    r.ue()  # log2_max_frame_num_minus4
+    poc_type = r.ue()
+    if poc_type == 0:
+        r.ue()  # log2_max_pic_order_cnt_lsb_minus4
+    elif poc_type == 1:
+        r.u(1)  # delta_pic_order_always_zero_flag
+        r.se()  # offset_for_non_ref_pic
+        r.se()  # offset_for_top_to_bottom_field
+        for _ in range(r.ue()):
+            r.se()  # offset_for_ref_frame
+    r.ue()  # max_num_ref_frames
+    r.u(1)  # gaps_in_frame_num_value_allowed_flag
+    r.ue()  # pic_width_in_mbs_minus1
+    r.ue()  # pic_height_in_map_units_minus1
+    if not r.u(1):  # frame_mbs_only_flag
+        r.u(1)  # mb_adaptive_frame_field_flag
+    r.u(1)  # direct_8x8_inference_flag
+    if r.u(1):  # frame_cropping_flag
+        for _ in range(4):
+            r.ue()
+    if not r.u(1):  # vui_parameters_present_flag
+        return None
+
+    # VUI, up to the timing
+    if r.u(1):  # aspect_ratio_info_present_flag
+        if r.u(8) == 255:  # extended SAR
+            r.u(32)
+    if r.u(1):  # overscan_info_present_flag
+        r.u(1)
+    if r.u(1):  # video_signal_type_present_flag
+        r.u(4)
+        if r.u(1):  # colour_description_present_flag
+            r.u(24)
+    if r.u(1):  # chroma_loc_info_present_flag
+        r.ue()
+        r.ue()
+    if not r.u(1):  # timing_info_present_flag
+        return None
+    num_units_in_tick = r.u(32)
+    time_scale = r.u(32)
+    if num_units_in_tick == 0 or time_scale == 0:
+        return None
+    return time_scale / (2 * num_units_in_tick)
+
+
+def read_sps(fname: str, offset: int, max_size: int = 1024):
+    """
+    Read the SPS NAL unit that starts at offset.
+
+    Parameters
+    ----------
+    fname : str
+        Elementary H.264 stream.
+    offset : int
+        Offset of the start code of the SPS, see nal_units().
+    max_size : int
+        Bytes read. An SPS is much shorter than that.
+
+    Returns
+    -------
+    sps : bytes
+        SPS NAL unit, from its header byte.
+    """
+    with open(fname, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_size)
+    start = data.find(START_CODE) + len(START_CODE)
+    end = data.find(START_CODE, start)
+    return data[start:end if end > 0 else len(data)]
+
+
+def is_h264(fname: str):
+    """Return True for elementary H.264 streams."""
+    return os.path.splitext(fname)[1].lower() in [".h264", ".264"]
+
+
+def index_h264(fname: str, fps: float = None):
+    """
+    Index the frames of an H.264 stream, without decoding it.
+
+    Each frame starts at its first NAL unit, including the parameter sets
+    and SEI written before it. Keyframes are IDR frames that carry their
+    own SPS (as picamera writes them with inline headers), so decoding
+    can start from them.
+
+    Frame times come from the frame rate in the VUI timing of the first
+    SPS (see sps_frame_rate()), and from fps if the stream has no timing.
+    Frames are taken as evenly spaced: the per-picture timing of the SEI
+    messages is not read.
+
+    Parameters
+    ----------
+    fname : str
+        Elementary H.264 stream.
+    fps : float
+        Frame rate used if the stream has no timing. Optional.
+
+    Returns
+    -------
+    index : dict
+        Arrays with the INDEX_FIELDS, and the frame rate as "fps". Times
+        are NaN if the frame rate is unknown.
+    """
+    offsets, keyframes = [], []
+    start = None  # offset of the NAL units written before the next frame
+    sps = False
+    first_sps = None
+    for offset, nal_type, payload in nal_units(fname):
+        if nal_type == NAL_SPS and first_sps is None:
+            first_sps = offset
+        if nal_type in (NAL_SLICE, NAL_IDR):
+            # first_mb_in_slice is the first ue(v) of the slice header, it
+            # is zero when the first bit is set
+            if payload >= 0x80:
+                offsets.append(offset if start is None else start)
+                keyframes.append(nal_type == NAL_IDR and
+                                 (sps or not offsets[:-1]))
+            start = None
+            sps = False
+        else:
+            if start is None:
+                start = offset
+            sps |= nal_type == NAL_SPS
+
+    # the stream timing, if picamera wrote it
+    if first_sps is not None:
+        try:
+            fps = sps_frame_rate(read_sps(fname, first_sps)) or fps
+        except ValueError:  # malformed SPS, keep the given rate
+            pass
+
+    frame = np.arange(len(offsets))
+    return {"frame": frame,
+            "time": frame / fps if fps else np.full(len(frame), np.nan),
+            "fps": fps,
+            "offset": np.array(offsets, dtype=np.int64),
+            "keyframe": np.array(keyframes, dtype=bool)}
+
+
+def write_video_index(fname: str, fps: float = None):
+    """
+    Index an H.264 stream and save the index next to it.
+
+    Parameters
+    ----------
+    fname : str
+        Elementary H.264 stream.
+    fps : float
+        Frame rate used if the stream has no timing, see index_h264().
+        Optional.
+
+    Returns
+    -------
+    index_file : str
+        Index file name, the stream name with INDEX_SUFFIX.
+    """
+    index = index_h264(fname, fps)
+    if not index["fps"]:
+        print("  -- warning: {} has no timing and no frame rate was given, "
+              "frame times are unknown".format(fname))
+    index_file = os.path.splitext(fname)[0] + INDEX_SUFFIX
+    with open(index_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_FIELDS)
+        for i in range(len(index["frame"])):
+            writer.writerow([index["frame"][i],
+                             "{:.6f}".format(index["time"][i]),
+                             index["offset"][i],
+                             int(index["keyframe"][i])])
+    return index_file
+
+
+def read_video_index(index_file: str):
+    """
+    Read an index written by write_video_index().
+
+    Parameters
+    ----------
+    index_file : str
+        Index file name.
+
+    Returns
+    -------
+    index : dict
+        Arrays with the INDEX_FIELDS.
+    """
+    data = np.genfromtxt(index_file, delimiter=",", names=True,
+                         dtype=None, encoding="utf-8", ndmin=1)
+    return {"frame": data["frame"].astype(np.int64),
+            "time": data["time"].astype(np.float64),
+            "offset": data["offset"].astype(np.int64),
+            "keyframe": data["keyframe"].astype(bool)}
+
+
+def count_frames(fname: str):
+    """
+    Count the frames of a video without decoding it.
+
+    Elementary H.264 streams have no frame count in them, so their frames
+    are counted by index_h264(). Other videos use the count stored in the
+    container.
+
+    Parameters
+    ----------
+    fname : str
+        Video file name.
+
+    Returns
+    -------
+    nframes : int
+        Number of frames.
+    """
+    if is_h264(fname):
+        return len(index_h264(fname)["frame"])
+    cap = cv2.VideoCapture(fname)
+    nframes = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return nframes
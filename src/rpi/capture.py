@@ -26,27 +26,55 @@ import datetime
 import json
 import argparse
 
-# PiCamera
-from picamera import PiCamera
-from picamera.array import PiRGBArray
+# PiCamera, not needed with the synthetic camera
+try:
+    from picamera import PiCamera
+    from picamera.array import PiRGBArray
+except ImportError:
+    PiCamera = None
+
+# synthetic camera
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "sim"))
+from synthetic_camera import SyntheticPiCamera  # noqa
 
 # OpenCV
 import cv2
 
+import numpy as np
+
+# image products
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "post"))
+from image_statistics import BackgroundStatistics  # noqa
+from image_statistics import requested_products, write_products  # noqa
+from frame_source import VideoFrames  # noqa
+from video_frames import write_video_index  # noqa
+
 
 def set_camera_parameters(cfg):
     """
     Set camera parameters.
 
-    All values come from the dict generated from the JSON file.
+    All values come from the dict generated from the JSON file. With
+    "backend": "synthetic" in the capture options, a SyntheticPiCamera
+    is used instead of the HQ camera.
 
     :param cfg: JSON instance.
     :type cam: dict
-    :return: None
-    :rtype: None
+    :return: The camera.
+    :rtype: PiCamera or SyntheticPiCamera
     """
+    if cfg["capture"].get("backend", "picamera") == "synthetic":
+        camera = SyntheticPiCamera.from_config(cfg)
+    elif PiCamera is None:
+        raise ImportError("picamera is not installed. Set \"backend\": "
+                          "\"synthetic\" in the configuration to run "
+                          "without the camera.")
+    else:
+        camera = PiCamera()
+
     # set camera resolution [width x height]
-    camera = PiCamera()
     camera.resolution = cfg["capture"]["resolution"]
 
     # set camera frame rate [Hz]
@@ -61,6 +89,49 @@ def set_camera_parameters(cfg):
     return camera
 
 
+class StatisticsOutput:
+    """
+    Picamera output that feeds unencoded BGR frames to the statistics.
+
+    Picamera pads the frames to a width multiple of 32 and a height
+    multiple of 16, the padding is cropped here.
+
+    :param statistics: Accumulator.
+    :param resolution: Frame size as [width, height].
+    :type statistics: BackgroundStatistics
+    :type resolution: list
+    """
+
+    def __init__(self, statistics, resolution):
+
+        self.statistics = statistics
+        self.width, self.height = resolution
+        self.padded_width = (self.width + 31) // 32 * 32
+        self.padded_height = (self.height + 15) // 16 * 16
+        self.frame_size = self.padded_width * self.padded_height * 3
+        self.buffer = bytearray()
+
+    def _add(self, buf):
+        """Add one padded frame."""
+        frame = np.frombuffer(buf, dtype=np.uint8).reshape(
+            self.padded_height, self.padded_width, 3)
+        self.statistics.add(frame[:self.height, :self.width])
+
+    def write(self, buf):
+        """Receive data from the camera."""
+        if not self.buffer and len(buf) == self.frame_size:
+            self._add(bytes(buf))  # usually one frame per call
+        else:
+            self.buffer += buf
+            while len(self.buffer) >= self.frame_size:
+                self._add(bytes(self.buffer[:self.frame_size]))
+                del self.buffer[:self.frame_size]
+        return len(buf)
+
+    def flush(self):
+        pass
+
+
 def run_single_camera(cfg):
 
     # set camera parameters
@@ -82,11 +153,36 @@ def run_single_camera(cfg):
                            sei=cfg["h264"]["sei"],
                            sps_timing=cfg["h264"]["sps_timing"],
                            quality=cfg["h264"]["quality"])
+
+    # accumulate the image products from an unencoded copy of the stream
+    products = requested_products(cfg)
+    if products:
+        statistics = BackgroundStatistics(maxsize=4, dtype=np.float32,
+                                          keep_frames=False)
+        camera.start_recording(StatisticsOutput(statistics,
+                                                camera.resolution),
+                               format="bgr", splitter_port=2)
+
     camera.wait_recording(duration)
+    if products:
+        camera.stop_recording(splitter_port=2)
     camera.stop_recording()
     end = datetime.datetime.now()
     print(" capture finished at {} --".format(end))
 
+    # index the frames, for random access to the recording
+    index_file = write_video_index(fname, cfg["capture"]["framerate"])
+    print(" frame index saved to {} --".format(index_file))
+
+    if products:
+        stats = statistics.close()
+        root = os.path.join(cfg["data"]["output"], "products",
+                            start.strftime("%Y%m%d_%H%M%S"))
+        print("\n -- Products from {} frames ({} skipped) --".format(
+            stats.count, statistics.skipped))
+        for product in write_products(stats, root, products):
+            print(product)
+
     if cfg["post_processing"]["extract_frames"]:
         if cfg["post_processing"]["only_last_frame"]:
             print("\n -- Extracting frames -- \n")
@@ -103,7 +199,7 @@ def run_single_camera(cfg):
 
 def extract_frames(inp, out, date, ext, only_last=False):
     """
-    Extract all frames from the encoded stream.
+    Extract all frames, or only the last one, from the encoded stream.
 
     :param inp: Input h.264 file.
     :type inp: str
@@ -111,6 +207,10 @@ def extract_frames(inp, out, date, ext, only_last=False):
     :type out: str
     :param date: Capture date.
     :type date: datetime.datetime
+    :param ext: Image format.
+    :type ext: str
+    :param only_last: Extract only the last frame.
+    :type only_last: bool
     :return: None
     :rtype: None
     """
@@ -118,13 +218,15 @@ def extract_frames(inp, out, date, ext, only_last=False):
         # make sure output path exists
         os.makedirs(out, exist_ok=True)
 
-        print("\n --- Calling FFMPEG (only last frame) ---\n")
+        # only the last group of pictures is decoded, using the index
+        print("\n --- Decoding the last frame ---\n")
         dt = date.strftime("%Y%m%d_%H%M")
-        cmd = "ffmpeg -i {} -vf \"select=\'eq(n,1)\'\" -vframes 1 {}/first.bmp > /dev/null 2>&1".format(inp, out)
-        subprocess.call(cmd, shell=True)
-        print("\n --- FFMPEG finished extracting frames ---\n")
-        print("First frame is:")
-        print(os.path.join(out, "first.bmp"))
+        video = VideoFrames(inp)
+        fname = os.path.join(out, "000000-{}_{}.{}".format(
+            dt, str(len(video)).zfill(6), ext))
+        cv2.imwrite(fname, video[-1])
+        print("Last frame is:")
+        print(fname)
     else:
         # make sure output path exists
         os.makedirs(out, exist_ok=True)
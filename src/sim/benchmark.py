@@ -0,0 +1,253 @@
+"""
+Benchmark the FLIR capture pipeline with a synthetic camera.
+
+# SCRIPT   : benchmark.py
+# POURPOSE : Run the grab and encode pipeline of flir/capture.py against a
+#            synthetic camera for several output formats and numbers of
+#            encoder threads, and report the sustained frame rate, the
+#            latency percentiles and the dropped frames of each run.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+import sys
+
+import io
+import csv
+import shutil
+import tempfile
+import contextlib
+
+import argparse
+
+import datetime
+
+import numpy as np
+
+from synthetic_camera import SyntheticCamera, pattern_frames, replay_frames
+
+# capture pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "flir"))
+import capture  # noqa
+
+
+COLUMNS = ["format", "encoders", "target_fps", "fps", "grabbed", "written",
+           "dropped", "skipped", "failed", "max_depth", "latency_p50",
+           "latency_p95", "latency_p99", "mb_per_frame"]
+
+
+def run_benchmark(frames: list, fps: float, duration: float, ext: str,
+                  encoders: int, output: str, pixel_format: str = "BayerRG8",
+                  ring_size: int = 32, buffers: int = 10):
+    """
+    Run one capture against a synthetic camera.
+
+    Parameters
+    ----------
+    frames : list
+        BGR frames for the synthetic camera.
+    fps : float
+        Camera frame rate.
+    duration : float
+        Capture duration in seconds.
+    ext : str
+        Output format (jpeg, png, bmp, raw, ...).
+    encoders : int
+        Number of encoder threads.
+    output : str
+        Output folder. It is emptied after the run.
+    pixel_format : str
+        Camera pixel format.
+    ring_size : int
+        Number of raw frames that can wait to be encoded.
+    buffers : int
+        Number of frames the camera can hold.
+
+    Returns
+    -------
+    row : dict
+        Benchmark results, see COLUMNS. Latencies are in milliseconds.
+    """
+    os.makedirs(output, exist_ok=True)
+
+    # the capture settings are module globals
+    capture.OUTPATH = output
+    capture.NUM_IMAGES = int(round(fps * duration))
+    capture.EXT = ext
+    capture.today = datetime.datetime.now()
+
+    cam = SyntheticCamera(frames, fps, pixel_format=pixel_format,
+                          buffers=buffers)
+    cam.BeginAcquisition()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = capture.grab_images(cam, cam.serial, fps=fps,
+                                    ring_size=ring_size, encoders=encoders,
+                                    log_interval=np.inf)
+
+    # bytes written per frame
+    size = sum(os.path.getsize(os.path.join(output, f))
+               for f in os.listdir(output))
+    shutil.rmtree(output)
+
+    latencies = np.array(stats["latencies"]) * 1000
+    if latencies.size == 0:
+        latencies = np.array([np.nan])
+    return {"format": ext,
+            "encoders": 1 if ext == "raw" else encoders,
+            "target_fps": fps,
+            "fps": stats["grabbed"] / stats["elapsed"],
+            "grabbed": stats["grabbed"],
+            "written": stats["written"],
+            "dropped": stats["dropped"],
+            "skipped": stats["skipped"],
+            "failed": stats["failed"],
+            "max_depth": stats["max_depth"],
+            "latency_p50": np.percentile(latencies, 50),
+            "latency_p95": np.percentile(latencies, 95),
+            "latency_p99": np.percentile(latencies, 99),
+            "mb_per_frame": size / max(stats["written"], 1) / 1e6}
+
+
+if __name__ == "__main__":
+
+    print("\nBenchmarking the capture pipeline, please wait...\n")
+
+    # Argument parser
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--resolution", "-r",
+                        action="store",
+                        dest="resolution",
+                        default="2368,1812",
+                        required=False,
+                        help="Frame size as width,height. "
+                             "Default is 2368,1812.",)
+
+    parser.add_argument("--framerate", "-fps",
+                        action="store",
+                        dest="framerate",
+                        default=10,
+                        required=False,
+                        help="Camera frame rate. Default is 10.",)
+
+    parser.add_argument("--duration", "-d",
+                        action="store",
+                        dest="duration",
+                        default=10,
+                        required=False,
+                        help="Duration of each run in seconds. "
+                             "Default is 10.",)
+
+    parser.add_argument("--formats", "-f",
+                        action="store",
+                        dest="formats",
+                        default="jpeg,png,raw",
+                        required=False,
+                        help="Comma separated output formats. "
+                             "Default is jpeg,png,raw.",)
+
+    parser.add_argument("--encoders", "-n",
+                        action="store",
+                        dest="encoders",
+                        default="1,2,4",
+                        required=False,
+                        help="Comma separated numbers of encoder threads. "
+                             "Default is 1,2,4.",)
+
+    parser.add_argument("--pixel_format",
+                        action="store",
+                        dest="pixel_format",
+                        default="BayerRG8",
+                        required=False,
+                        help="Camera pixel format. Default is BayerRG8.",)
+
+    parser.add_argument("--ring_size",
+                        action="store",
+                        dest="ring_size",
+                        default=32,
+                        required=False,
+                        help="Number of raw frames that can wait to be "
+                             "encoded. Default is 32.",)
+
+    parser.add_argument("--buffers",
+                        action="store",
+                        dest="buffers",
+                        default=10,
+                        required=False,
+                        help="Number of frames the camera can hold. "
+                             "Default is 10.",)
+
+    parser.add_argument("--source", "-i",
+                        action="store",
+                        dest="source",
+                        default="",
+                        required=False,
+                        help="Folder with frames to replay. Default is to "
+                             "generate a test pattern.",)
+
+    parser.add_argument("--output", "-o",
+                        action="store",
+                        dest="output",
+                        default="",
+                        required=False,
+                        help="Scratch folder for the frames. Default is a "
+                             "temporary folder. Put it on the disk you want "
+                             "to benchmark.",)
+
+    parser.add_argument("--csv",
+                        action="store",
+                        dest="csv",
+                        default="",
+                        required=False,
+                        help="Save the results to this csv file.",)
+
+    args = parser.parse_args()
+
+    width, height = [int(v) for v in args.resolution.split(",")]
+    fps = float(args.framerate)
+    duration = float(args.duration)
+
+    if args.source:
+        frames = replay_frames(args.source, width, height)
+    else:
+        frames = pattern_frames(width, height)
+    print("  -- {} frames of {}x{} at {} fps, {} s per run".format(
+        len(frames), width, height, fps, duration))
+
+    scratch = args.output if args.output else tempfile.mkdtemp()
+
+    rows = []
+    print("\n{:>6} {:>4} {:>7} {:>7} {:>7} {:>7} {:>7} {:>8} {:>8} "
+          "{:>8} {:>7}".format("format", "enc", "fps", "written", "queue",
+                               "camera", "depth", "p50 ms", "p95 ms",
+                               "p99 ms", "MB"))
+    for ext in args.formats.split(","):
+        # raw bursts are written by a single thread
+        encoders = [1] if ext == "raw" else \
+            [int(n) for n in args.encoders.split(",")]
+        for n in encoders:
+            row = run_benchmark(frames, fps, duration, ext, n,
+                                os.path.join(scratch, "run"),
+                                pixel_format=args.pixel_format,
+                                ring_size=int(args.ring_size),
+                                buffers=int(args.buffers))
+            rows.append(row)
+            print("{format:>6} {encoders:>4} {fps:>7.2f} {written:>7} "
+                  "{dropped:>7} {skipped:>7} {max_depth:>7} "
+                  "{latency_p50:>8.1f} {latency_p95:>8.1f} "
+                  "{latency_p99:>8.1f} {mb_per_frame:>7.2f}".format(**row))
+
+    if not args.output:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print("\n  -- Results saved to {}".format(args.csv))
+
+    print("\nMy work is done!\n")
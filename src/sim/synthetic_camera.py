@@ -0,0 +1,450 @@
+"""
+Synthetic cameras for testing and benchmarking without hardware.
+
+# SCRIPT   : synthetic_camera.py
+# POURPOSE : Replay frames from a folder, or generate Bayer, mono or BGR
+#            test patterns, at a given resolution and frame rate, behind
+#            the same calls that flir/capture.py (PySpin) and
+#            rpi/capture.py (picamera) use.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+
+import time
+
+import threading
+
+import subprocess
+
+from glob import glob
+from natsort import natsorted
+
+import numpy as np
+
+import cv2
+
+
+PIXEL_FORMATS = ["BayerRG8", "BayerBG8", "BayerGR8", "BayerGB8", "Mono8",
+                 "BGR8"]
+
+# BGR channel of each pixel in a 2x2 Bayer tile, first row then second row
+BAYER_TILES = {"BayerRG8": ((2, 1), (1, 0)),
+               "BayerBG8": ((0, 1), (1, 2)),
+               "BayerGR8": ((1, 2), (0, 1)),
+               "BayerGB8": ((1, 0), (2, 1))}
+
+
+def to_pixel_format(bgr: np.ndarray, pixel_format: str = "BayerRG8"):
+    """
+    Convert a BGR frame to the raw layout of a camera pixel format.
+
+    Parameters
+    ----------
+    bgr : np.ndarray
+        BGR uint8 frame.
+    pixel_format : str
+        One of PIXEL_FORMATS.
+
+    Returns
+    -------
+    raw : np.ndarray
+        Frame as the camera would deliver it.
+    """
+    if pixel_format == "BGR8":
+        return np.ascontiguousarray(bgr)
+    if pixel_format == "Mono8":
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    if pixel_format not in BAYER_TILES:
+        raise ValueError("Unknown pixel format {}. Use one of {}.".format(
+            pixel_format, ", ".join(PIXEL_FORMATS)))
+
+    raw = np.empty(bgr.shape[:2], dtype=bgr.dtype)
+    for i, row in enumerate(BAYER_TILES[pixel_format]):
+        for j, channel in enumerate(row):
+            raw[i::2, j::2] = bgr[i::2, j::2, channel]
+    return raw
+
+
+def pattern_frames(width: int, height: int, nframes: int = 16,
+                   seed: int = 42):
+    """
+    Generate a looping sequence of wave-like BGR test frames.
+
+    The frames have moving crests, a sky gradient and sensor noise, so
+    that they compress roughly like real coastal imagery.
+
+    Parameters
+    ----------
+    width, height : int
+        Frame size.
+    nframes : int
+        Number of frames in the loop. Default is 16.
+    seed : int
+        Random seed for the noise.
+
+    Returns
+    -------
+    frames : list
+        List of BGR uint8 frames.
+    """
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+
+    frames = []
+    for k in range(nframes):
+        phase = 2 * np.pi * k / nframes
+        crests = 0.5 + 0.5 * np.sin(40 * y * (0.5 + y) + 6 * x + phase)
+        sea = np.clip(crests ** 8 + 0.3 * y, 0, 1)
+        sky = y < 0.25
+        grey = np.where(sky, 0.9 - y, sea)
+
+        bgr = np.empty((height, width, 3), dtype=np.float32)
+        bgr[..., 0] = 0.35 + 0.6 * grey
+        bgr[..., 1] = 0.25 + 0.65 * grey
+        bgr[..., 2] = 0.1 + 0.85 * grey
+        bgr *= 255
+        bgr += rng.normal(0, 3, bgr.shape).astype(np.float32)
+        frames.append(np.clip(bgr, 0, 255).astype(np.uint8))
+    return frames
+
+
+def replay_frames(folder: str, width: int, height: int,
+                  max_frames: int = 64):
+    """
+    Read the frames to replay from a folder.
+
+    Parameters
+    ----------
+    folder : str
+        Folder with images.
+    width, height : int
+        Frame size. Images are resized if needed.
+    max_frames : int
+        Maximum number of frames kept in memory. Default is 64.
+
+    Returns
+    -------
+    frames : list
+        List of BGR uint8 frames.
+    """
+    frames = []
+    for fname in natsorted(glob(os.path.join(folder, "*"))):
+        img = cv2.imread(fname)
+        if img is None:  # not an image
+            continue
+        if img.shape[:2] != (height, width):
+            img = cv2.resize(img, (width, height),
+                             interpolation=cv2.INTER_AREA)
+        frames.append(img)
+        if len(frames) == max_frames:
+            break
+    if not frames:
+        raise IOError("No images found in \"{}\"".format(folder))
+    return frames
+
+
+def source_frames(cfg: dict):
+    """
+    Build the synthetic frames from a configuration dict.
+
+    Parameters
+    ----------
+    cfg : dict
+        Configuration as read from the JSON file. The resolution comes
+        from cfg["capture"]["resolution"] and the frames from the optional
+        cfg["synthetic"]["source"] folder.
+
+    Returns
+    -------
+    frames : list
+        List of BGR uint8 frames.
+    """
+    width, height = cfg["capture"]["resolution"]
+    sim = cfg.get("synthetic", {})
+    if sim.get("source"):
+        return replay_frames(sim["source"], width, height,
+                             max_frames=sim.get("frames", 64))
+    return pattern_frames(width, height, nframes=sim.get("frames", 16))
+
+
+class _Node:
+    """Read-only stand-in for a GenICam node."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def GetValue(self):
+        return self.value
+
+    def GetCurrentEntry(self):
+        return self
+
+    def GetSymbolic(self):
+        return self.value
+
+    def __call__(self):
+        return self.value
+
+
+class SyntheticImage:
+    """
+    Frame returned by SyntheticCamera.GetNextImage().
+
+    Implements the accessors of PySpin.ImagePtr used by the capture.
+    """
+
+    def __init__(self, data, pixel_format, frame_id, timestamp,
+                 exposure, gain):
+        self.data = data
+        self.pixel_format = pixel_format
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.exposure = exposure
+        self.gain = gain
+
+    def GetNDArray(self):
+        return self.data
+
+    def GetWidth(self):
+        return self.data.shape[1]
+
+    def GetHeight(self):
+        return self.data.shape[0]
+
+    def GetPixelFormatName(self):
+        return self.pixel_format
+
+    def GetFrameID(self):
+        return self.frame_id
+
+    def GetTimeStamp(self):
+        return self.timestamp
+
+    def IsIncomplete(self):
+        return False
+
+    def GetImageStatus(self):
+        return 0
+
+    def GetChunkData(self):
+        return self
+
+    def GetExposureTime(self):
+        return self.exposure
+
+    def GetGain(self):
+        return self.gain
+
+    def Release(self):
+        pass
+
+
+class SyntheticCamera:
+    """
+    Synthetic machine vision camera with the PySpin acquisition calls.
+
+    Frame n is exposed at n / fps seconds after BeginAcquisition(). Like
+    the real camera, frames wait in a buffer of ``buffers`` frames until
+    GetNextImage() is called. When the host falls behind, the oldest
+    frames are lost and the gap shows in the frame ids.
+
+    Parameters
+    ----------
+    frames : list
+        BGR uint8 frames, replayed in a loop.
+    fps : float
+        Frame rate.
+    pixel_format : str
+        One of PIXEL_FORMATS. Default is BayerRG8.
+    buffers : int
+        Number of frames the camera can hold. Default is 10.
+    serial : str
+        Serial number. Default is SIM0000.
+    """
+
+    def __init__(self, frames: list, fps: float,
+                 pixel_format: str = "BayerRG8", buffers: int = 10,
+                 serial: str = "SIM0000"):
+
+        # convert once, so the cost of a frame is only the hand over
+        self.frames = [to_pixel_format(frame, pixel_format)
+                       for frame in frames]
+        self.fps = float(fps)
+        self.buffers = max(1, int(buffers))
+        self.serial = serial
+
+        height, width = frames[0].shape[:2]
+        self.Width = _Node(width)
+        self.Height = _Node(height)
+        self.PixelFormat = _Node(pixel_format)
+        self.AcquisitionFrameRate = _Node(self.fps)
+
+        self.t0 = None
+        self.next = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        """
+        Build a camera from a configuration dict.
+
+        Parameters
+        ----------
+        cfg : dict
+            Configuration as read from the JSON file. Optional
+            cfg["synthetic"] keys are source, frames, pixel_format,
+            buffers and serial.
+
+        Returns
+        -------
+        cam : SyntheticCamera
+            The camera.
+        """
+        sim = cfg.get("synthetic", {})
+        return cls(source_frames(cfg), cfg["capture"]["framerate"],
+                   pixel_format=sim.get("pixel_format", "BayerRG8"),
+                   buffers=sim.get("buffers", 10),
+                   serial=sim.get("serial", "SIM0000"))
+
+    def BeginAcquisition(self):
+        self.t0 = time.monotonic()
+        self.next = 0
+
+    def EndAcquisition(self):
+        self.t0 = None
+
+    def GetNextImage(self, timeout=None):
+        """Wait for the next frame and return it."""
+        if self.t0 is None:
+            raise RuntimeError("Camera is not acquiring.")
+
+        # frames older than the buffer were overwritten
+        exposed = int((time.monotonic() - self.t0) * self.fps)
+        self.next = max(self.next, exposed - self.buffers)
+
+        # wait until the frame is exposed
+        wait = self.t0 + self.next / self.fps - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        n = self.next
+        self.next += 1
+        return SyntheticImage(self.frames[n % len(self.frames)],
+                              self.PixelFormat.GetValue(),
+                              frame_id=n + 1,
+                              timestamp=int(round(n / self.fps * 1e9)),
+                              exposure=1e6 / self.fps / 2, gain=0.)
+
+
+class SyntheticPiCamera:
+    """
+    Synthetic Raspberry Pi camera with the picamera recording calls.
+
+    Frames are paced at the frame rate and encoded to H.264 by ffmpeg
+    (libx264) instead of the GPU encoder. Unencoded "bgr" recordings are
+    written to a file-like output, padded like picamera does. Several
+    recordings can run at once on different splitter ports.
+
+    Parameters
+    ----------
+    frames : list
+        BGR uint8 frames, replayed in a loop.
+    """
+
+    def __init__(self, frames: list):
+
+        self.frames = frames
+        height, width = frames[0].shape[:2]
+        self.resolution = (width, height)
+        self.framerate = 30
+        self.exposure_mode = "auto"
+        self.iso = 0
+
+        self._recordings = {}
+        self.frames_written = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        """Build a camera from a configuration dict."""
+        return cls(source_frames(cfg))
+
+    def _frames(self, format):
+        """Return the frames at the camera resolution."""
+        width, height = self.resolution
+        frames = [cv2.resize(frame, (width, height))
+                  if frame.shape[:2] != (height, width) else frame
+                  for frame in self.frames]
+        if format == "bgr":
+            # picamera pads to a width multiple of 32 and a height
+            # multiple of 16
+            padded = ((height + 15) // 16 * 16, (width + 31) // 32 * 32, 3)
+            for i, frame in enumerate(frames):
+                frames[i] = np.zeros(padded, dtype=np.uint8)
+                frames[i][:height, :width] = frame
+        return frames
+
+    def start_recording(self, output, format=None, sei=False,
+                        sps_timing=False, quality=25, splitter_port=1,
+                        **kwargs):
+        """Start encoding frames to an H.264 file, or writing raw frames."""
+        if splitter_port in self._recordings:
+            raise RuntimeError("The camera is already using port {}.".format(
+                splitter_port))
+
+        ffmpeg = None
+        if format == "bgr":
+            write = output.write
+        else:
+            width, height = self.resolution
+            cmd = ["ffmpeg", "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24",
+                   "-s", "{}x{}".format(width, height),
+                   "-r", str(self.framerate), "-i", "-",
+                   "-c:v", "libx264", "-crf", str(quality), "-f", "h264",
+                   output]
+            ffmpeg = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+            write = ffmpeg.stdin.write
+
+        stop = threading.Event()
+        thread = threading.Thread(target=self._record,
+                                  args=(self._frames(format), write, stop,
+                                        splitter_port),
+                                  daemon=True)
+        self._recordings[splitter_port] = (thread, stop, ffmpeg)
+        thread.start()
+
+    def _record(self, frames, write, stop, splitter_port):
+        """Write frames at the frame rate."""
+        t0 = time.monotonic()
+        n = 0
+        while not stop.is_set():
+            wait = t0 + n / self.framerate - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                write(frames[n % len(frames)].data)
+            except (BrokenPipeError, ValueError):
+                break
+            n += 1
+            if splitter_port == 1:
+                self.frames_written = n
+
+    def wait_recording(self, timeout=0, splitter_port=1):
+        """Record for timeout seconds."""
+        time.sleep(timeout)
+
+    def stop_recording(self, splitter_port=1):
+        """Stop recording and wait for ffmpeg to finish."""
+        thread, stop, ffmpeg = self._recordings.pop(splitter_port)
+        stop.set()
+        thread.join()
+        if ffmpeg is not None:
+            ffmpeg.stdin.close()
+            ffmpeg.wait()
+
+    def close(self):
+        for splitter_port in list(self._recordings):
+            self.stop_recording(splitter_port)
@@ -0,0 +1,99 @@
+"""
+Tests for src/post/frame_source.py.
+
+# SCRIPT   : test_frame_source.py
+# POURPOSE : Check that the frame sources list and decode the frames of
+#            folders and files laid out the way the capture writes them.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import cv2
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "src", "post"))
+from frame_index import SUFFIX, FrameIndexWriter  # noqa
+from frame_source import open_frames  # noqa
+from raw_burst import RawBurstWriter  # noqa
+from video_frames import INDEX_SUFFIX  # noqa
+
+
+ROOT = "SIM0000-20261017_120000"
+
+
+@pytest.fixture
+def capture_folder(tmp_path):
+    """A folder with frames, a frame index and products, as capture.py."""
+    rng = np.random.default_rng(42)
+    with FrameIndexWriter(str(tmp_path / (ROOT + SUFFIX))) as index:
+        for i in range(5):
+            fname = "{}-{}.jpeg".format(ROOT, str(i).zfill(6))
+            frame = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+            cv2.imwrite(str(tmp_path / fname), frame)
+            index.append(fname, 100 + i, int(i * 0.2e9), 10 + i * 0.2,
+                         1.7e9 + i * 0.2)
+
+    # image products, a stray video index and a non-image file
+    os.makedirs(tmp_path / "products")
+    cv2.imwrite(str(tmp_path / "products" / (ROOT + "-average.png")),
+                np.zeros((24, 32, 3), dtype=np.uint8))
+    (tmp_path / (ROOT + INDEX_SUFFIX)).write_text("frame,time\n")
+    (tmp_path / "notes.txt").write_text("capture log\n")
+    return str(tmp_path)
+
+
+def test_folder_lists_only_frames(capture_folder):
+    frames = open_frames(capture_folder)
+
+    assert len(frames) == 5
+    assert [os.path.basename(name) for name in frames.names] == \
+        ["{}-{}.jpeg".format(ROOT, str(i).zfill(6)) for i in range(5)]
+    for frame in frames:
+        assert frame is not None
+        assert frame.shape == (24, 32, 3)
+
+
+def test_folder_times_from_index(capture_folder):
+    frames = open_frames(capture_folder)
+
+    np.testing.assert_allclose(frames.seconds(), np.arange(5) * 0.2)
+    start_date, seconds = frames[2:].times()
+    assert start_date.timestamp() == pytest.approx(1.7e9 + 0.4)
+    np.testing.assert_allclose(seconds, np.arange(3) * 0.2)
+
+
+def test_folder_with_image_format(capture_folder):
+    assert len(open_frames(capture_folder, "jpeg")) == 5
+    assert len(open_frames(capture_folder, "png")) == 0
+
+
+@pytest.mark.parametrize("pixel_format, dtype, channels, shape", [
+    ("BayerRG8", "u1", 1, (48, 64, 3)),
+    ("BayerRG16", "u2", 1, (48, 64, 3)),
+    ("Mono8", "u1", 1, (48, 64)),
+    ("Mono16", "u2", 1, (48, 64)),
+    ("BGR8", "u1", 3, (48, 64, 3))])
+def test_burst_shape_and_dtype(tmp_path, pixel_format, dtype, channels,
+                               shape):
+    fname = str(tmp_path / "{}.burst".format(pixel_format))
+    writer = RawBurstWriter(fname, 64, 48, pixel_format=pixel_format,
+                            dtype=dtype, channels=channels)
+    raw_shape = (48, 64) if channels == 1 else (48, 64, channels)
+    for i in range(3):
+        writer.append(np.full(raw_shape, 10 * i, dtype=dtype), frame_id=i)
+    writer.close()
+
+    for kwargs in [{}, {"grey": True}, {"reduce": 2}]:
+        frames = open_frames(fname, **kwargs)
+        frame = frames[1]
+        assert frames.shape == frame.shape
+        assert frames.dtype == frame.dtype == np.dtype(dtype)
+    assert open_frames(fname).shape == shape
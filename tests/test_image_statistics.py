@@ -0,0 +1,159 @@
+"""
+Tests for src/post/image_statistics.py.
+
+# SCRIPT   : test_image_statistics.py
+# POURPOSE : Check that reducing image statistics in parallel gives the
+#            same result as the serial path, that partial statistics
+#            survive pickling, and that the background accumulator only
+#            copies the frames it queues.
+# AUTHOR   : Caio Eadi Stringari
+# DATE     : 17/10/2026
+# VERSION  : 1.0
+"""
+
+import os
+import sys
+
+import pickle
+import threading
+
+import numpy as np
+
+import cv2
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "..", "src", "post"))
+from image_statistics import BackgroundStatistics, ImageStatistics  # noqa
+from image_statistics import compute_statistics  # noqa
+
+
+PERCENTILES = [10, 50, 90]
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Write a handful of random frames as lossless images."""
+    rng = np.random.default_rng(42)
+    fnames = []
+    for i in range(12):
+        frame = rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+        fname = str(tmp_path / "frame-{}.png".format(str(i).zfill(6)))
+        cv2.imwrite(fname, frame)
+        fnames.append(fname)
+    return fnames
+
+
+def assert_same_statistics(a: ImageStatistics, b: ImageStatistics):
+    """Compare two sets of statistics."""
+    assert a.count == b.count
+    assert a.images == b.images
+    np.testing.assert_allclose(a.mean, b.mean, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(a.var, b.var, rtol=1e-10, atol=1e-10)
+    np.testing.assert_array_equal(a.min, b.min)
+    np.testing.assert_array_equal(a.max, b.max)
+    assert a.brightest_index == b.brightest_index
+    assert a.darkest_index == b.darkest_index
+    np.testing.assert_array_equal(a.brightest, b.brightest)
+    np.testing.assert_array_equal(a.darkest, b.darkest)
+    for q in PERCENTILES:
+        np.testing.assert_allclose(a.percentile(q), b.percentile(q))
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_matches_serial(images, workers):
+    serial = compute_statistics(images, percentiles=PERCENTILES,
+                                progress=False, workers=1)
+    parallel = compute_statistics(images, percentiles=PERCENTILES,
+                                  progress=False, workers=workers)
+    assert_same_statistics(serial, parallel)
+
+
+def test_serial_matches_numpy(images):
+    stats = compute_statistics(images, progress=False, workers=1)
+    frames = np.stack([cv2.imread(fname) for fname in images])
+    brightness = frames.max(axis=3).sum(axis=(1, 2))
+
+    np.testing.assert_allclose(stats.mean, frames.mean(axis=0))
+    np.testing.assert_allclose(stats.var, frames.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.min, frames.min(axis=0))
+    np.testing.assert_array_equal(stats.max, frames.max(axis=0))
+    assert stats.brightest_index == int(np.argmax(brightness))
+    assert stats.darkest_index == int(np.argmin(brightness))
+
+
+def test_merge_matches_serial(images):
+    frames = [cv2.imread(fname) for fname in images]
+
+    serial = ImageStatistics(percentiles=PERCENTILES)
+    for frame in frames:
+        serial.add(frame)
+
+    merged = ImageStatistics(percentiles=PERCENTILES)
+    for chunk in (frames[:5], frames[5:6], frames[6:]):
+        partial = ImageStatistics(percentiles=PERCENTILES)
+        for frame in chunk:
+            partial.add(frame)
+        merged.merge(partial)
+    merged.merge(ImageStatistics(percentiles=PERCENTILES))  # empty chunk
+
+    assert_same_statistics(serial, merged)
+
+
+def test_pickle_round_trip(images):
+    frames = [cv2.imread(fname) for fname in images]
+
+    stats = ImageStatistics(percentiles=PERCENTILES)
+    for frame in frames[:6]:
+        stats.add(frame)
+
+    restored = pickle.loads(pickle.dumps(stats))
+
+    # the scratch buffers are not pickled, but are rebuilt
+    assert "_delta" not in stats.__getstate__()
+    assert restored._delta.shape == stats.shape
+    assert_same_statistics(stats, restored)
+
+    # and the restored statistics can still be updated
+    for frame in frames[6:]:
+        stats.add(frame)
+        restored.add(frame)
+    assert_same_statistics(stats, restored)
+
+
+def test_pickle_empty():
+    restored = pickle.loads(pickle.dumps(ImageStatistics()))
+    assert restored.count == 0
+    assert restored.shape is None
+
+
+class CountingArray(np.ndarray):
+    """Array that counts how many times it is copied."""
+
+    copies = 0
+
+    def copy(self, *args, **kwargs):
+        CountingArray.copies += 1
+        return np.asarray(self).copy(*args, **kwargs)
+
+
+def test_background_copies_only_queued_frames():
+    stats = BackgroundStatistics(maxsize=2)
+
+    # hold the worker so that the queue fills up
+    release = threading.Event()
+    add = stats.stats.add
+    stats.stats.add = lambda frame: (release.wait(), add(frame))
+
+    frame = np.zeros((8, 8, 3), dtype=np.uint8).view(CountingArray)
+    CountingArray.copies = 0
+    queued = [stats.add(frame, copy=True) for _ in range(10)]
+    release.set()
+    result = stats.close()
+
+    # one frame taken by the worker and two waiting, the rest skipped
+    assert CountingArray.copies == sum(queued)
+    assert stats.skipped == len(queued) - sum(queued)
+    assert result.count == sum(queued)
+    assert 2 <= sum(queued) <= 3